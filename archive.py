@@ -0,0 +1,469 @@
+"""
+Compressione ed estrazione ZIP in parallelo.
+
+Ogni file viene diviso in blocchi compressi (deflate raw) da un pool di thread:
+zlib rilascia il GIL durante la compressione, quindi i thread lavorano davvero in
+parallelo. Come in pigz, i blocchi di un file terminano con un flush di
+sincronizzazione (l'ultimo con Z_FINISH) e usano gli ultimi 32 KB del blocco
+precedente come dizionario: concatenati formano un unico stream deflate valido,
+con un rapporto di compressione quasi identico a quello sequenziale.
+
+I blocchi vengono scritti nell'archivio nell'ordine dei file, e solo pochi blocchi
+alla volta restano in memoria. I formati già compressi (JPEG, MP4, ZIP, ...) sono
+salvati senza compressione (ZIP_STORED).
+
+Modalità incrementale (compress_folder_incremental): accanto all'archivio viene
+salvato un manifest (<archivio>.manifest.json) con dimensione, mtime, SHA-256 e CRC di
+ogni file. Alla compressione successiva i file invariati vengono copiati dal vecchio
+archivio così come sono (byte già compressi), e solo quelli nuovi o modificati
+vengono compressi di nuovo.
+
+Estrazione (extract_zip): le voci vengono decompresse in parallelo, ognuna
+in streaming, con selezione tramite pattern e salto dei file già estratti.
+"""
+import hashlib
+import json
+import os
+import struct
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+_DICT_SIZE = 32 * 1024
+MANIFEST_VERSION = 1
+_COPY_BLOCK = 1024 * 1024
+
+# Estensioni già compresse: deflate non riduce la dimensione e spreca CPU
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp3", ".aac", ".m4a", ".ogg", ".opus", ".flac",
+    ".mp4", ".m4v", ".mov", ".mkv", ".avi", ".webm",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".pages", ".numbers", ".key",
+    ".jar", ".apk", ".epub",
+}
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def is_stored_type(path):
+    return os.path.splitext(path)[1].lower() in STORED_EXTENSIONS
+
+
+def _deflate_chunk(data, level, last, zdict):
+    if zdict:
+        comp = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return comp.compress(data) + comp.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _iter_chunks(path, chunk_size):
+    """Blocchi del file, con un flag che indica l'ultimo (almeno un blocco, anche vuoto)."""
+    with open(path, "rb") as f:
+        current = f.read(chunk_size)
+        while True:
+            following = f.read(chunk_size)
+            yield current, not following
+            if not following:
+                return
+            current = following
+
+
+def walk_folder(folder):
+    """
+    Voci dell'archivio (percorso, nome nell'archivio) nell'ordine di os.walk, come
+    shutil.make_archive: le cartelle hanno il nome che termina con "/".
+    """
+    entries = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        rel_root = os.path.relpath(root, folder)
+        if rel_root != os.curdir:
+            entries.append((root, rel_root.replace(os.sep, "/") + "/"))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            arcname = os.path.join(rel_root, name) if rel_root != os.curdir else name
+            entries.append((path, arcname.replace(os.sep, "/")))
+    return entries
+
+
+class _EntryWriter:
+    """
+    Scrive una voce già compressa direttamente nel file dell'archivio. L'intestazione
+    locale viene riscritta alla fine con CRC e dimensioni, come fa ZipFile.open("w").
+    """
+
+    def __init__(self, zf, path, arcname, compress_type, mtime_ns, manifest=None):
+        self.zf = zf
+        self.manifest = manifest
+        self.sha256 = hashlib.sha256() if manifest is not None else None
+        # mtime letto prima dei dati: una modifica durante la lettura sarà rilevata al giro dopo
+        self.mtime_ns = mtime_ns
+        self.zinfo = zipfile.ZipInfo.from_file(path, arcname)
+        self.zinfo.compress_type = compress_type
+        self.zinfo.flag_bits = 0
+        self.zinfo.CRC = 0
+        self.zinfo.compress_size = 0
+        # Margine per i dati non comprimibili, come in zipfile (force_zip64)
+        self.zip64 = self.zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        self.zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(self.zinfo.FileHeader(self.zip64))
+        self.crc = 0
+        self.size = 0
+
+    def write(self, raw, data):
+        self.crc = zlib.crc32(raw, self.crc)
+        self.size += len(raw)
+        if self.sha256 is not None:
+            self.sha256.update(raw)
+        self.zinfo.compress_size += len(data)
+        self.zf.fp.write(data)
+
+    def close(self):
+        zinfo = self.zinfo
+        zinfo.CRC = self.crc
+        # Dimensione effettivamente letta (il file potrebbe essere cambiato dopo lo stat)
+        zinfo.file_size = self.size
+        end = self.zf.fp.tell()
+        self.zf.fp.seek(zinfo.header_offset)
+        self.zf.fp.write(zinfo.FileHeader(self.zip64))
+        self.zf.fp.seek(end)
+        _register(self.zf, zinfo, end)
+        if self.manifest is not None:
+            self.manifest[zinfo.filename] = {
+                "size": self.size,
+                "mtime_ns": self.mtime_ns,
+                "sha256": self.sha256.hexdigest(),
+                "crc": self.crc,
+            }
+
+
+def _register(zf, zinfo, end):
+    """Aggiunge al ZipFile una voce scritta direttamente nel file (per la directory centrale)."""
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = end
+    zf._didModify = True
+
+
+def copy_raw_entry(zf, old_fp, old_info):
+    """Copia una voce da un altro archivio senza decomprimerla."""
+    old_fp.seek(old_info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, old_fp.read(zipfile.sizeFileHeader))
+    # Nome ed extra della intestazione locale possono differire da quelli della directory centrale
+    old_fp.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+
+    zinfo = zipfile.ZipInfo(old_info.filename, old_info.date_time)
+    zinfo.compress_type = old_info.compress_type
+    zinfo.external_attr = old_info.external_attr
+    zinfo.create_system = old_info.create_system
+    # Solo i bit del livello di compressione: niente data descriptor nella copia
+    zinfo.flag_bits = old_info.flag_bits & 0x06
+    zinfo.CRC = old_info.CRC
+    zinfo.file_size = old_info.file_size
+    zinfo.compress_size = old_info.compress_size
+    zinfo.header_offset = zf.fp.tell()
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+    zf.fp.write(zinfo.FileHeader(zip64))
+    remaining = old_info.compress_size
+    while remaining:
+        block = old_fp.read(min(_COPY_BLOCK, remaining))
+        if not block:
+            raise zipfile.BadZipFile(f"Voce troncata nel vecchio archivio: {old_info.filename}")
+        zf.fp.write(block)
+        remaining -= len(block)
+    _register(zf, zinfo, zf.fp.tell())
+
+
+def create_zip(entries, output_zip, level=DEFAULT_LEVEL, max_workers=None, chunk_size=CHUNK_SIZE,
+               progress=None, manifest=None, reuse=None, previous_zip=None):
+    """
+    Crea output_zip dalle voci (percorso, nome nell'archivio).
+
+    - level: livello deflate 0-9 (0 salva tutto senza compressione).
+    - max_workers: thread di compressione (default: numero di core).
+    - progress(done_bytes, total_bytes): byte dei file di input elaborati.
+    - manifest: dizionario riempito con i dati dei file compressi (modalità incrementale).
+    - reuse: {nome nell'archivio: ZipInfo} delle voci da copiare da previous_zip.
+    """
+    reuse = reuse or {}
+    max_workers = max_workers or default_workers()
+    total = sum(os.path.getsize(p) for p, name in entries if not name.endswith("/"))
+    done = 0
+    tmp_zip = output_zip + ".part"
+    pending = deque()
+    current = None
+
+    def handle(item):
+        nonlocal current, done
+        kind, payload, raw = item
+        if kind == "begin":
+            current = _EntryWriter(zf, *payload, manifest=manifest)
+        elif kind == "end":
+            current.close()
+            current = None
+        else:
+            data = payload.result() if kind == "deflated" else raw
+            current.write(raw, data)
+            done += len(raw)
+            if progress:
+                progress(done, total)
+
+    old_fp = open(previous_zip, "rb") if reuse else None
+    try:
+        with zipfile.ZipFile(tmp_zip, "w", allowZip64=True) as zf, \
+                ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for path, arcname in entries:
+                if arcname.endswith("/") or arcname in reuse:
+                    while pending:
+                        handle(pending.popleft())
+                    if arcname.endswith("/"):
+                        zf.writestr(zipfile.ZipInfo.from_file(path, arcname), b"")
+                    else:
+                        copy_raw_entry(zf, old_fp, reuse[arcname])
+                        done += reuse[arcname].file_size
+                        if progress:
+                            progress(done, total)
+                    continue
+                stored = level == 0 or is_stored_type(path)
+                compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                # L'intestazione viene scritta quando la voce precedente è completa
+                mtime_ns = os.stat(path).st_mtime_ns
+                pending.append(("begin", (path, arcname, compress_type, mtime_ns), None))
+                previous = b""
+                for block, last in _iter_chunks(path, chunk_size):
+                    if stored:
+                        pending.append(("stored", None, block))
+                    else:
+                        fut = pool.submit(_deflate_chunk, block, level, last, previous[-_DICT_SIZE:])
+                        pending.append(("deflated", fut, block))
+                    previous = block
+                    # Al massimo 2 blocchi per thread in memoria
+                    while len(pending) > max_workers * 2:
+                        handle(pending.popleft())
+                pending.append(("end", None, None))
+            while pending:
+                handle(pending.popleft())
+        if old_fp:
+            # Chiuso prima della sostituzione (su Windows un file aperto non si sovrascrive)
+            old_fp.close()
+        os.replace(tmp_zip, output_zip)
+    finally:
+        if old_fp:
+            old_fp.close()
+        if os.path.exists(tmp_zip):
+            os.remove(tmp_zip)
+    return output_zip
+
+
+def compress_folder(input_folder, output_zip, level=DEFAULT_LEVEL, max_workers=None, progress=None):
+    """Comprime input_folder in output_zip (vedi create_zip)."""
+    return create_zip(walk_folder(input_folder), output_zip, level=level, max_workers=max_workers,
+                      progress=progress)
+
+
+def manifest_path_for(output_zip):
+    return output_zip + ".manifest.json"
+
+
+def _load_manifest(path, level):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Con un livello diverso i byte compressi vanno rigenerati
+    if data.get("version") != MANIFEST_VERSION or data.get("level") != level:
+        return {}
+    return data.get("entries", {})
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_COPY_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _find_reusable(entries, old_entries, old_zip):
+    """
+    Voci invariate rispetto al manifest: stessa dimensione e stesso mtime, oppure
+    (se è cambiato solo l'mtime) stesso SHA-256. Devono esistere nel vecchio archivio
+    con lo stesso CRC. Restituisce (reuse, manifest delle voci riusate).
+    """
+    reuse = {}
+    kept = {}
+    with zipfile.ZipFile(old_zip) as zf:
+        infos = zf.NameToInfo
+        for path, arcname in entries:
+            old = old_entries.get(arcname)
+            info = infos.get(arcname)
+            if arcname.endswith("/") or not old or not info:
+                continue
+            if info.flag_bits & 0x01 or info.CRC != old["crc"] or info.file_size != old["size"]:
+                continue
+            st = os.stat(path)
+            if st.st_size != old["size"]:
+                continue
+            if st.st_mtime_ns != old["mtime_ns"] and _file_sha256(path) != old["sha256"]:
+                continue
+            reuse[arcname] = info
+            kept[arcname] = dict(old, mtime_ns=st.st_mtime_ns)
+    return reuse, kept
+
+
+def compress_folder_incremental(input_folder, output_zip, level=DEFAULT_LEVEL, max_workers=None,
+                                progress=None):
+    """
+    Come compress_folder, ma riusa le voci invariate dell'archivio precedente
+    (vedi il docstring del modulo). Senza manifest valido comprime tutto e lo crea.
+    Restituisce (output_zip, numero di voci riusate).
+    """
+    entries = walk_folder(input_folder)
+    manifest_path = manifest_path_for(output_zip)
+    reuse, manifest = {}, {}
+    old_entries = _load_manifest(manifest_path, level) if os.path.exists(output_zip) else {}
+    if old_entries:
+        try:
+            reuse, manifest = _find_reusable(entries, old_entries, output_zip)
+        except zipfile.BadZipFile:
+            reuse, manifest = {}, {}
+    create_zip(entries, output_zip, level=level, max_workers=max_workers, progress=progress,
+               manifest=manifest, reuse=reuse, previous_zip=output_zip)
+
+    tmp = manifest_path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "level": level, "entries": manifest}, f)
+    os.replace(tmp, manifest_path)
+    return output_zip, len(reuse)
+
+
+def _safe_target(output_folder, name):
+    """
+    Percorso di destinazione di una voce, sempre dentro output_folder: come
+    ZipFile.extract vengono scartati lettere di unità, "/" iniziali e componenti "..".
+    """
+    name = name.replace("\\", "/")
+    parts = [p for p in name.split("/") if p not in ("", ".", "..")]
+    if parts:
+        parts[0] = os.path.splitdrive(parts[0])[1] or parts[0]
+    target = os.path.join(output_folder, *parts)
+    root = os.path.abspath(output_folder)
+    if os.path.commonpath([root, os.path.abspath(target)]) != root:
+        raise ValueError(f"Percorso non valido nell'archivio: {name}")
+    return target
+
+
+def _matches(name, include, exclude):
+    from fnmatch import fnmatch
+    if include and not any(fnmatch(name, pat) for pat in include):
+        return False
+    return not (exclude and any(fnmatch(name, pat) for pat in exclude))
+
+
+def _file_crc(path, size):
+    """CRC del file se ha la dimensione attesa, altrimenti None (senza leggerlo)."""
+    try:
+        if os.path.getsize(path) != size:
+            return None
+        crc = 0
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_COPY_BLOCK), b""):
+                crc = zlib.crc32(block, crc)
+        return crc
+    except OSError:
+        return None
+
+
+def extract_zip(input_zip, output_folder, include=None, exclude=None, max_workers=None,
+                skip_existing=True, progress=None):
+    """
+    Estrae input_zip in output_folder decomprimendo più voci in parallelo; ogni thread
+    usa un proprio handle dell'archivio.
+
+    - include / exclude: pattern glob (fnmatch) sul nome delle voci; vengono lette
+      solo le voci selezionate, il resto dell'archivio non viene toccato.
+    - skip_existing: salta le voci il cui file di destinazione ha già stessa
+      dimensione e CRC.
+    - progress(done_bytes, total_bytes): byte (non compressi) delle voci selezionate,
+      chiamata da un thread alla volta con valori crescenti.
+
+    Se più voci hanno lo stesso nome viene estratta solo l'ultima, come farebbe
+    un'estrazione sequenziale (le precedenti verrebbero sovrascritte).
+
+    Restituisce un dizionario con extracted, skipped e bytes.
+    """
+    import threading
+
+    max_workers = max_workers or default_workers()
+    with zipfile.ZipFile(input_zip) as zf:
+        members = [i for i in zf.infolist() if _matches(i.filename, include, exclude)]
+    # Nomi ripetuti: resta l'ultima voce, così due thread non scrivono lo stesso file
+    latest = {}
+    for info in members:
+        latest[os.path.normcase(_safe_target(output_folder, info.filename))] = info
+    members = list(latest.values())
+    # Ordine di posizione nell'archivio: letture il più possibile sequenziali
+    members.sort(key=lambda i: i.header_offset)
+    total = sum(i.file_size for i in members if not i.is_dir())
+    stats = {"extracted": 0, "skipped": 0, "bytes": 0}
+    lock = threading.Lock()
+    local = threading.local()
+    handles = []
+
+    def advance(nbytes, key=None):
+        with lock:
+            stats["bytes"] += nbytes
+            if key:
+                stats[key] += 1
+            # Sotto il lock: i valori arrivano in ordine
+            if progress and (nbytes or key):
+                progress(stats["bytes"], total)
+
+    def extract_one(info, target):
+        if skip_existing and _file_crc(target, info.file_size) == info.CRC:
+            advance(info.file_size, "skipped")
+            return
+        if not hasattr(local, "zf"):
+            local.zf = zipfile.ZipFile(input_zip)
+            with lock:
+                handles.append(local.zf)
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        tmp = target + ".part"
+        try:
+            with local.zf.open(info) as src, open(tmp, "wb") as dst:
+                for block in iter(lambda: src.read(_COPY_BLOCK), b""):
+                    dst.write(block)
+                    advance(len(block))
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        advance(0, "extracted")
+
+    os.makedirs(output_folder, exist_ok=True)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            for info in members:
+                target = _safe_target(output_folder, info.filename)
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                    continue
+                pending.append(pool.submit(extract_one, info, target))
+                # Errori segnalati subito e numero di job in coda limitato
+                while len(pending) > max_workers * 4 or (pending and pending[0].done()):
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+    finally:
+        for handle in handles:
+            handle.close()
+    return stats
@@ -0,0 +1,102 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def default_workers():
+    """Numero di processi usato quando non viene indicato esplicitamente."""
+    return os.cpu_count() or 1
+
+
+def build_jobs(paths, out_ext):
+    """
+    Costruisce la lista di job (input, output) per un batch: l'output ha lo stesso
+    percorso dell'input con l'estensione scelta.
+    """
+    return [(p, os.path.splitext(p)[0] + out_ext) for p in paths]
+
+
+def _run_job(in_path, out_path, options=None):
+    """
+    Esegue un singolo job nel processo worker. Non solleva mai eccezioni:
+    l'errore viene restituito nel risultato così il batch prosegue con gli altri file.
+    """
+    # Import locale: ogni processo carica i backend solo quando serve
+    from conversions import convert_file
+    from office_pool import take_latency
+    start = time.perf_counter()
+    take_latency()
+    try:
+        convert_file(in_path, out_path, **(options or {}))
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "input": in_path,
+        "output": out_path,
+        "ok": error is None,
+        "error": error,
+        "elapsed": time.perf_counter() - start,
+        # Durata del job nel pool LibreOffice, se il file è passato da lì (office_pool.py)
+        "office_latency": take_latency(),
+    }
+
+
+def run_batch(jobs, max_workers=None, on_result=None, options=None):
+    """
+    Esegue i job (lista di coppie input/output) su un pool di processi.
+
+    - max_workers: numero di processi (default: numero di core). Con 1 il batch
+      viene eseguito nel processo corrente, senza pool.
+    - on_result(result, done, total): callback chiamata appena un file termina,
+      nell'ordine di completamento (dal thread che ha chiamato run_batch).
+    - options: opzioni passate a conversions.convert_file per ogni file
+      (ad es. width/height/dpi per la rasterizzazione degli SVG).
+
+    Restituisce la lista dei risultati nello stesso ordine dei job; ogni risultato è
+    un dizionario con le chiavi input, output, ok, error, elapsed, office_latency.
+    """
+    jobs = list(jobs)
+    total = len(jobs)
+    results = [None] * total
+    if not jobs:
+        return results
+    if max_workers is None:
+        max_workers = default_workers()
+    max_workers = max(1, min(max_workers, total))
+
+    if max_workers == 1:
+        for idx, (in_path, out_path) in enumerate(jobs):
+            results[idx] = _run_job(in_path, out_path, options)
+            if on_result:
+                on_result(results[idx], idx + 1, total)
+        return results
+
+    # "spawn" evita di duplicare con fork lo stato di Qt e dei thread del processo GUI
+    ctx = multiprocessing.get_context("spawn")
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        futures = {
+            pool.submit(_run_job, in_path, out_path, options): idx
+            for idx, (in_path, out_path) in enumerate(jobs)
+        }
+        for fut in as_completed(futures):
+            idx = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as e:
+                # Ad es. un worker terminato in modo anomalo (BrokenProcessPool)
+                in_path, out_path = jobs[idx]
+                result = {
+                    "input": in_path,
+                    "output": out_path,
+                    "ok": False,
+                    "error": f"{type(e).__name__}: {e}",
+                    "elapsed": 0.0,
+                }
+            results[idx] = result
+            done += 1
+            if on_result:
+                on_result(result, done, total)
+    return results
@@ -0,0 +1,400 @@
+"""
+Cache su disco delle conversioni, indirizzata per contenuto.
+
+La chiave di una voce è l'hash SHA-256 del contenuto dei file di input, unito al nome
+della conversione, al formato di destinazione e alle opzioni che cambiano l'output
+(non ad es. il numero di worker). Con una hit l'output viene copiato (o collegato
+con hard link) dalla cache invece di rieseguire la conversione. Le voci meno usate
+di recente vengono rimosse quando la cache supera il budget in byte.
+
+Hit e miss di tutti i processi (anche dei worker del batch) vengono registrati in
+stats.log nella cartella della cache: un byte per evento, aggiunto in append. Oltre
+STATS_LOG_MAX byte il log viene spostato da parte e sommato ai totali in stats.json,
+così i file dei contatori restano piccoli.
+
+Configurazione tramite variabili d'ambiente (ereditate anche dai processi del batch):
+- DEVATRON_CACHE=0          disattiva la cache
+- DEVATRON_CACHE_DIR        cartella della cache
+- DEVATRON_CACHE_MAX_BYTES  budget massimo in byte (default 2 GB)
+- DEVATRON_CACHE_LINK=1     usa hard link invece della copia quando possibile
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+# Da incrementare quando cambia il comportamento dei convertitori: invalida le vecchie voci
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_HASH_CHUNK = 1024 * 1024
+# Contatori condivisi tra i processi (b"h" per una hit, b"m" per un miss)
+_STATS_FILE = "stats.log"
+# Totali dei log già ruotati e dimensione oltre la quale il log viene ruotato
+_STATS_TOTALS = "stats.json"
+STATS_LOG_MAX = 64 * 1024
+# Un pezzo di log ruotato viene sommato solo dopo questi secondi: un processo che
+# aveva già aperto il log può ancora scriverci
+_STATS_SETTLE = 2.0
+# Lock della somma dei pezzi, considerato abbandonato dopo questi secondi
+_STATS_LOCK_STALE = 60.0
+# Con gli hard link l'ultimo uso sta in un file a parte: toccare la voce cambierebbe
+# la data di modifica anche degli output collegati
+_USED_SUFFIX = ".used"
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "devatron_converter")
+
+
+def is_enabled():
+    return os.environ.get("DEVATRON_CACHE", "1") != "0"
+
+
+def set_enabled(enabled):
+    """Attiva o disattiva la cache per questo processo e per i processi figli."""
+    os.environ["DEVATRON_CACHE"] = "1" if enabled else "0"
+
+
+class ConversionCache:
+    def __init__(self, cache_dir=None, max_bytes=None, link=None):
+        self.cache_dir = cache_dir or os.environ.get("DEVATRON_CACHE_DIR") or default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("DEVATRON_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+        if link is None:
+            link = os.environ.get("DEVATRON_CACHE_LINK", "0") == "1"
+        self.link = link
+        # Hit e miss di questo processo (quelli di tutti i processi sono in stats())
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Hash già calcolati: (percorso, dimensione, mtime) -> sha256
+        self._hash_memo = {}
+
+    # -----------------------------------------------------
+    # Chiavi
+    # -----------------------------------------------------
+    def file_hash(self, path):
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = self._hash_memo.get(memo_key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+                    h.update(block)
+            digest = h.hexdigest()
+            self._hash_memo[memo_key] = digest
+        return digest
+
+    def make_key(self, operation, input_paths, target_ext, options=None):
+        """Chiave della voce: hash degli input + operazione + formato + opzioni."""
+        payload = {
+            "v": CACHE_VERSION,
+            "op": operation,
+            "inputs": [self.file_hash(p) for p in input_paths],
+            "target": target_ext.lower(),
+            "options": {k: v for k, v in sorted((options or {}).items()) if not callable(v)},
+        }
+        raw = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _entry_path(self, key, target_ext):
+        return os.path.join(self.cache_dir, key[:2], key + target_ext.lower())
+
+    # -----------------------------------------------------
+    # Lettura / scrittura
+    # -----------------------------------------------------
+    def fetch(self, key, output_path):
+        """
+        Se la voce esiste la copia (o collega) in output_path e restituisce True.
+        """
+        entry = self._entry_path(key, os.path.splitext(output_path)[1])
+        try:
+            self._touch(entry)
+            self._materialize(entry, output_path)
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                self.misses += 1
+            self._record(b"m")
+            return False
+        with self._lock:
+            self.hits += 1
+        self._record(b"h")
+        return True
+
+    def _touch(self, entry):
+        """Aggiorna l'ultimo uso della voce, usato per l'ordinamento LRU."""
+        if not self.link:
+            os.utime(entry)
+            return
+        os.stat(entry)
+        with open(entry + _USED_SUFFIX, "ab"):
+            pass
+        os.utime(entry + _USED_SUFFIX)
+
+    def _record(self, event):
+        log = os.path.join(self.cache_dir, _STATS_FILE)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Append di un byte: sicuro anche con più processi che scrivono insieme
+            with open(log, "ab") as f:
+                f.write(event)
+                full = f.tell() >= STATS_LOG_MAX
+            if full:
+                self._rotate_stats()
+        except OSError:
+            pass
+
+    def _stats_pieces(self):
+        """Log ruotati non ancora sommati in stats.json."""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        return [os.path.join(self.cache_dir, name) for name in names
+                if name.startswith(_STATS_FILE + ".") and name.endswith(".piece")]
+
+    def _rotate_stats(self):
+        log = os.path.join(self.cache_dir, _STATS_FILE)
+        try:
+            # Il rename è atomico: un solo processo sposta ogni log pieno
+            os.replace(log, f"{log}.{uuid.uuid4().hex}.piece")
+        except OSError:
+            return
+        lock = log + ".lock"
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > _STATS_LOCK_STALE:
+                    os.remove(lock)
+            except OSError:
+                pass
+            # I pezzi restano e vengono contati lo stesso: li somma la prossima rotazione
+            return
+        try:
+            hits, misses = self._stats_totals()
+            merged = []
+            for piece in self._stats_pieces():
+                if time.time() - os.stat(piece).st_mtime < _STATS_SETTLE:
+                    continue
+                with open(piece, "rb") as f:
+                    data = f.read()
+                hits += data.count(b"h")
+                misses += data.count(b"m")
+                merged.append(piece)
+            if not merged:
+                return
+            totals = os.path.join(self.cache_dir, _STATS_TOTALS)
+            fd_tmp, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd_tmp, "w", encoding="utf-8") as f:
+                json.dump({"hits": hits, "misses": misses}, f)
+            os.replace(tmp, totals)
+            for piece in merged:
+                os.remove(piece)
+        finally:
+            os.close(fd)
+            os.remove(lock)
+
+    def _stats_totals(self):
+        try:
+            with open(os.path.join(self.cache_dir, _STATS_TOTALS), "r", encoding="utf-8") as f:
+                totals = json.load(f)
+            return totals["hits"], totals["misses"]
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def _recorded(self):
+        hits, misses = self._stats_totals()
+        for path in [os.path.join(self.cache_dir, _STATS_FILE)] + self._stats_pieces():
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            hits += data.count(b"h")
+            misses += data.count(b"m")
+        return hits, misses
+
+    def store(self, key, output_path):
+        """Salva in cache il file prodotto dalla conversione."""
+        if not os.path.isfile(output_path):
+            return
+        entry = self._entry_path(key, os.path.splitext(output_path)[1])
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Scrittura su file temporaneo + rename: atomica anche con più processi
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(output_path, tmp)
+            os.replace(tmp, entry)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def _materialize(self, entry, output_path):
+        out_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(out_dir, exist_ok=True)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if self.link:
+            try:
+                os.link(entry, output_path)
+                return
+            except OSError:
+                # File system diversi o hard link non supportati: copia
+                pass
+        shutil.copyfile(entry, output_path)
+
+    # -----------------------------------------------------
+    # Manutenzione
+    # -----------------------------------------------------
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _, files in os.walk(self.cache_dir):
+            names = set(files)
+            for name in files:
+                if name.endswith((".tmp", _USED_SUFFIX)) or (
+                        root == self.cache_dir and (name.startswith(_STATS_FILE) or name == _STATS_TOTALS)):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                    used = st.st_mtime
+                    if name + _USED_SUFFIX in names:
+                        used = max(used, os.stat(path + _USED_SUFFIX).st_mtime)
+                except FileNotFoundError:
+                    continue
+                entries.append((used, st.st_size, path))
+        return entries
+
+    def evict(self, max_bytes=None):
+        """Rimuove le voci usate meno di recente finché la cache non rientra nel budget."""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            for name in (path, path + _USED_SUFFIX):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Rimuove tutte le voci e azzera i contatori."""
+        removed = self.evict(max_bytes=0)
+        stats_files = [os.path.join(self.cache_dir, name) for name in (_STATS_FILE, _STATS_TOTALS)]
+        for path in stats_files + self._stats_pieces():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        hits, misses = self._recorded()
+        return {
+            "dir": self.cache_dir,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "enabled": is_enabled(),
+        }
+
+
+_default_cache = None
+# Esito dell'ultima chiamata @cached di ogni thread (vedi take_hit)
+_served = threading.local()
+
+
+def get_cache():
+    """Istanza di cache condivisa dal processo corrente."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ConversionCache()
+    return _default_cache
+
+
+def take_hit():
+    """
+    True se l'ultima chiamata a una funzione @cached del thread corrente è stata
+    servita dalla cache; poi azzerato. Vale per il solo thread che la chiama, anche
+    quando altri thread (ad es. il batch di immagini) usano la cache nello stesso momento.
+    """
+    hit = getattr(_served, "hit", False)
+    _served.hit = False
+    return hit
+
+
+def cached(default_ext=None, ignore=()):
+    """
+    Decoratore per le funzioni conversions.convert_*(input, output=None, ...).
+
+    Il primo parametro è il file di input, il secondo il file di output; se l'output
+    non è indicato viene ricavato dall'input con default_ext, come fanno le funzioni
+    stesse. Gli altri argomenti fanno parte della chiave, tranne quelli in ignore
+    (opzioni che non cambiano l'output, come il numero di worker). Passando
+    use_cache=False la cache viene saltata per quella chiamata.
+    """
+    def decorator(func):
+        sig = inspect.signature(func)
+        in_name, out_name = list(sig.parameters)[:2]
+
+        @functools.wraps(func)
+        def wrapper(*args, use_cache=True, **kwargs):
+            if not use_cache or not is_enabled():
+                return func(*args, **kwargs)
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            in_path = bound.arguments[in_name]
+            out_path = bound.arguments[out_name]
+            if not out_path:
+                if not default_ext:
+                    return func(*args, **kwargs)
+                out_path = os.path.splitext(in_path)[0] + default_ext
+                bound.arguments[out_name] = out_path
+            options = {k: v for k, v in bound.arguments.items() if k not in (in_name, out_name) and k not in ignore}
+
+            cache = get_cache()
+            try:
+                key = cache.make_key(func.__name__, [in_path], os.path.splitext(out_path)[1], options)
+            except OSError:
+                # Input non leggibile: lasciamo che sia la conversione a segnalare l'errore
+                return func(*args, **kwargs)
+            if cache.fetch(key, out_path):
+                _served.hit = True
+                return out_path
+            result = func(*bound.args, **bound.kwargs)
+            # Una conversione annidata servita dalla cache non rende una hit questa chiamata
+            _served.hit = False
+            try:
+                cache.store(key, result or out_path)
+            except OSError:
+                # Una cache non scrivibile non deve far fallire la conversione
+                pass
+            return result
+
+        return wrapper
+    return decorator
@@ -0,0 +1,437 @@
+"""
+Interfaccia a riga di comando, senza GUI:
+
+    python -m cli convert "*.pdf" --to .docx -o out/
+    python -m cli convert docs/ -r --to .txt --workers 8
+    python -m cli merge a.pdf b.pdf -o unito.pdf
+    python -m cli images-pdf scansioni/*.jpg -o scansioni.pdf
+    python -m cli split tesi.pdf --pages 1-3,7 -o estratto.pdf
+    python -m cli split tesi.pdf --every 10 -d capitoli/
+    python -m cli text tesi.pdf --format jsonl -o tesi.jsonl
+    python -m cli compress cartella/ -o cartella.zip
+    python -m cli decompress archivio.zip -o cartella/
+    python -m cli zip-convert consegna.zip --to .pdf -o consegna_pdf.zip
+    python -m cli cache stats
+
+Il modulo non importa PyQt5 né i backend di conversione: ogni comando carica
+(tramite conversions) solo la libreria che gli serve, così l'avvio resta rapido.
+"""
+import argparse
+import glob
+import os
+import sys
+
+
+def expand_inputs(patterns, recursive=False):
+    """
+    Espande pattern glob e cartelle in una lista di coppie (file, cartella_base).
+    La cartella base serve a ricostruire la struttura relativa nella cartella di output.
+    Con recursive=True "**" nei pattern attraversa le sottocartelle e le cartelle
+    vengono visitate ricorsivamente.
+    """
+    found = []
+    seen = set()
+
+    def add(path, base):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            found.append((path, base))
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=recursive)) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                if recursive:
+                    for root, dirs, files in os.walk(match):
+                        dirs.sort()
+                        for name in sorted(files):
+                            add(os.path.join(root, name), match)
+                else:
+                    for name in sorted(os.listdir(match)):
+                        path = os.path.join(match, name)
+                        if os.path.isfile(path):
+                            add(path, match)
+            elif os.path.isfile(match):
+                add(match, os.path.dirname(match))
+            else:
+                raise FileNotFoundError(f"Nessun file corrisponde a: {match}")
+    return found
+
+
+def output_path_for(in_path, base_dir, out_ext, output_dir=None):
+    """Percorso di output: accanto all'input oppure in output_dir mantenendo il percorso relativo."""
+    stem = os.path.splitext(in_path)[0]
+    if not output_dir:
+        return stem + out_ext
+    rel = os.path.relpath(stem, base_dir or ".")
+    return os.path.join(output_dir, rel + out_ext)
+
+
+def image_options(args):
+    """Opzioni delle conversioni di immagini (vedi conversions.convert_image) dagli argomenti."""
+    options = {k: v for k, v in (("width", args.width), ("height", args.height), ("dpi", args.dpi)) if v}
+    if args.max_size:
+        options["max_size"] = args.max_size
+    if args.max_memory:
+        options["max_memory"] = args.max_memory * 1024 ** 2
+    if args.quality:
+        options["quality"] = args.quality
+    if args.target_size:
+        options["target_size"] = args.target_size * 1024
+    if args.progressive:
+        options["progressive"] = True
+    if args.webp_method is not None:
+        options["webp_method"] = args.webp_method
+    return options
+
+
+def cmd_convert(args):
+    from batch import run_batch
+    from images import is_raster_job, run_image_batch
+
+    if args.no_cache:
+        # Tramite variabile d'ambiente: vale anche per i processi del batch
+        from cache import set_enabled
+        set_enabled(False)
+
+    # Più formati separati da virgola: ogni input viene decodificato una volta sola
+    out_exts = []
+    for ext in args.to.split(","):
+        ext = ext.strip().lower()
+        if ext:
+            out_exts.append(ext if ext.startswith(".") else "." + ext)
+    jobs = []
+    fan_out = []
+    for in_path, base in expand_inputs(args.inputs, args.recursive):
+        outputs = []
+        for out_ext in out_exts:
+            if os.path.splitext(in_path)[1].lower() == out_ext:
+                continue
+            out_path = output_path_for(in_path, base, out_ext, args.output_dir)
+            if args.output_dir:
+                os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            outputs.append(out_path)
+        jobs.extend((in_path, out_path) for out_path in outputs)
+        if outputs:
+            fan_out.append((in_path, outputs))
+    if not jobs:
+        print("Nessun file da convertire.", file=sys.stderr)
+        return 1
+
+    def on_result(result, done, total):
+        if result["ok"]:
+            if not args.quiet:
+                latency = result.get("office_latency")
+                suffix = f" (LibreOffice {latency:.2f} s)" if latency is not None else ""
+                print(f"[{done}/{total}] {result['input']} -> {result['output']}{suffix}")
+        else:
+            print(f"[{done}/{total}] ERRORE {result['input']}: {result['error']}", file=sys.stderr)
+
+    options = image_options(args)
+    if len(out_exts) > 1:
+        # Un file per processo, i suoi formati in parallelo nello stesso processo
+        from fanout import run_fan_out
+        results = run_fan_out(fan_out, max_workers=args.workers, on_result=on_result, options=options)
+    elif all(is_raster_job(i, o) for i, o in jobs):
+        # Solo immagini raster: pool di thread, senza avviare processi
+        results = run_image_batch(jobs, max_size=args.max_size, max_workers=args.workers,
+                                  on_result=on_result, options=options)
+    else:
+        results = run_batch(jobs, max_workers=args.workers, on_result=on_result, options=options)
+    from office_pool import latency_summary
+    summary = latency_summary(results)
+    if summary and not args.quiet:
+        print(summary, file=sys.stderr)
+    failed = sum(1 for r in results if not r["ok"])
+    return 1 if failed else 0
+
+
+def cmd_merge(args):
+    from conversions import merge_pdfs
+
+    pdfs = [p for p, _ in expand_inputs(args.inputs, args.recursive) if p.lower().endswith(".pdf")]
+
+    def progress(done, total, path):
+        if not args.quiet:
+            print(f"[{done}/{total}] {path}")
+
+    merge_pdfs(pdfs, args.output, streaming=args.streaming, progress=progress)
+    if not args.quiet:
+        print(args.output)
+    return 0
+
+
+def cmd_images_pdf(args):
+    from conversions import images_to_pdf
+    from images import RASTER_EXTENSIONS
+
+    images = [p for p, _ in expand_inputs(args.inputs, args.recursive)
+              if os.path.splitext(p)[1].lower() in RASTER_EXTENSIONS]
+    if not images:
+        print("Nessuna immagine da unire.", file=sys.stderr)
+        return 1
+
+    def progress(done, total, path):
+        if not args.quiet:
+            print(f"[{done}/{total}] {path}")
+
+    images_to_pdf(images, args.output, dpi=args.dpi, progress=progress)
+    if not args.quiet:
+        print(args.output)
+    return 0
+
+
+def cmd_split(args):
+    from conversions import split_pdf
+
+    if args.pages:
+        if not args.output:
+            raise ValueError("Con --pages va indicato il file di output (-o).")
+        split_pdf(args.input, args.output, args.pages)
+        if not args.quiet:
+            print(args.output)
+        return 0
+
+    from conversions import split_pdf_multi
+
+    def progress(done, total, path):
+        if not args.quiet:
+            print(f"[{done}/{total}] {path}")
+
+    split_pdf_multi(args.input, ranges=args.ranges, every=args.every,
+                    output_dir=args.output_dir, progress=progress)
+    return 0
+
+
+def cmd_text(args):
+    from pdf_text import extract_pdf_text
+
+    output = args.output or os.path.splitext(args.input)[0] + (".jsonl" if args.format == "jsonl" else ".txt")
+
+    def progress(done, total):
+        if not args.quiet and total and (done == total or done % 100 == 0):
+            print(f"[{done}/{total}] pagine", file=sys.stderr)
+
+    extract_pdf_text(args.input, output, fmt=args.format, engine=args.engine,
+                     max_workers=args.workers, progress=progress)
+    if not args.quiet:
+        print(output)
+    return 0
+
+
+def cmd_compress(args):
+    from conversions import compress_folder
+
+    last = [-1]
+
+    def progress(done, total):
+        percent = int(done * 100 / total) if total else 100
+        if not args.quiet and percent // 10 != last[0]:
+            last[0] = percent // 10
+            print(f"[{percent}%] {done}/{total} byte", file=sys.stderr)
+
+    archive = compress_folder(args.input, args.output, level=args.level,
+                              max_workers=args.workers, progress=progress, incremental=args.incremental)
+    if not args.quiet:
+        print(archive)
+    return 0
+
+
+def cmd_decompress(args):
+    from conversions import decompress_zip
+
+    last = [-1]
+
+    def progress(done, total):
+        percent = int(done * 100 / total) if total else 100
+        if not args.quiet and percent // 10 != last[0]:
+            last[0] = percent // 10
+            print(f"[{percent}%] {done}/{total} byte", file=sys.stderr)
+
+    folder = decompress_zip(args.input, args.output, include=args.include, exclude=args.exclude,
+                            max_workers=args.workers, progress=progress)
+    if not args.quiet:
+        print(folder)
+    return 0
+
+
+def cmd_zip_convert(args):
+    from zip_pipeline import convert_zip, targets_for
+
+    if "," in args.to:
+        raise ValueError("zip-convert accetta un solo formato di destinazione (--to).")
+    out_ext = args.to if args.to.startswith(".") else "." + args.to
+    targets = targets_for(out_ext)
+    output = args.output or os.path.splitext(args.input)[0] + "_" + out_ext.lstrip(".") + ".zip"
+    if args.no_cache:
+        from cache import set_enabled
+        set_enabled(False)
+
+    def on_result(result, done, total):
+        if args.quiet:
+            return
+        status = "ok" if result["ok"] else f"ERRORE {result['error']}"
+        if result.get("copied"):
+            status += ", copiato l'originale"
+        print(f"[{done}/{total}] {result['input']} -> {result['output']} ({status})")
+
+    results = convert_zip(args.input, output, targets, include=args.include,
+                          exclude=args.exclude, copy_others=not args.only_converted,
+                          max_workers=args.workers, options=image_options(args), on_result=on_result)
+    if not args.quiet:
+        print(output)
+    return 1 if any(not r["ok"] for r in results) else 0
+
+
+def cmd_cache(args):
+    from cache import get_cache
+
+    cache = get_cache()
+    if args.action == "clear":
+        removed = cache.clear()
+        print(f"Voci rimosse: {removed}")
+    else:
+        for key, value in cache.stats().items():
+            print(f"{key}: {value}")
+    return 0
+
+
+def cmd_history(args):
+    from history import maintain_history
+
+    result = maintain_history(args.user, max_age_days=args.max_days, max_count=args.max_entries,
+                              compact=not args.no_compact, archive=not args.no_archive)
+    if not args.quiet:
+        print(f"Record compattati: {result['compacted']}")
+        print(f"Record archiviati: {result['archived']}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Universal Converter da riga di comando")
+    # Opzioni comuni a tutti i comandi
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-q", "--quiet", action="store_true", help="stampa solo gli errori")
+    # Opzioni delle immagini, per convert e zip-convert
+    images = argparse.ArgumentParser(add_help=False)
+    images.add_argument("--width", type=int, help="larghezza in pixel per la rasterizzazione degli SVG")
+    images.add_argument("--height", type=int, help="altezza in pixel per la rasterizzazione degli SVG")
+    images.add_argument("--dpi", type=float, help="risoluzione per la rasterizzazione degli SVG")
+    images.add_argument("--max-size", type=int, help="lato massimo in pixel delle immagini raster (miniature)")
+    images.add_argument("--max-memory", type=int,
+                        help="MB oltre i quali le immagini vengono convertite a strisce (default: 256)")
+    images.add_argument("--quality", type=int, choices=range(1, 101), metavar="1-100",
+                        help="qualità JPEG/WEBP")
+    images.add_argument("--target-size", type=int, metavar="KB",
+                        help="dimensione massima dei JPEG/WEBP: sceglie la qualità più alta che ci sta")
+    images.add_argument("--progressive", action="store_true", help="JPEG progressivi (con tabelle ottimizzate)")
+    images.add_argument("--webp-method", type=int, choices=range(7), metavar="0-6",
+                        help="sforzo di compressione WEBP (6 = file più piccoli, più lento)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", parents=[common, images], help="converte uno o più file")
+    p.add_argument("inputs", nargs="+", help="file, cartelle o pattern glob")
+    p.add_argument("--to", required=True,
+                   help="estensione di destinazione, ad es. .pdf; più formati separati da virgola (.png,.webp)")
+    p.add_argument("-o", "--output-dir", help="cartella di output (default: accanto all'input)")
+    p.add_argument("-r", "--recursive", action="store_true", help="visita le sottocartelle e abilita '**'")
+    p.add_argument("-j", "--workers", type=int, default=None, help="processi paralleli (default: numero di core)")
+    p.add_argument("--no-cache", action="store_true", help="ignora la cache delle conversioni")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("merge", parents=[common], help="unisce più PDF")
+    p.add_argument("inputs", nargs="+", help="PDF, cartelle o pattern glob (nell'ordine indicato)")
+    p.add_argument("-o", "--output", required=True, help="PDF di output")
+    p.add_argument("-r", "--recursive", action="store_true")
+    p.add_argument("--streaming", action="store_true", default=None,
+                   help="un PDF alla volta in memoria (automatico con molti file)")
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser("images-pdf", parents=[common], help="unisce più immagini in un solo PDF")
+    p.add_argument("inputs", nargs="+", help="immagini, cartelle o pattern glob (nell'ordine indicato)")
+    p.add_argument("-o", "--output", required=True, help="PDF di output")
+    p.add_argument("-r", "--recursive", action="store_true")
+    p.add_argument("--dpi", type=float, help="risoluzione delle pagine (default: quella delle immagini)")
+    p.set_defaults(func=cmd_images_pdf)
+
+    p = sub.add_parser("split", parents=[common], help="estrae pagine da un PDF")
+    p.add_argument("input")
+    mode = p.add_mutually_exclusive_group(required=True)
+    mode.add_argument("-p", "--pages", help="intervalli di pagine da estrarre in un unico file, ad es. 1-3,5")
+    mode.add_argument("--ranges", nargs="+", help="un file per ogni intervallo indicato")
+    mode.add_argument("--every", type=int, help="un file ogni N pagine (1: un file per pagina)")
+    p.add_argument("-o", "--output", help="PDF di output (con --pages)")
+    p.add_argument("-d", "--output-dir", help="cartella di output (con --ranges/--every)")
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser("text", parents=[common], help="estrae il testo di un PDF pagina per pagina")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", help="file di output (default: accanto al PDF)")
+    p.add_argument("--format", choices=["text", "jsonl"], default="text")
+    p.add_argument("--engine", choices=["auto", "pypdf2", "pdftotext"], default="auto")
+    p.add_argument("-j", "--workers", type=int, default=None, help="processi paralleli")
+    p.set_defaults(func=cmd_text)
+
+    p = sub.add_parser("compress", parents=[common], help="comprime una cartella in ZIP")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", help="file ZIP di output")
+    p.add_argument("-l", "--level", type=int, default=6, choices=range(10), metavar="0-9",
+                   help="livello di compressione (0 = nessuna compressione)")
+    p.add_argument("-j", "--workers", type=int, default=None, help="thread di compressione")
+    p.add_argument("--incremental", action="store_true",
+                   help="ricomprime solo i file cambiati dall'ultima esecuzione (manifest accanto allo ZIP)")
+    p.set_defaults(func=cmd_compress)
+
+    p = sub.add_parser("decompress", parents=[common], help="decomprime un archivio ZIP")
+    p.add_argument("input")
+    p.add_argument("-o", "--output", help="cartella di output")
+    p.add_argument("--include", nargs="+", help="estrae solo le voci che corrispondono ai pattern (ad es. 'docs/*.pdf')")
+    p.add_argument("--exclude", nargs="+", help="salta le voci che corrispondono ai pattern")
+    p.add_argument("-j", "--workers", type=int, default=None, help="thread di estrazione")
+    p.set_defaults(func=cmd_decompress)
+
+    p = sub.add_parser("zip-convert", parents=[common, images],
+                       help="converte i file dentro uno ZIP in un nuovo ZIP, senza estrarlo")
+    p.add_argument("input")
+    p.add_argument("--to", required=True, help="estensione di destinazione, ad es. .pdf")
+    p.add_argument("-o", "--output", help="ZIP di output (default: <input>_<formato>.zip)")
+    p.add_argument("--include", nargs="+", help="converte solo le voci che corrispondono ai pattern")
+    p.add_argument("--exclude", nargs="+", help="non converte le voci che corrispondono ai pattern")
+    p.add_argument("--only-converted", action="store_true", help="non copia le voci non convertite")
+    p.add_argument("-j", "--workers", type=int, default=None, help="processi paralleli")
+    p.add_argument("--no-cache", action="store_true", help="non usa la cache delle conversioni")
+    p.set_defaults(func=cmd_zip_convert)
+
+    p = sub.add_parser("cache", parents=[common], help="statistiche o svuotamento della cache")
+    p.add_argument("action", choices=["stats", "clear"])
+    p.set_defaults(func=cmd_cache)
+
+    p = sub.add_parser("history", parents=[common],
+                       help="compatta la cronologia e archivia i record più vecchi")
+    p.add_argument("-u", "--user", help="solo questo utente (default: tutti)")
+    p.add_argument("--max-days", type=int, help="giorni di cronologia da conservare")
+    p.add_argument("--max-entries", type=int, help="record da conservare per utente")
+    p.add_argument("--no-compact", action="store_true", help="non unire le conversioni ripetute")
+    p.add_argument("--no-archive", action="store_true",
+                   help="elimina i record oltre i limiti senza archiviarli")
+    p.set_defaults(func=cmd_history)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Errore: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    # Necessario per il pool di processi quando il comando è impacchettato
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,33 +1,60 @@
 import os
+import sys
 import subprocess
 import shutil
-from docx2pdf import convert as docx2pdf_convert
-from pdf2docx import Converter as PDF2DocxConverter
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
-from PIL import Image
-import cairosvg
-import docx
-
-def convert_docx_to_pdf(input_path, output_path=None):
+
+from cache import cached
+
+# I backend (docx2pdf, pdf2docx, PyPDF2, Pillow, cairosvg, python-docx) vengono importati
+# dentro le singole funzioni: chi importa questo modulo (ad es. la CLI) paga solo il costo
+# del backend effettivamente usato.
+
+@cached(".pdf")
+def convert_docx_to_pdf(input_path, output_path=None, backend="auto"):
+    """
+    backend: "office" usa il pool di LibreOffice headless (office_pool.py),
+    "docx2pdf" richiede Microsoft Word; con "auto" su Linux si usa LibreOffice.
+    """
     if not output_path:
         base, _ = os.path.splitext(input_path)
         output_path = base + ".pdf"
-    docx2pdf_convert(input_path, output_path)
+    if backend == "auto":
+        backend = "office" if sys.platform.startswith("linux") else "docx2pdf"
+    if backend == "office":
+        from office_pool import get_pool
+        get_pool().convert(input_path, output_path)
+    else:
+        from docx2pdf import convert as docx2pdf_convert
+        docx2pdf_convert(input_path, output_path)
     return output_path
 
-def convert_pdf_to_docx(input_pdf, output_docx=None):
+@cached(".docx", ignore=("parallel", "chunk_pages", "max_workers"))
+def convert_pdf_to_docx(input_pdf, output_docx=None, parallel=True, chunk_pages=None, max_workers=None, progress=None):
+    """
+    Con parallel=True i PDF lunghi vengono convertiti su più processi (vedi pdf_docx.py):
+    chunk_pages è il numero di pagine per blocco e progress(done, total) riporta i
+    blocchi completati.
+    """
     if not output_docx:
         base, _ = os.path.splitext(input_pdf)
         output_docx = base + ".docx"
+    if parallel:
+        from pdf_docx import convert_pdf_to_docx_parallel
+        return convert_pdf_to_docx_parallel(
+            input_pdf, output_docx, chunk_pages=chunk_pages, max_workers=max_workers, progress=progress
+        )
+    from pdf2docx import Converter as PDF2DocxConverter
     pdf2docx = PDF2DocxConverter(input_pdf)
     pdf2docx.convert(output_docx, start=0, end=None)
     pdf2docx.close()
     return output_docx
 
+@cached(".txt")
 def convert_docx_to_txt(input_docx, output_txt=None):
     if not output_txt:
         base, _ = os.path.splitext(input_docx)
         output_txt = base + ".txt"
+    import docx
     d = docx.Document(input_docx)
     text_paragraphs = [para.text for para in d.paragraphs]
     full_text = "\n".join(text_paragraphs)
@@ -35,67 +62,314 @@ def convert_docx_to_txt(input_docx, output_txt=None):
         f.write(full_text)
     return output_txt
 
-def convert_pdf_to_txt(input_pdf, output_txt=None):
+@cached(".txt", ignore=("max_workers",))
+def convert_pdf_to_txt(input_pdf, output_txt=None, fmt="text", max_workers=None, progress=None):
+    """
+    Estrae il testo del PDF nel processo corrente, pagina per pagina e in parallelo
+    (vedi pdf_text.py); pdftotext viene usato solo se PyPDF2 non è disponibile.
+    fmt="jsonl" scrive una riga JSON per pagina.
+    """
+    from pdf_text import extract_pdf_text
     if not output_txt:
         base, _ = os.path.splitext(input_pdf)
         output_txt = base + ".txt"
-    cmd = ["pdftotext", input_pdf, output_txt]
-    process = subprocess.run(cmd, capture_output=True, text=True)
-    if process.returncode != 0:
-        raise RuntimeError(f"Errore conversione pdf->txt: {process.stderr}")
+    extract_pdf_text(input_pdf, output_txt, fmt=fmt, max_workers=max_workers, progress=progress)
     return output_txt
 
-def convert_image(input_img, output_path):
+def _render_svg(input_img, width=None, height=None, dpi=None, tree=None):
+    """
+    Rasterizza un SVG direttamente in memoria e restituisce un'immagine Pillow RGBA,
+    senza passare da un PNG temporaneo. Con width o height (in pixel) l'SVG viene
+    disegnato già alla dimensione finale mantenendo le proporzioni se ne è indicata
+    una sola; dpi cambia la risoluzione di riferimento (default 96). tree è l'SVG
+    già analizzato (cairosvg.parser.Tree), se disponibile.
+    """
+    import sys
+    import io
+    from PIL import Image
+    if sys.byteorder != "little":
+        # Il buffer cairo è ARGB premoltiplicato in ordine nativo: Pillow lo legge
+        # direttamente solo su little-endian, altrimenti passiamo da un PNG in memoria
+        import cairosvg
+        png = cairosvg.svg2png(url=input_img, dpi=dpi or 96, output_width=width, output_height=height)
+        im = Image.open(io.BytesIO(png))
+        im.load()
+        return im
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PNGSurface
+    tree = tree or Tree(url=input_img)
+    # output=None: cairosvg disegna sulla superficie in memoria senza scrivere nulla
+    surface = PNGSurface(tree, None, dpi or 96, output_width=width, output_height=height)
+    cairo_surface = surface.cairo
+    cairo_surface.flush()
+    size = (cairo_surface.get_width(), cairo_surface.get_height())
+    im = Image.frombuffer(
+        "RGBA", size, bytes(cairo_surface.get_data()), "raw", "BGRa", cairo_surface.get_stride(), 1
+    )
+    surface.finish()
+    return im
+
+@cached(ignore=("max_memory",))
+def convert_image(input_img, output_path, width=None, height=None, dpi=None, max_size=None, max_memory=None,
+                  quality=None, target_size=None, progressive=False, webp_method=None):
+    """
+    Converte un'immagine nel formato indicato dall'estensione di output_path.
+    Per gli SVG width/height/dpi stabiliscono la dimensione di rasterizzazione.
+    Per le immagini raster max_size limita il lato maggiore (in pixel) senza
+    decodificare l'immagine a piena risoluzione (vedi images.py); oltre max_memory
+    byte l'immagine viene convertita a strisce (vedi image_tiles.py).
+    JPEG/WEBP: quality fissa, oppure target_size (byte) per la qualità più alta che
+    sta nel limite; progressive per i JPEG, webp_method (0-6) per i WEBP.
+    """
     ext_in = os.path.splitext(input_img)[1].lower()
     ext_out = os.path.splitext(output_path)[1].lower()
     if ext_in == ".svg":
+        import cairosvg
+        size_opts = {"dpi": dpi or 96, "output_width": width, "output_height": height}
         if ext_out == ".png":
-            cairosvg.svg2png(url=input_img, write_to=output_path)
+            cairosvg.svg2png(url=input_img, write_to=output_path, **size_opts)
         elif ext_out == ".pdf":
-            cairosvg.svg2pdf(url=input_img, write_to=output_path)
+            cairosvg.svg2pdf(url=input_img, write_to=output_path, **size_opts)
         elif ext_out == ".svg":
             shutil.copy(input_img, output_path)
-        elif ext_out in [".jpg", ".jpeg"]:
-            temp_png = output_path + "_temp.png"
-            cairosvg.svg2png(url=input_img, write_to=temp_png)
-            with Image.open(temp_png) as im:
-                rgb_im = im.convert("RGB")
-                rgb_im.save(output_path, "JPEG")
-            os.remove(temp_png)
-        elif ext_out == ".webp":
-            temp_png = output_path + "_temp.png"
-            cairosvg.svg2png(url=input_img, write_to=temp_png)
-            with Image.open(temp_png) as im:
-                im.save(output_path, "WEBP")
-            os.remove(temp_png)
         else:
-            raise ValueError("Formato di output non gestito per file SVG.")
+            # Formati raster: stesse opzioni di codifica delle immagini raster
+            from images import save_image
+            save_image(_render_svg(input_img, width, height, dpi), output_path, target_size=target_size,
+                       quality=quality, progressive=progressive, webp_method=webp_method)
     else:
-        with Image.open(input_img) as im:
-            if ext_out in [".jpg", ".jpeg"]:
-                im = im.convert("RGB")
-                im.save(output_path, "JPEG")
-            elif ext_out == ".webp":
-                im.save(output_path, "WEBP")
-            else:
-                im.save(output_path)
+        from images import convert_raster
+        convert_raster(input_img, output_path, max_size=max_size, max_memory=max_memory, quality=quality,
+                       target_size=target_size, progressive=progressive, webp_method=webp_method)
     return output_path
 
-def merge_pdfs(pdf_list, output_pdf):
-    merger = PdfMerger()
-    for pdf in pdf_list:
-        merger.append(pdf)
-    merger.write(output_pdf)
-    merger.close()
+# Oltre questo numero di file merge_pdfs usa automaticamente la modalità streaming
+STREAMING_MERGE_THRESHOLD = 200
+
+class _PdfStreamWriter:
+    """
+    Scrive un PDF un oggetto alla volta: ogni documento sorgente viene copiato
+    nel file di output e poi rilasciato. In memoria restano solo gli offset degli
+    oggetti scritti e la lista delle pagine, non il contenuto dei documenti.
+    Gli oggetti 1 (albero delle pagine) e 2 (catalogo) sono scritti alla fine.
+    """
+    PAGES_NUM = 1
+    CATALOG_NUM = 2
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.offsets = [None, None]
+        self.kids = []
+        fp.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _alloc(self):
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def _write_object(self, num, obj):
+        self.offsets[num - 1] = self.fp.tell()
+        self.fp.write(b"%d 0 obj\n" % num)
+        obj.write_to_stream(self.fp, None)
+        self.fp.write(b"\nendobj\n")
+
+    def add_document(self, reader):
+        from copy import copy
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NullObject
+
+        mapping = {}
+        pending = []
+
+        def new_ref(ref):
+            key = (ref.idnum, ref.generation)
+            num = mapping.get(key)
+            if num is None:
+                num = self._alloc()
+                mapping[key] = num
+                pending.append((ref, num))
+            return IndirectObject(num, 0, None)
+
+        def remap(obj):
+            # Copia dell'oggetto con i riferimenti del documento sorgente sostituiti dai
+            # nuovi numeri. Gli oggetti del reader non vengono modificati: PyPDF2 dà a
+            # più pagine lo stesso dizionario ereditato (es. /Resources inline nel nodo Pages)
+            if isinstance(obj, IndirectObject):
+                return new_ref(obj)
+            if isinstance(obj, DictionaryObject):
+                new = copy(obj)
+                for key, value in list(dict.items(obj)):
+                    dict.__setitem__(new, key, remap(value))
+                return new
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(remap(value) for value in obj)
+            return obj
+
+        # I numeri delle pagine vengono riservati prima: i link tra pagine dello
+        # stesso documento puntano così alle nuove pagine e non all'albero originale
+        pages = []
+        for page in reader.pages:
+            num = self._alloc()
+            ref = page.indirect_reference
+            if ref is not None:
+                mapping[(ref.idnum, ref.generation)] = num
+            pages.append((page, num))
+
+        for page, num in pages:
+            page = DictionaryObject(
+                (key, remap(value)) for key, value in dict.items(page) if key != "/Parent"
+            )
+            page[NameObject("/Parent")] = IndirectObject(self.PAGES_NUM, 0, None)
+            self._write_object(num, page)
+            self.kids.append(num)
+            while pending:
+                ref, obj_num = pending.pop()
+                obj = ref.get_object()
+                if obj is None:
+                    obj = NullObject()
+                self._write_object(obj_num, remap(obj))
+
+    def _write_stream(self, num, entries, data):
+        self.offsets[num - 1] = self.fp.tell()
+        self.fp.write(b"%d 0 obj\n<< %s /Length %d >>\nstream\n" % (num, entries.encode("ascii"), len(data)))
+        self.fp.write(data)
+        self.fp.write(b"\nendstream\nendobj\n")
+
+    def _write_raw(self, num, body):
+        self.offsets[num - 1] = self.fp.tell()
+        self.fp.write(b"%d 0 obj\n%s\nendobj\n" % (num, body.encode("ascii")))
+
+    def add_image_page(self, image):
+        """
+        Aggiunge una pagina con una sola immagine (images.PdfImage) a tutta pagina.
+        I dati dell'immagine sono scritti subito e poi possono essere rilasciati.
+        """
+        w = image.width * 72.0 / image.dpi
+        h = image.height * 72.0 / image.dpi
+        # Matrice che applica l'orientamento EXIF (le immagini ruotate di 90° scambiano i lati)
+        matrix, page_w, page_h = {
+            1: ((w, 0, 0, h, 0, 0), w, h),
+            3: ((-w, 0, 0, -h, w, h), w, h),
+            6: ((0, -w, h, 0, 0, w), h, w),
+            8: ((0, w, -h, 0, h, 0), h, w),
+        }[image.orientation]
+
+        smask_ref = ""
+        if image.smask is not None:
+            smask_num = self._alloc()
+            self._write_stream(smask_num, "/Type /XObject /Subtype /Image /Width %d /Height %d "
+                               "/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode"
+                               % (image.width, image.height), image.smask)
+            smask_ref = " /SMask %d 0 R" % smask_num
+        decode = " /Decode [%s]" % " ".join(str(v) for v in image.decode) if image.decode else ""
+        img_num = self._alloc()
+        self._write_stream(img_num, "/Type /XObject /Subtype /Image /Width %d /Height %d "
+                           "/ColorSpace %s /BitsPerComponent 8 /Filter %s%s%s"
+                           % (image.width, image.height, image.colorspace, image.filter_name,
+                              decode, smask_ref), image.data)
+        content_num = self._alloc()
+        content = "q %s cm /Im0 Do Q" % " ".join("%.4f" % v for v in matrix)
+        self._write_stream(content_num, "", content.encode("ascii"))
+        page_num = self._alloc()
+        self._write_raw(page_num, "<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] "
+                        "/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                        % (self.PAGES_NUM, page_w, page_h, img_num, content_num))
+        self.kids.append(page_num)
+
+    def finish(self):
+        from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+        pages = DictionaryObject()
+        pages[NameObject("/Type")] = NameObject("/Pages")
+        pages[NameObject("/Kids")] = ArrayObject(IndirectObject(n, 0, None) for n in self.kids)
+        pages[NameObject("/Count")] = NumberObject(len(self.kids))
+        self._write_object(self.PAGES_NUM, pages)
+        catalog = DictionaryObject()
+        catalog[NameObject("/Type")] = NameObject("/Catalog")
+        catalog[NameObject("/Pages")] = IndirectObject(self.PAGES_NUM, 0, None)
+        self._write_object(self.CATALOG_NUM, catalog)
+
+        xref_pos = self.fp.tell()
+        self.fp.write(b"xref\n0 %d\n" % (len(self.offsets) + 1))
+        self.fp.write(b"0000000000 65535 f\r\n")
+        for offset in self.offsets:
+            self.fp.write(b"%010d 00000 n\r\n" % offset)
+        self.fp.write(b"trailer\n<< /Size %d /Root %d 0 R >>\n" % (len(self.offsets) + 1, self.CATALOG_NUM))
+        self.fp.write(b"startxref\n%d\n%%%%EOF\n" % xref_pos)
+
+def images_to_pdf(image_paths, output_pdf, dpi=None, progress=None):
+    """
+    Unisce le immagini (comprese le pagine dei TIFF/GIF multipagina) in un solo PDF,
+    una pagina per immagine. I JPEG vengono incorporati senza ricodifica e le pagine
+    sono scritte una alla volta: in memoria c'è al massimo un'immagine.
+
+    - dpi: risoluzione per calcolare la dimensione della pagina (default: quella
+      indicata nel file, altrimenti 72).
+    - progress(done, total, path): chiamata dopo ogni immagine.
+    """
+    from images import iter_pdf_images
+    image_paths = list(image_paths)
+    tmp_pdf = output_pdf + ".part"
+    try:
+        with open(tmp_pdf, "wb") as f:
+            writer = _PdfStreamWriter(f)
+            for idx, path in enumerate(image_paths):
+                for image in iter_pdf_images(path, dpi):
+                    writer.add_image_page(image)
+                if progress:
+                    progress(idx + 1, len(image_paths), path)
+            writer.finish()
+        os.replace(tmp_pdf, output_pdf)
+    finally:
+        if os.path.exists(tmp_pdf):
+            os.remove(tmp_pdf)
     return output_pdf
 
-def convert_pdf_to_pages(pdf_file, output_pages=None):
-    docx_temp = convert_pdf_to_docx(pdf_file)
-    if not output_pages:
-        base, _ = os.path.splitext(pdf_file)
-        output_pages = base + ".pages"
-    docx_to_pages(docx_temp, output_pages)
-    return output_pages
+def merge_pdfs(pdf_list, output_pdf, streaming=None, progress=None):
+    """
+    Unisce i PDF di pdf_list (nell'ordine) in output_pdf.
+
+    - streaming: se True i documenti vengono aperti e copiati uno alla volta, quindi
+      la memoria dipende dal PDF più grande e non dalla somma e c'è un solo file
+      aperto per volta; segnalibri e destinazioni nominate non vengono copiati.
+      Con None (default) la modalità streaming si attiva oltre
+      STREAMING_MERGE_THRESHOLD file.
+    - progress(done, total, path): chiamata dopo ogni PDF aggiunto.
+    """
+    pdf_list = list(pdf_list)
+    total = len(pdf_list)
+    if streaming is None:
+        streaming = total > STREAMING_MERGE_THRESHOLD
+
+    if not streaming:
+        from PyPDF2 import PdfMerger
+        merger = PdfMerger()
+        for idx, pdf in enumerate(pdf_list):
+            merger.append(pdf)
+            if progress:
+                progress(idx + 1, total, pdf)
+        merger.write(output_pdf)
+        merger.close()
+        return output_pdf
+
+    from PyPDF2 import PdfReader
+    try:
+        with open(output_pdf, "wb") as out:
+            writer = _PdfStreamWriter(out)
+            for idx, pdf in enumerate(pdf_list):
+                with open(pdf, "rb") as f:
+                    reader = PdfReader(f)
+                    if reader.is_encrypted:
+                        reader.decrypt("")
+                    writer.add_document(reader)
+                    del reader
+                if progress:
+                    progress(idx + 1, total, pdf)
+            writer.finish()
+    except Exception:
+        # Non lasciamo un PDF incompleto
+        if os.path.exists(output_pdf):
+            os.remove(output_pdf)
+        raise
+    return output_pdf
 
 def docx_to_pages(docx_file, pages_file=None):
     if not pages_file:
@@ -118,59 +392,255 @@ def docx_to_pages(docx_file, pages_file=None):
     return pages_file
 
 def split_pdf(input_pdf, output_pdf, pages_string):
+    from PyPDF2 import PdfReader, PdfWriter
     reader = PdfReader(input_pdf)
     writer = PdfWriter()
-    pages_to_extract = parse_page_ranges(pages_string)
-    for p in pages_to_extract:
-        idx = p - 1
-        if 0 <= idx < len(reader.pages):
-            writer.add_page(reader.pages[idx])
+    selection = parse_page_ranges(pages_string)
+    for idx in selection.iter_pages(len(reader.pages)):
+        writer.add_page(reader.pages[idx])
     with open(output_pdf, "wb") as f:
         writer.write(f)
     return output_pdf
 
-def parse_page_ranges(pages_string):
-    result = []
-    parts = pages_string.split(",")
-    for part in parts:
-        part = part.strip()
+def split_pdf_multi(input_pdf, ranges=None, every=None, output_dir=None, max_workers=None, progress=None):
+    """
+    Divide un PDF in più file con una sola lettura del documento.
+
+    - ranges: lista di intervalli (es. ["1-10", "11-25,30"]): un file per ciascuno.
+    - every: un file ogni N pagine (every=1: un file per pagina).
+    - output_dir: cartella di output (default: quella del PDF); i file si chiamano
+      <nome>_<pagine>.pdf.
+    - progress(done, total, path): chiamata dopo ogni file scritto.
+
+    Le pagine vengono copiate dal documento in ordine, mentre la scrittura dei file
+    avviene in parallelo su un pool di thread. Restituisce i percorsi creati.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    from PyPDF2 import PdfReader, PdfWriter
+
+    if (ranges is None) == (every is None):
+        raise ValueError("Indicare gli intervalli oppure il numero di pagine per file.")
+    reader = PdfReader(input_pdf)
+    page_count = len(reader.pages)
+    base = os.path.splitext(os.path.basename(input_pdf))[0]
+    output_dir = output_dir or os.path.dirname(os.path.abspath(input_pdf))
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Ogni parte è una coppia (etichetta per il nome del file, indici di pagina 0-based)
+    if every is not None:
+        if every < 1:
+            raise ValueError("Il numero di pagine per file deve essere almeno 1.")
+        width = len(str(page_count))
+        parts = []
+        for start in range(1, page_count + 1, every):
+            end = min(start + every - 1, page_count)
+            label = f"{start:0{width}d}" if start == end else f"{start:0{width}d}-{end:0{width}d}"
+            parts.append((label, range(start - 1, end)))
+    else:
+        # Tutti gli intervalli vengono verificati prima di scrivere qualunque file
+        parts = [
+            (spec.replace(" ", "").replace(",", "_").replace(":", "-"),
+             parse_page_ranges(spec, page_count).iter_pages(page_count))
+            for spec in ranges
+        ]
+
+    def write(writer, path):
+        with open(path, "wb") as f:
+            writer.write(f)
+        return path
+
+    outputs = []
+    pending = deque()
+    done = 0
+    total = len(parts)
+
+    def wait_oldest():
+        nonlocal done
+        fut, path = pending.popleft()
+        fut.result()
+        done += 1
+        if progress:
+            progress(done, total, path)
+
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for label, pages in parts:
+            # La copia delle pagine legge dal documento sorgente: resta sequenziale
+            writer = PdfWriter()
+            for idx in pages:
+                writer.add_page(reader.pages[idx])
+            path = os.path.join(output_dir, f"{base}_{label}.pdf")
+            outputs.append(path)
+            pending.append((pool.submit(write, writer, path), path))
+            # Limita i writer in memoria in attesa di essere scritti
+            if len(pending) >= max_workers * 2:
+                wait_oldest()
+        while pending:
+            wait_oldest()
+    return outputs
+
+class PageRanges:
+    """
+    Selezione di pagine rappresentata come lista di intervalli, senza mai costruire
+    la lista completa delle pagine. Sintassi (elementi separati da virgola):
+
+    - "5"          una pagina
+    - "1-10"       intervallo; "10-1" lo stesso in ordine inverso
+    - "5-"         dalla pagina 5 all'ultima
+    - "-3"         dalla prima pagina alla 3
+    - "end"        l'ultima pagina (anche dentro un intervallo: "end-1")
+    - "odd"/"even" (o "dispari"/"pari") tutte le pagine dispari/pari;
+      come suffisso filtra un intervallo: "1-20:odd"
+
+    Le pagine sono 1-based e vengono restituite nell'ordine in cui sono scritte.
+    Un elemento che non seleziona nessuna pagina (ad es. "2-2:odd") è un errore.
+    """
+    _PARITY = {"odd": 1, "dispari": 1, "even": 0, "pari": 0}
+
+    def __init__(self, pages_string):
+        # Ogni intervallo è (start, end, parità); None = prima/ultima pagina del documento
+        self.intervals = []
+        for part in pages_string.split(","):
+            part = part.strip().lower()
+            if part:
+                self.intervals.append(self._parse_part(part))
+        if not self.intervals:
+            raise ValueError("Nessuna pagina indicata.")
+
+    @classmethod
+    def _parse_part(cls, part):
+        parity = None
+        if ":" in part:
+            part, selector = part.split(":", 1)
+            if selector.strip() not in cls._PARITY:
+                raise ValueError(f"Selettore di pagine non valido: '{selector}'")
+            parity = cls._PARITY[selector.strip()]
+            part = part.strip()
+        if part in cls._PARITY:
+            if parity is not None:
+                raise ValueError(f"Selettore di pagine non valido: '{part}:{selector.strip()}'")
+            return (1, None, cls._PARITY[part])
         if "-" in part:
-            start, end = part.split("-")
-            start, end = int(start), int(end)
-            result.extend(range(start, end + 1))
-        else:
-            result.append(int(part))
-    return sorted(set(result))
+            start, end = (x.strip() for x in part.split("-", 1))
+            return (cls._parse_page(start, None), cls._parse_page(end, None), parity)
+        page = cls._parse_page(part, None)
+        return (page, page, parity)
+
+    @staticmethod
+    def _parse_page(token, default):
+        if token == "":
+            return default
+        if token == "end":
+            return "end"
+        if not token.isdigit() or int(token) < 1:
+            raise ValueError(f"Numero di pagina non valido: '{token}'")
+        return int(token)
+
+    def resolve(self, page_count):
+        """
+        Controlla la selezione rispetto al numero reale di pagine e restituisce
+        gli intervalli come oggetti range (0-based, pronti per reader.pages).
+        """
+        resolved = []
+        for start, end, parity in self.intervals:
+            start = 1 if start is None else (page_count if start == "end" else start)
+            end = page_count if end in (None, "end") else end
+            for page in (start, end):
+                if not 1 <= page <= page_count:
+                    raise ValueError(
+                        f"Pagina {page} fuori intervallo: il documento ha {page_count} pagine."
+                    )
+            step = 1 if end >= start else -1
+            first = start
+            if parity is not None:
+                # Allinea l'estremo iniziale alla parità richiesta e salta di due
+                if start % 2 != parity:
+                    start += step
+                step *= 2
+            r = range(start - 1, end - 1 + (1 if step > 0 else -1), step)
+            if not len(r):
+                # Solo con la parità: ad es. "2-2:odd" o "even" su un documento di una pagina
+                raise ValueError(f"Nessuna pagina {'pari' if parity == 0 else 'dispari'} "
+                                 f"tra la pagina {first} e la {end}.")
+            resolved.append(r)
+        return resolved
+
+    def count(self, page_count):
+        return sum(len(r) for r in self.resolve(page_count))
+
+    def iter_pages(self, page_count):
+        """Indici 0-based delle pagine selezionate, generati uno alla volta."""
+        resolved = self.resolve(page_count)
+        return (idx for r in resolved for idx in r)
+
+    def __repr__(self):
+        return f"PageRanges({self.intervals!r})"
 
-def compress_folder(input_folder, output_zip=None):
+def parse_page_ranges(pages_string, page_count=None):
+    """
+    Interpreta una stringa di intervalli (vedi PageRanges). Se page_count è noto
+    la selezione viene verificata subito e un errore segnala le pagine inesistenti.
+    """
+    selection = PageRanges(pages_string)
+    if page_count is not None:
+        selection.resolve(page_count)
+    return selection
+
+def compress_folder(input_folder, output_zip=None, level=6, max_workers=None, progress=None, incremental=False):
     """
     Comprimi la cartella 'input_folder' in un file ZIP.
     Se output_zip non viene fornito, viene creato un file con lo stesso nome della cartella + ".zip".
+    La compressione avviene in parallelo (vedi archive.py): level è il livello deflate
+    (0-9) e progress(done_bytes, total_bytes) riporta i byte elaborati.
+    Con incremental=True i file invariati dall'ultima esecuzione vengono copiati dal
+    vecchio archivio senza ricomprimerli (manifest accanto allo ZIP).
     """
+    from archive import compress_folder as compress_folder_parallel, compress_folder_incremental
     if not os.path.isdir(input_folder):
         raise ValueError("Il percorso fornito non è una cartella.")
     # Se non è stato fornito output_zip, crea il percorso di output basato sul nome della cartella
     if not output_zip:
-        base_name = os.path.join(os.path.dirname(input_folder), os.path.basename(input_folder))
-        output_zip = base_name + ".zip"
-    else:
-        base_name = os.path.splitext(output_zip)[0]
-    # La funzione make_archive restituisce il percorso dell'archivio creato
-    archive_path = shutil.make_archive(base_name, 'zip', root_dir=input_folder)
-    return archive_path
-
-import zipfile
+        output_zip = os.path.normpath(input_folder) + ".zip"
+    if incremental:
+        return compress_folder_incremental(input_folder, output_zip, level=level, max_workers=max_workers,
+                                           progress=progress)[0]
+    return compress_folder_parallel(input_folder, output_zip, level=level, max_workers=max_workers,
+                                    progress=progress)
 
-def decompress_zip(input_zip, output_folder=None):
+def decompress_zip(input_zip, output_folder=None, include=None, exclude=None, max_workers=None, progress=None):
     """
     Decomprime il file ZIP 'input_zip' in una cartella.
     Se 'output_folder' non viene fornito, viene creato un output basato sul nome del file ZIP.
+    Le voci vengono estratte in parallelo (vedi archive.extract_zip): include/exclude
+    sono pattern glob sui nomi delle voci, progress(done_bytes, total_bytes) riporta i
+    byte estratti e i file già presenti con stessa dimensione e CRC vengono saltati.
     """
+    from archive import extract_zip
     if not output_folder:
         base, _ = os.path.splitext(input_zip)
         output_folder = base + "_unzipped"
-    with zipfile.ZipFile(input_zip, 'r') as zip_ref:
-        zip_ref.extractall(output_folder)
+    extract_zip(input_zip, output_folder, include=include, exclude=exclude, max_workers=max_workers,
+                progress=progress)
     return output_folder
 
+def convert_file(in_path, out_path, **image_options):
+    """
+    Esegue la conversione di un singolo file. È una funzione di modulo (e non un metodo
+    della GUI) così può essere eseguita anche nei processi del motore batch.
+    Il percorso (anche in più passaggi) viene scelto dal grafo delle conversioni
+    (router.py); image_options (width, height, dpi) vengono passati alla conversione
+    delle immagini.
+    """
+    ext_in = os.path.splitext(in_path)[1].lower()
+    ext_out = os.path.splitext(out_path)[1].lower()
+
+    # Se l'input è un file ZIP e l'utente ha scelto di decomprimerlo
+    if ext_in == ".zip" and ext_out == ".unzipped":
+        return decompress_zip(in_path)
+
+    from router import get_graph
+    get_graph().convert(in_path, out_path, **image_options)
+    return out_path
+
 
@@ -0,0 +1,293 @@
+"""
+Conversione di un file in più formati in una sola passata.
+
+Per le immagini il file viene decodificato (raster) o analizzato (SVG) una volta
+sola: la stessa bitmap viene passata a tutti gli encoder, che lavorano in parallelo
+su un pool di thread (Pillow rilascia il GIL durante la codifica), ognuno su una
+copia in memoria; i thread sono limitati perché le copie stiano nel budget di
+memoria. Da un SVG il PDF viene disegnato in vettoriale dallo stesso albero già
+analizzato.
+
+Per gli altri formati ogni output segue il percorso del grafo delle conversioni
+(router.py): i passaggi intermedi comuni a più output vengono eseguiti una volta
+sola e condivisi.
+
+run_fan_out converte più input, ognuno in più formati, su un pool di processi
+come batch.run_batch (un convert_to_many per processo).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Output che images.save_image sa scrivere da una bitmap già decodificata
+_BITMAP_OUTPUTS = (".jpg", ".jpeg", ".png", ".webp", ".pdf", ".gif", ".bmp", ".tif", ".tiff")
+_SAVE_OPTIONS = ("quality", "target_size", "progressive", "webp_method")
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _result(in_path, out_path, start, error=None):
+    return {
+        "input": in_path,
+        "output": out_path,
+        "ok": error is None,
+        "error": error,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def _run_tasks(tasks, max_workers, on_result):
+    """tasks: lista di (output, funzione senza argomenti). Risultati nell'ordine dei task."""
+    results = [None] * len(tasks)
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks) or 1))) as pool:
+        futures = {pool.submit(func): idx for idx, (_, func) in enumerate(tasks)}
+        for fut in as_completed(futures):
+            idx = futures[fut]
+            results[idx] = fut.result()
+            done += 1
+            if on_result:
+                on_result(results[idx], done, len(tasks))
+    return results
+
+
+def _encode_task(im, in_path, out_path, save_options, copy):
+    from images import save_image
+
+    def task():
+        start = time.perf_counter()
+        try:
+            # save() scrive attributi sull'oggetto (encoderinfo): in parallelo ogni
+            # thread codifica una propria copia, creata solo quando il task parte
+            save_image(im.copy() if copy else im, out_path, **save_options)
+            return _result(in_path, out_path, start)
+        except Exception as e:
+            return _result(in_path, out_path, start, f"{type(e).__name__}: {e}")
+    return task
+
+
+def _fan_out_raster(in_path, outputs, options, max_workers, on_result):
+    from images import open_image
+
+    save_options = {k: options[k] for k in _SAVE_OPTIONS if options.get(k) is not None}
+    im = open_image(in_path, options.get("max_size"), unguarded=True)
+    try:
+        im.load()
+        copy = max_workers > 1 and len(outputs) > 1
+        tasks = [(out, _encode_task(im, in_path, out, save_options, copy)) for out in outputs]
+        return _run_tasks(tasks, max_workers, on_result)
+    finally:
+        im.close()
+
+
+def _fan_out_svg(in_path, outputs, options, max_workers, on_result):
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PDFSurface
+    from conversions import _render_svg
+
+    width, height, dpi = options.get("width"), options.get("height"), options.get("dpi")
+    save_options = {k: options[k] for k in _SAVE_OPTIONS if options.get(k) is not None}
+    tree = Tree(url=in_path)
+    results = {}
+    # PDF vettoriale e copia dell'SVG: dall'albero già analizzato, nel thread corrente
+    # (cairosvg non garantisce che l'albero sia utilizzabile da più thread)
+    for out in outputs:
+        ext = os.path.splitext(out)[1].lower()
+        if ext not in (".pdf", ".svg"):
+            continue
+        start = time.perf_counter()
+        try:
+            if ext == ".pdf":
+                PDFSurface(tree, out, dpi or 96, output_width=width, output_height=height).finish()
+            else:
+                shutil.copy(in_path, out)
+            results[out] = _result(in_path, out, start)
+        except Exception as e:
+            results[out] = _result(in_path, out, start, f"{type(e).__name__}: {e}")
+        if on_result:
+            on_result(results[out], len(results), len(outputs))
+
+    raster = [out for out in outputs if out not in results]
+    if raster:
+        im = _render_svg(in_path, width, height, dpi, tree=tree)
+        offset = len(results)
+
+        def forward(result, done, total):
+            if on_result:
+                on_result(result, offset + done, len(outputs))
+
+        copy = max_workers > 1 and len(raster) > 1
+        tasks = [(out, _encode_task(im, in_path, out, save_options, copy)) for out in raster]
+        for out, result in zip(raster, _run_tasks(tasks, max_workers, forward)):
+            results[out] = result
+    return [results[out] for out in outputs]
+
+
+def _fan_out_graph(in_path, outputs, options, max_workers, on_result):
+    from router import get_graph
+
+    graph = get_graph()
+    ext_in = os.path.splitext(in_path)[1]
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    tmp_dir = tempfile.mkdtemp(prefix="devatron_fanout_")
+    # Prefisso del percorso (chiavi degli archi) -> Future con il file intermedio
+    produced = {}
+    lock = threading.Lock()
+
+    def intermediate(steps, current):
+        key = tuple(edge.key for edge in steps)
+        with lock:
+            fut = produced.get(key)
+            owner = fut is None
+            if owner:
+                fut = produced[key] = Future()
+                target = os.path.join(tmp_dir, f"{len(produced)}_{stem}{steps[-1].dst}")
+        if owner:
+            # Il primo output che ne ha bisogno lo produce, gli altri lo attendono
+            try:
+                graph.run_edge(steps[-1], current, target, options)
+                fut.set_result(target)
+            except Exception as e:
+                fut.set_exception(e)
+        return fut.result()
+
+    def make_task(out_path):
+        def task():
+            start = time.perf_counter()
+            try:
+                steps = graph.plan(ext_in, os.path.splitext(out_path)[1])
+                current = in_path
+                for idx in range(len(steps) - 1):
+                    current = intermediate(steps[:idx + 1], current)
+                graph.run_edge(steps[-1], current, out_path, options)
+                return _result(in_path, out_path, start)
+            except Exception as e:
+                return _result(in_path, out_path, start, f"{type(e).__name__}: {e}")
+        return task
+
+    try:
+        return _run_tasks([(out, make_task(out)) for out in outputs], max_workers, on_result)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def convert_to_many(in_path, outputs, max_workers=None, on_result=None, options=None):
+    """
+    Converte in_path in tutti i percorsi di outputs (il formato è dato
+    dall'estensione), decodificando l'input una volta sola quando possibile.
+
+    - options: opzioni delle conversioni (come in batch.run_batch).
+    - on_result(result, done, total): chiamata appena un output è pronto.
+
+    Restituisce i risultati (input, output, ok, error, elapsed) nell'ordine di outputs.
+    Se l'input non si può leggere (immagine corrotta, SVG non valido) ogni output
+    non ancora prodotto riceve un risultato con l'errore, come in batch._run_job.
+    """
+    outputs = list(outputs)
+    reported = {}
+
+    def report(result, *_):
+        reported[result["output"]] = result
+        if on_result:
+            on_result(result, len(reported), len(outputs))
+
+    start = time.perf_counter()
+    try:
+        return _convert_to_many(in_path, outputs, max_workers or default_workers(), report, options or {})
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        for out in outputs:
+            if out not in reported:
+                report(_result(in_path, out, start, error))
+        return [reported[out] for out in outputs]
+
+
+def _convert_to_many(in_path, outputs, max_workers, on_result, options):
+    from images import RASTER_EXTENSIONS, _decoded_bytes
+    from image_tiles import DEFAULT_MAX_MEMORY
+
+    ext_in = os.path.splitext(in_path)[1].lower()
+    exts_out = [os.path.splitext(out)[1].lower() for out in outputs]
+
+    if ext_in == ".svg" and all(ext in _BITMAP_OUTPUTS or ext == ".svg" for ext in exts_out):
+        return _fan_out_svg(in_path, outputs, options, max_workers, on_result)
+    if ext_in in RASTER_EXTENSIONS and all(ext in _BITMAP_OUTPUTS for ext in exts_out):
+        budget = options.get("max_memory") or DEFAULT_MAX_MEMORY
+        size = max(1, _decoded_bytes(in_path, options.get("max_size")))
+        if size <= budget:
+            # Bitmap decodificata più una copia per ogni thread che codifica
+            workers = max(1, min(max_workers, budget // size - 1))
+            return _fan_out_raster(in_path, outputs, options, workers, on_result)
+    # Altri formati, o immagine da convertire a strisce: grafo con intermedi condivisi
+    return _fan_out_graph(in_path, outputs, options, max_workers, on_result)
+
+
+def _fan_out_job(in_path, outputs, max_workers, options):
+    """Eseguita nel processo worker di run_fan_out."""
+    return convert_to_many(in_path, outputs, max_workers=max_workers, options=options)
+
+
+def run_fan_out(items, max_workers=None, on_result=None, options=None):
+    """
+    Converte più file, ognuno in più formati: items è una lista di
+    (input, [output, ...]). I file vengono distribuiti su un pool di processi
+    (come batch.run_batch) e ogni processo esegue convert_to_many su un file,
+    con i core rimanenti come thread per i suoi output.
+
+    on_result(result, done, total) riceve un risultato per ogni output; i risultati
+    tornano nell'ordine degli items e dei loro output.
+    """
+    items = [(in_path, list(outputs)) for in_path, outputs in items]
+    total = sum(len(outputs) for _, outputs in items)
+    max_workers = max_workers or default_workers()
+    processes = max(1, min(max_workers, len(items)))
+    threads = max(1, max_workers // processes)
+    per_item = [None] * len(items)
+    done = 0
+
+    def collect(idx, results):
+        nonlocal done
+        per_item[idx] = results
+        for result in results:
+            done += 1
+            if on_result:
+                on_result(result, done, total)
+
+    if processes == 1:
+        for idx, (in_path, outputs) in enumerate(items):
+            offset = done
+
+            def forward(result, item_done, item_total, offset=offset):
+                if on_result:
+                    on_result(result, offset + item_done, total)
+
+            per_item[idx] = convert_to_many(in_path, outputs, max_workers=threads, on_result=forward,
+                                            options=options)
+            done += len(outputs)
+    else:
+        # "spawn" come nel batch: niente fork dello stato della GUI
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+            futures = {
+                pool.submit(_fan_out_job, in_path, outputs, threads, options): idx
+                for idx, (in_path, outputs) in enumerate(items)
+            }
+            for fut in as_completed(futures):
+                idx = futures[fut]
+                in_path, outputs = items[idx]
+                try:
+                    results = fut.result()
+                except Exception as e:
+                    # Ad es. un worker terminato in modo anomalo (BrokenProcessPool)
+                    results = [_result(in_path, out, time.perf_counter(), f"{type(e).__name__}: {e}")
+                               for out in outputs]
+                    for result in results:
+                        result["elapsed"] = 0.0
+                collect(idx, results)
+    return [result for results in per_item for result in results]
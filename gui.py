@@ -5,15 +5,18 @@ import threading
 import time
 
 import tempfile
-from history import log_conversion  # <--- IMPORT con la nuova firma
-from PyQt5.QtCore import QSettings, QDateTime, Qt, QPropertyAnimation, QEasingCurve, QRectF, pyqtSignal
+from history import log_conversion, maintain_history, maintenance_configured  # <--- IMPORT con la nuova firma
+from history_model import HistoryListModel
+from PyQt5.QtCore import (
+    QSettings, QDate, QDateTime, Qt, QPropertyAnimation, QEasingCurve, QRectF, QTimer, pyqtSignal
+)
 from PyQt5.QtGui import QFont, QIcon, QPixmap, QColor, QKeySequence, QTransform
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLabel,
     QFileDialog, QComboBox, QMessageBox, QListWidget, QLineEdit, QProgressBar,
     QStackedWidget, QDialog, QToolBar, QTabWidget, QSpinBox, QFormLayout, QCheckBox,
     QSlider, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsRectItem,
-    QListWidgetItem, QShortcut, QTextEdit
+    QListWidgetItem, QShortcut, QTextEdit, QDateEdit, QListView
 )
 
 try:
@@ -23,11 +26,24 @@ except ImportError:
 
 from conversions import (
     convert_docx_to_pdf, convert_pdf_to_docx, convert_docx_to_txt, convert_pdf_to_txt,
-    convert_image, merge_pdfs, convert_pdf_to_pages, split_pdf,
-    compress_folder, decompress_zip
+    convert_image, merge_pdfs, split_pdf, split_pdf_multi,
+    compress_folder, decompress_zip, convert_file
 )
+from batch import build_jobs, default_workers, run_batch
+from cache import is_enabled as cache_enabled, set_enabled as set_cache_enabled
+from router import get_graph
+from images import RASTER_EXTENSIONS, is_raster_job, run_image_batch
+from office_pool import latency_summary
 from cloud_integration import upload_to_drive
 
+# Voci del menu formati per convertire il contenuto di uno ZIP in un nuovo ZIP
+ZIP_CONVERT_PREFIX = "ZIP → "
+ZIP_CONVERT_TARGETS = [".pdf", ".docx", ".txt"]
+# Voce del menu formati per unire più immagini in un solo PDF
+IMAGES_PDF_ITEM = ".pdf (un solo file)"
+# Voce del menu formati per convertire un file in più formati insieme (fanout.py)
+FAN_OUT_ITEM = "Più formati..."
+
 # -------------------------------------------------------------------
 # FUNZIONI di login persistente (definite a livello globale)
 # -------------------------------------------------------------------
@@ -705,13 +721,54 @@ class ConversionOptionsDialog(QDialog):
         layout = QVBoxLayout()
         self.setLayout(layout)
         # Esempio: campi per pdf_rotation, pdf_delete_even, img_quality, ecc.
-        # ...
+        form = QFormLayout()
+        # Numero di processi usati per le conversioni multiple
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, max(1, default_workers() * 2))
+        self.spin_workers.setValue(self.advanced_options.get("max_workers") or default_workers())
+        form.addRow("Processi paralleli:", self.spin_workers)
+        # Cache delle conversioni già eseguite (vedi cache.py)
+        self.check_cache = QCheckBox("Riusa conversioni già eseguite (cache)")
+        self.check_cache.setChecked(cache_enabled())
+        form.addRow(self.check_cache)
+        # Livello di compressione ZIP (0 = archivia senza comprimere)
+        self.spin_zip_level = QSpinBox()
+        self.spin_zip_level.setRange(0, 9)
+        self.spin_zip_level.setValue(self.advanced_options.get("zip_level", 6))
+        form.addRow("Livello compressione ZIP:", self.spin_zip_level)
+        # Lato massimo delle immagini convertite (0 = dimensione originale)
+        self.spin_img_max_size = QSpinBox()
+        self.spin_img_max_size.setRange(0, 20000)
+        self.spin_img_max_size.setSuffix(" px")
+        self.spin_img_max_size.setValue(self.advanced_options.get("img_max_size") or 0)
+        form.addRow("Lato massimo immagini:", self.spin_img_max_size)
+        # Qualità JPEG/WEBP (0 = default) oppure dimensione massima del file
+        self.spin_img_quality = QSpinBox()
+        self.spin_img_quality.setRange(0, 100)
+        self.spin_img_quality.setValue(self.advanced_options.get("img_quality") or 0)
+        form.addRow("Qualità JPEG/WEBP:", self.spin_img_quality)
+        self.spin_img_target_kb = QSpinBox()
+        self.spin_img_target_kb.setRange(0, 100000)
+        self.spin_img_target_kb.setSuffix(" KB")
+        self.spin_img_target_kb.setValue((self.advanced_options.get("img_target_size") or 0) // 1024)
+        form.addRow("Dimensione massima JPEG/WEBP:", self.spin_img_target_kb)
+        self.check_progressive = QCheckBox("JPEG progressivi")
+        self.check_progressive.setChecked(bool(self.advanced_options.get("img_progressive")))
+        form.addRow(self.check_progressive)
+        layout.addLayout(form)
         btn_ok = QPushButton("OK")
         btn_ok.clicked.connect(self.accept)
         layout.addWidget(btn_ok)
     
     def accept(self):
         # Salva eventuali modifiche a self.advanced_options
+        self.advanced_options["max_workers"] = self.spin_workers.value()
+        self.advanced_options["zip_level"] = self.spin_zip_level.value()
+        self.advanced_options["img_max_size"] = self.spin_img_max_size.value() or None
+        self.advanced_options["img_quality"] = self.spin_img_quality.value() or None
+        self.advanced_options["img_target_size"] = self.spin_img_target_kb.value() * 1024 or None
+        self.advanced_options["img_progressive"] = self.check_progressive.isChecked()
+        set_cache_enabled(self.check_cache.isChecked())
         super().accept()
 
 # =========================================================
@@ -950,6 +1007,8 @@ class ImageEditorWidget(QWidget):
 #   HistoryWidget
 # =========================================================
 class HistoryWidget(QWidget):
+    maintenanceDone = pyqtSignal()
+
     def __init__(self, username):
         super().__init__()
         self.username = username  # <--- per caricare la cronologia utente-specifica
@@ -959,41 +1018,98 @@ class HistoryWidget(QWidget):
         self.label_title = QLabel("Cronologia Conversioni")
         self.label_title.setStyleSheet("font-size: 18px; font-weight: bold;")
         layout.addWidget(self.label_title)
-        
-        self.list_history = QListWidget()
+
+        # Ricerca nei percorsi e filtro per date (vedi history.query_history)
+        filters = QHBoxLayout()
+        self.edit_search = QLineEdit()
+        self.edit_search.setPlaceholderText("Cerca nei file...")
+        filters.addWidget(self.edit_search)
+        self.check_date_from = QCheckBox("Dal")
+        self.date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_from.setCalendarPopup(True)
+        self.check_date_to = QCheckBox("Al")
+        self.date_to = QDateEdit(QDate.currentDate())
+        self.date_to.setCalendarPopup(True)
+        for widget in (self.check_date_from, self.date_from, self.check_date_to, self.date_to):
+            filters.addWidget(widget)
+        layout.addLayout(filters)
+
+        # La ricerca parte poco dopo l'ultima modifica del testo, non a ogni tasto
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.load_history)
+        self.edit_search.textChanged.connect(self.search_timer.start)
+        for check in (self.check_date_from, self.check_date_to):
+            check.toggled.connect(self.load_history)
+        for date_edit in (self.date_from, self.date_to):
+            date_edit.dateChanged.connect(self.load_history)
+
+        # Vista virtualizzata: disegna solo le righe visibili, le pagine arrivano
+        # dal modello man mano che si scorre
+        self.model_history = HistoryListModel(username, self)
+        self.list_history = QListView()
+        self.list_history.setUniformItemSizes(True)
+        self.list_history.setModel(self.model_history)
         layout.addWidget(self.list_history)
         
-        # Pulsante per aggiornare la cronologia
+        # Errori di lettura della cronologia (ad es. database bloccato o danneggiato)
+        self.label_status = QLabel("")
+        self.label_status.setWordWrap(True)
+        self.label_status.setStyleSheet("color: #b00020;")
+        layout.addWidget(self.label_status)
+        self.model_history.loadFailed.connect(self.on_load_failed)
+
+        # Pulsante per aggiornare la cronologia (solo i record nuovi)
         self.btn_refresh = QPushButton("Aggiorna")
-        self.btn_refresh.clicked.connect(self.load_history)
+        self.btn_refresh.clicked.connect(self.refresh_history)
         layout.addWidget(self.btn_refresh)
         
         self.load_history()
+
+        # Compattazione e conservazione (history.maintain_history) solo se abilitate
+        # dalle variabili d'ambiente, in background; al termine la lista viene
+        # ricaricata se qualcosa è cambiato
+        self.maintenanceDone.connect(self.load_history)
+        if maintenance_configured():
+            threading.Thread(target=self.maintain, daemon=True).start()
         
-        self.list_history.itemDoubleClicked.connect(self.open_converted_file)
+        self.list_history.doubleClicked.connect(self.open_converted_file)
     
-    def load_history(self):
-        self.list_history.clear()
-        # Usa il file di cronologia personale
-        history_file = f"history_{self.username}.json"
-        if not os.path.exists(history_file):
-            return
+    def maintain(self):
         try:
-            with open(history_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for record in data:
-                ts = record["timestamp"]
-                inp = record["input"]
-                outp = record["output"]
-                item_text = f"[{ts}] {os.path.basename(inp)} -> {os.path.basename(outp)}"
-                list_item = QListWidgetItem(item_text)
-                list_item.setData(Qt.UserRole, record)
-                self.list_history.addItem(list_item)
+            result = maintain_history(self.username)
+            if result["compacted"] or result["archived"]:
+                self.maintenanceDone.emit()
         except Exception as e:
-            print("Errore caricamento cronologia:", e)
+            print("Errore manutenzione cronologia:", e)
+
+    def history_filters(self):
+        return {
+            "search": self.edit_search.text().strip() or None,
+            "date_from": self.date_from.date().toString("yyyy-MM-dd") if self.check_date_from.isChecked() else None,
+            "date_to": self.date_to.date().toString("yyyy-MM-dd") if self.check_date_to.isChecked() else None,
+        }
+
+    def load_history(self):
+        # Solo la prima pagina, letta in background: il costo non dipende dalla cronologia
+        self.label_status.clear()
+        self.model_history.reload(self.history_filters())
+
+    def refresh_history(self):
+        self.label_status.clear()
+        self.model_history.refresh()
+
+    def on_load_failed(self, message):
+        self.label_status.setText(f"Impossibile leggere la cronologia: {message}")
+
+    def showEvent(self, event):
+        # Tornando sulla pagina compaiono le conversioni fatte nel frattempo
+        super().showEvent(event)
+        self.refresh_history()
     
-    def open_converted_file(self, item):
-        record = item.data(Qt.UserRole)
+    def open_converted_file(self, index):
+        record = index.data(Qt.UserRole)
         out_path = record["output"]
         if os.path.exists(out_path):
             import webbrowser
@@ -1004,6 +1120,7 @@ class HistoryWidget(QWidget):
     def update_language(self, lang, lm):
         self.label_title.setText(lm.get_text(lang, "HISTORY_TITLE", default="Cronologia Conversioni"))
         self.btn_refresh.setText(lm.get_text(lang, "REFRESH_HISTORY", default="Aggiorna"))
+        self.edit_search.setPlaceholderText(lm.get_text(lang, "HISTORY_SEARCH", default="Cerca nei file..."))
 
 # =========================================================
 #   SingleConversionWidget (modificato per gestire più file, cartelle e zip)
@@ -1045,6 +1162,7 @@ class SingleConversionWidget(QWidget):
         
         self.combo_format = QComboBox()
         self.combo_format.setStyleSheet("color: #000;")
+        self.combo_format.currentTextChanged.connect(self.update_zip_button)
         layout.addWidget(self.combo_format)
         
         self.btn_advanced = QPushButton("Opzioni Avanzate")
@@ -1074,6 +1192,7 @@ class SingleConversionWidget(QWidget):
 
          # Colleghiamo i segnali alle slot appropriate (che vengono eseguite nel thread principale)
         self.updateProgress.connect(self.progress_bar.setValue)
+        self.setProgressVisible.connect(self.progress_bar.setVisible)
         self.updateStatus.connect(self.label_status.setText)
         self.showError.connect(lambda msg: QMessageBox.critical(self, "Errore Conversione", msg))
         self.resetFieldsSignal.connect(self.reset_fields)
@@ -1148,6 +1267,9 @@ class SingleConversionWidget(QWidget):
                 ext = os.path.splitext(single_path)[1].lower()
                 if ext == ".zip":
                     self.combo_format.addItem(".unzipped")
+                    # Conversione dei file contenuti nello ZIP in un nuovo ZIP (zip_pipeline.py)
+                    for target in ZIP_CONVERT_TARGETS:
+                        self.combo_format.addItem(ZIP_CONVERT_PREFIX + target)
                     self.btn_convert.setText("Decomprimi")
                     return
         
@@ -1183,22 +1305,26 @@ class SingleConversionWidget(QWidget):
         # Ok, c'è una sola estensione
         ext_in = unique_exts.pop()
         self.btn_convert.setText("Converti")  # di default
-        formats = []
-
-        if ext_in == ".docx":
-            formats = [".pdf", ".pages", ".txt"]
-        elif ext_in == ".pdf":
-            formats = [".docx", ".pages", ".txt"]
-        elif ext_in in [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp", ".svg"]:
-            # Esempio di formati immagine
-            formats = [".jpg", ".png", ".pdf", ".webp"]
-        else:
+        # Formati offerti: quelli raggiungibili nel grafo delle conversioni
+        formats = get_graph().targets(ext_in)
+        if not formats:
             # Formato sconosciuto
             self.combo_format.addItem("Formato non supportato")
             return
         
         for f in formats:
             self.combo_format.addItem(f)
+        if len(self.selected_files) > 1 and ext_in in RASTER_EXTENSIONS:
+            self.combo_format.addItem(IMAGES_PDF_ITEM)
+        if len(self.selected_files) == 1 and len(formats) > 1:
+            self.combo_format.addItem(FAN_OUT_ITEM)
+
+    def update_zip_button(self, text):
+        # Per uno ZIP singolo il pulsante dipende dalla voce scelta (decomprimi o converti)
+        if text == ".unzipped":
+            self.btn_convert.setText("Decomprimi")
+        elif text.startswith(ZIP_CONVERT_PREFIX):
+            self.btn_convert.setText("Converti")
 
     def do_conversion(self):
         if not self.selected_files:
@@ -1223,108 +1349,246 @@ class SingleConversionWidget(QWidget):
                     # Decomprimi
                     self.decompress_zip(single_path)
                     return
+                if ext == ".zip" and out_ext.startswith(ZIP_CONVERT_PREFIX):
+                    self.convert_zip_contents(single_path, out_ext[len(ZIP_CONVERT_PREFIX):])
+                    return
         
+        if out_ext == IMAGES_PDF_ITEM:
+            self.images_to_single_pdf(list(self.selected_files))
+            return
+
+        if out_ext == FAN_OUT_ITEM:
+            self.convert_to_many_formats(self.selected_files[0])
+            return
+
         # Se qui, allora conversione multipla di file singoli (tutti stessa estensione)
+        jobs = build_jobs(self.selected_files, out_ext)
+        max_workers = self.advanced_options.get("max_workers") or default_workers()
+
+        def on_result(result, done, total):
+            # Chiamata appena un file termina (in ordine di completamento)
+            if result["ok"]:
+                log_conversion(self.username, result["input"], result["output"])
+                self.last_output_file = result["output"]
+            self.updateProgress.emit(int(done * 100 / total))
+            self.updateStatus.emit(f"{done}/{total}: {os.path.basename(result['input'])}")
+
         def conversion_worker():
             try:
                 # Invia segnale per rendere visibile la progress bar e inizializzarla a 0
                 self.setProgressVisible.emit(True)
                 self.updateProgress.emit(0)
-                chunk = 100 // max(1, len(self.selected_files))
-                current_progress = 0
 
-                for idx, in_path in enumerate(self.selected_files):
-                    base, _ = os.path.splitext(in_path)
-                    out_path = base + out_ext
-
-                    self.convert_single_file(in_path, out_path)
-                    
-                    log_conversion(self.username, in_path, out_path)
-                    
-                    current_progress += chunk
-                    self.updateProgress.emit(current_progress)
-                    self.last_output_file = out_path
+                if all(is_raster_job(i, o) for i, o in jobs):
+                    # Immagini raster: pool di thread con decodifica ridotta (images.py)
+                    results = run_image_batch(jobs, max_workers=max_workers, on_result=on_result,
+                                              options=self.image_options())
+                else:
+                    results = run_batch(jobs, max_workers=max_workers, on_result=on_result,
+                                        options=self.image_options())
+                errors = [r for r in results if not r["ok"]]
 
                 self.updateProgress.emit(100)
                 time.sleep(0.3)
                 self.setProgressVisible.emit(False)
-                self.updateStatus.emit(f"Convertito in: {out_ext}")
+                status = f"Convertito in: {out_ext} ({len(results) - len(errors)}/{len(results)} file)"
+                summary = latency_summary(results)
+                if summary:
+                    status += f" — {summary}"
+                self.updateStatus.emit(status)
                 self.resetFieldsSignal.emit()
+                if errors:
+                    details = "\n".join(f"{os.path.basename(r['input'])}: {r['error']}" for r in errors)
+                    self.showError.emit(f"{len(errors)} file non convertiti:\n{details}")
             except Exception as e:
                 self.setProgressVisible.emit(False)
                 self.showError.emit(str(e))
         
         threading.Thread(target=conversion_worker).start()
     
+    def image_options(self):
+        """Opzioni delle immagini (lato massimo, codifica JPEG/WEBP) scelte nelle opzioni avanzate."""
+        return {
+            "max_size": self.advanced_options.get("img_max_size"),
+            "quality": self.advanced_options.get("img_quality"),
+            "target_size": self.advanced_options.get("img_target_size"),
+            "progressive": self.advanced_options.get("img_progressive", False),
+        }
+
     def convert_single_file(self, in_path, out_path):
         """
         Esegue la conversione effettiva per un singolo file (docx, pdf, immagine).
         """
-        ext_in = os.path.splitext(in_path)[1].lower()
-        ext_out = os.path.splitext(out_path)[1].lower()
-
-        # Se l'input è un file ZIP e l'utente ha scelto di decomprimerlo (in teoria gestito sopra)
-        if ext_in == ".zip" and ext_out == ".unzipped":
-            decompress_zip(in_path)
-            return
-        
-        if ext_in == ".docx" and ext_out == ".pdf":
-            convert_docx_to_pdf(in_path, out_path)
-        elif ext_in == ".docx" and ext_out == ".pages":
-            temp_pdf = convert_docx_to_pdf(in_path)
-            convert_pdf_to_pages(temp_pdf, out_path)
-        elif ext_in == ".docx" and ext_out == ".txt":
-            convert_docx_to_txt(in_path, out_path)
-        elif ext_in == ".pdf" and ext_out == ".docx":
-            convert_pdf_to_docx(in_path, out_path)
-        elif ext_in == ".pdf" and ext_out == ".pages":
-            convert_pdf_to_pages(in_path, out_path)
-        elif ext_in == ".pdf" and ext_out == ".txt":
-            convert_pdf_to_txt(in_path, out_path)
-        else:
-            # Altrimenti tentiamo la conversione immagine
-            convert_image(in_path, out_path)
+        convert_file(in_path, out_path)
     
     def compress_folder(self, folder_path):
+        level = self.advanced_options.get("zip_level", 6)
+
+        def progress(done, total):
+            self.updateProgress.emit(int(done * 100 / total) if total else 100)
+
         def worker():
             try:
-                self.progress_bar.setVisible(True)
-                self.progress_bar.setValue(0)
+                self.setProgressVisible.emit(True)
+                self.updateProgress.emit(0)
                 zip_path = os.path.splitext(folder_path)[0] + ".zip"
-                archive_path = compress_folder(folder_path, zip_path)
-                time.sleep(1)
-                self.progress_bar.setValue(100)
-                self.progress_bar.setVisible(False)
-                self.label_status.setText(f"Cartella compressa in: {archive_path}")
+                archive_path = compress_folder(folder_path, zip_path, level=level, progress=progress)
+                self.updateProgress.emit(100)
+                self.setProgressVisible.emit(False)
+                self.updateStatus.emit(f"Cartella compressa in: {archive_path}")
                 self.last_output_file = archive_path
                 log_conversion(self.username, folder_path, archive_path)
             except Exception as e:
-                self.progress_bar.setVisible(False)
-                QMessageBox.critical(self, "Errore Compressione", str(e))
+                self.setProgressVisible.emit(False)
+                self.showError.emit(str(e))
 
         t = threading.Thread(target=worker)
         t.start()
 
     def decompress_zip(self, zip_path):
+        def progress(done, total):
+            self.updateProgress.emit(int(done * 100 / total) if total else 100)
+
         def worker():
             try:
-                self.progress_bar.setVisible(True)
-                self.progress_bar.setValue(0)
+                self.setProgressVisible.emit(True)
+                self.updateProgress.emit(0)
                 out_folder = os.path.splitext(zip_path)[0] + "_unzipped"
-                decompress_zip(zip_path, out_folder)
-                time.sleep(1)
-                self.progress_bar.setValue(100)
-                self.progress_bar.setVisible(False)
-                self.label_status.setText(f"Archivio decompresso in: {out_folder}")
+                decompress_zip(zip_path, out_folder, progress=progress)
+                self.updateProgress.emit(100)
+                self.setProgressVisible.emit(False)
+                self.updateStatus.emit(f"Archivio decompresso in: {out_folder}")
                 self.last_output_file = out_folder
                 log_conversion(self.username, zip_path, out_folder)
             except Exception as e:
-                self.progress_bar.setVisible(False)
-                QMessageBox.critical(self, "Errore Decompressione", str(e))
+                self.setProgressVisible.emit(False)
+                self.showError.emit(str(e))
         
         t = threading.Thread(target=worker)
         t.start()
     
+    def images_to_single_pdf(self, image_paths):
+        from conversions import images_to_pdf
+        out_path, _ = QFileDialog.getSaveFileName(self, "Salva PDF", os.path.dirname(image_paths[0]),
+                                                  "PDF Files (*.pdf)")
+        if not out_path:
+            return
+
+        def progress(done, total, path):
+            self.updateProgress.emit(int(done * 100 / total))
+            self.updateStatus.emit(f"{done}/{total}: {os.path.basename(path)}")
+
+        def worker():
+            try:
+                self.setProgressVisible.emit(True)
+                self.updateProgress.emit(0)
+                images_to_pdf(image_paths, out_path, progress=progress)
+                self.setProgressVisible.emit(False)
+                self.updateStatus.emit(f"Immagini unite in: {out_path}")
+                self.last_output_file = out_path
+                for path in image_paths:
+                    log_conversion(self.username, path, out_path)
+                self.resetFieldsSignal.emit()
+            except Exception as e:
+                self.setProgressVisible.emit(False)
+                self.showError.emit(str(e))
+
+        threading.Thread(target=worker).start()
+
+    def choose_formats(self, formats):
+        """Finestra con i formati da spuntare; restituisce quelli scelti (vuota se annullata)."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Converti in più formati")
+        layout = QVBoxLayout(dialog)
+        list_formats = QListWidget()
+        for fmt in formats:
+            item = QListWidgetItem(fmt)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            list_formats.addItem(item)
+        layout.addWidget(list_formats)
+        btn_ok = QPushButton("Converti")
+        btn_ok.clicked.connect(dialog.accept)
+        layout.addWidget(btn_ok)
+        if dialog.exec_() != QDialog.Accepted:
+            return []
+        return [list_formats.item(i).text() for i in range(list_formats.count())
+                if list_formats.item(i).checkState() == Qt.Checked]
+
+    def convert_to_many_formats(self, in_path):
+        from fanout import convert_to_many
+        ext_in = os.path.splitext(in_path)[1].lower()
+        formats = self.choose_formats(get_graph().targets(ext_in))
+        if not formats:
+            return
+        outputs = [os.path.splitext(in_path)[0] + fmt for fmt in formats]
+        options = self.image_options()
+        max_workers = self.advanced_options.get("max_workers") or default_workers()
+
+        def on_result(result, done, total):
+            if result["ok"]:
+                log_conversion(self.username, result["input"], result["output"])
+                self.last_output_file = result["output"]
+            self.updateProgress.emit(int(done * 100 / total))
+            self.updateStatus.emit(f"{done}/{total}: {os.path.basename(result['output'])}")
+
+        def worker():
+            try:
+                self.setProgressVisible.emit(True)
+                self.updateProgress.emit(0)
+                # Un'unica decodifica dell'input per tutti i formati scelti
+                results = convert_to_many(in_path, outputs, max_workers=max_workers,
+                                          on_result=on_result, options=options)
+                errors = [r for r in results if not r["ok"]]
+                self.setProgressVisible.emit(False)
+                self.updateStatus.emit(
+                    f"Convertito in: {', '.join(formats)} ({len(results) - len(errors)}/{len(results)} file)"
+                )
+                self.resetFieldsSignal.emit()
+                if errors:
+                    details = "\n".join(f"{os.path.basename(r['output'])}: {r['error']}" for r in errors)
+                    self.showError.emit(f"{len(errors)} formati non convertiti:\n{details}")
+            except Exception as e:
+                self.setProgressVisible.emit(False)
+                self.showError.emit(str(e))
+
+        threading.Thread(target=worker).start()
+
+    def convert_zip_contents(self, zip_path, out_ext):
+        from zip_pipeline import convert_zip, targets_for
+        max_workers = self.advanced_options.get("max_workers") or default_workers()
+        out_zip = os.path.splitext(zip_path)[0] + "_" + out_ext.lstrip(".") + ".zip"
+
+        def on_result(result, done, total):
+            self.updateProgress.emit(int(done * 100 / total))
+            self.updateStatus.emit(f"{done}/{total}: {result['input']}")
+
+        def worker():
+            try:
+                self.setProgressVisible.emit(True)
+                self.updateProgress.emit(0)
+                results = convert_zip(zip_path, out_zip, targets_for(out_ext), max_workers=max_workers,
+                                      options=self.image_options(), on_result=on_result)
+                errors = [r for r in results if not r["ok"]]
+                self.updateProgress.emit(100)
+                self.setProgressVisible.emit(False)
+                self.updateStatus.emit(
+                    f"Archivio convertito in: {out_zip} ({len(results) - len(errors)}/{len(results)} file)"
+                )
+                self.last_output_file = out_zip
+                log_conversion(self.username, zip_path, out_zip)
+                if errors:
+                    details = "\n".join(
+                        f"{r['input']}: {r['error']}" + (" (copiato senza conversione)" if r.get("copied") else "")
+                        for r in errors
+                    )
+                    self.showError.emit(f"{len(errors)} file non convertiti:\n{details}")
+            except Exception as e:
+                self.setProgressVisible.emit(False)
+                self.showError.emit(str(e))
+
+        threading.Thread(target=worker).start()
+
     def upload_last_file_to_drive(self):
         if not self.last_output_file:
             QMessageBox.warning(self, "Attenzione", "Non hai ancora creato nessun file da caricare!")
@@ -1355,6 +1619,12 @@ class SingleConversionWidget(QWidget):
 #   MergePDFWidget
 # =========================================================
 class MergePDFWidget(QWidget):
+
+    updateProgress = pyqtSignal(int)
+    updateStatus = pyqtSignal(str)
+    showError = pyqtSignal(str)
+    setProgressVisible = pyqtSignal(bool)
+
     def __init__(self):
         super().__init__()
         self.init_ui()
@@ -1389,10 +1659,18 @@ class MergePDFWidget(QWidget):
         self.btn_merge.setStyleSheet("color: #000;")
         self.btn_merge.clicked.connect(self.do_merge)
         layout.addWidget(self.btn_merge)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
         self.label_status = QLabel("")
         self.label_status.setWordWrap(True)
         self.label_status.setStyleSheet("color: #000;")
         layout.addWidget(self.label_status)
+
+        self.updateProgress.connect(self.progress_bar.setValue)
+        self.setProgressVisible.connect(self.progress_bar.setVisible)
+        self.updateStatus.connect(self.label_status.setText)
+        self.showError.connect(lambda msg: QMessageBox.critical(self, "Errore Merge PDF", msg))
     
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -1436,11 +1714,22 @@ class MergePDFWidget(QWidget):
         out_path, _ = QFileDialog.getSaveFileName(self, "Salva PDF unito", "", "PDF Files (*.pdf)")
         if not out_path:
             return
-        try:
-            merge_pdfs(pdf_list, out_path)
-            self.label_status.setText(f"PDF uniti in: {out_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Errore Merge PDF", str(e))
+        def progress(done, total, path):
+            self.updateProgress.emit(int(done * 100 / total))
+            self.updateStatus.emit(f"{done}/{total}: {os.path.basename(path)}")
+
+        def worker():
+            try:
+                self.setProgressVisible.emit(True)
+                self.updateProgress.emit(0)
+                merge_pdfs(pdf_list, out_path, progress=progress)
+                self.setProgressVisible.emit(False)
+                self.updateStatus.emit(f"PDF uniti in: {out_path}")
+            except Exception as e:
+                self.setProgressVisible.emit(False)
+                self.showError.emit(str(e))
+
+        threading.Thread(target=worker).start()
     
     def update_language(self, lang, lm):
         self.label_info.setText(lm.get_text(lang, "MERGE_INFO", default="Trascina qui i file PDF da unire oppure usa 'Aggiungi PDF'"))
@@ -1475,8 +1764,17 @@ class SplitPDFWidget(QWidget):
         self.label_selected.setWordWrap(True)
         self.label_selected.setStyleSheet("color: #000;")
         layout.addWidget(self.label_selected)
+        # Modalità: un solo file oppure più file da un'unica lettura del PDF
+        self.combo_mode = QComboBox()
+        self.combo_mode.setStyleSheet("color: #000;")
+        self.combo_mode.addItem("Un file con le pagine indicate", "single")
+        self.combo_mode.addItem("Un file per intervallo (separati da ;)", "ranges")
+        self.combo_mode.addItem("Un file ogni N pagine", "every")
+        self.combo_mode.addItem("Un file per pagina", "per_page")
+        self.combo_mode.currentIndexChanged.connect(self.update_mode)
+        layout.addWidget(self.combo_mode)
         self.line_pages = QLineEdit()
-        self.line_pages.setPlaceholderText("Intervalli di pagine (es. 1-3,5,7-9)")
+        self.line_pages.setPlaceholderText("Intervalli di pagine (es. 1-3,5,10-, end-1, odd)")
         self.line_pages.setStyleSheet("color: #000;")
         layout.addWidget(self.line_pages)
         self.btn_split = QPushButton("Estrai Pagine")
@@ -1510,14 +1808,29 @@ class SplitPDFWidget(QWidget):
             self.label_info.setText(f"File selezionato: {os.path.basename(path)}")
             self.label_selected.setText(f"PDF: {os.path.basename(path)}")
     
+    def update_mode(self):
+        mode = self.combo_mode.currentData()
+        placeholders = {
+            "single": "Intervalli di pagine (es. 1-3,5,10-, end-1, odd)",
+            "ranges": "Un intervallo per file, separati da ; (es. 1-10; 11-25; 26-40)",
+            "every": "Numero di pagine per file (es. 10)",
+            "per_page": "",
+        }
+        self.line_pages.setPlaceholderText(placeholders[mode])
+        self.line_pages.setEnabled(mode != "per_page")
+
     def do_split(self):
         if not self.selected_pdf:
             QMessageBox.warning(self, "Attenzione", "Seleziona un PDF!")
             return
+        mode = self.combo_mode.currentData()
         pages_string = self.line_pages.text().strip()
-        if not pages_string:
+        if mode != "per_page" and not pages_string:
             QMessageBox.warning(self, "Attenzione", "Inserisci gli intervalli di pagine!")
             return
+        if mode != "single":
+            self.do_split_multi(mode, pages_string)
+            return
         out_path, _ = QFileDialog.getSaveFileName(self, "Salva PDF estratto", "", "PDF Files (*.pdf)")
         if not out_path:
             return
@@ -1526,6 +1839,25 @@ class SplitPDFWidget(QWidget):
             self.label_status.setText(f"PDF estratto in: {out_path}")
         except Exception as e:
             QMessageBox.critical(self, "Errore Split PDF", str(e))
+
+    def do_split_multi(self, mode, pages_string):
+        if mode == "ranges":
+            options = {"ranges": [r.strip() for r in pages_string.split(";") if r.strip()]}
+        elif mode == "every":
+            if not pages_string.isdigit() or int(pages_string) < 1:
+                QMessageBox.warning(self, "Attenzione", "Inserisci un numero di pagine valido!")
+                return
+            options = {"every": int(pages_string)}
+        else:
+            options = {"every": 1}
+        out_dir = QFileDialog.getExistingDirectory(self, "Cartella di destinazione", os.path.dirname(self.selected_pdf))
+        if not out_dir:
+            return
+        try:
+            outputs = split_pdf_multi(self.selected_pdf, output_dir=out_dir, **options)
+            self.label_status.setText(f"Creati {len(outputs)} PDF in: {out_dir}")
+        except Exception as e:
+            QMessageBox.critical(self, "Errore Split PDF", str(e))
     
     def update_language(self, lang, lm):
         self.label_info.setText(lm.get_text(lang, "SPLIT_INFO", default="Trascina qui un PDF oppure usa 'Seleziona PDF'"))
@@ -1,33 +1,744 @@
+"""
+Cronologia delle conversioni in un database SQLite (history.db), condiviso da
+tutti gli utenti e da più istanze dell'applicazione aperte insieme.
+
+- Indici su utente + data, estensioni di input/output e percorsi: la prima pagina
+  della cronologia costa lo stesso con 100 o un milione di record.
+- Paginazione per chiave (before): la pagina successiva parte dall'ultimo record
+  mostrato (data, id) invece di saltare N righe con OFFSET.
+- Ricerca per sottostringa nei percorsi con un indice FTS5 a trigrammi (se SQLite
+  lo supporta, altrimenti LIKE), filtri per intervallo di date ed estensione.
+- Journal WAL e busy_timeout: più processi possono scrivere mentre altri leggono.
+- log_conversion non scrive subito: i record vanno in coda a un HistoryWriter che
+  li inserisce a gruppi in una sola transazione (ogni FLUSH_INTERVAL secondi o
+  ogni FLUSH_SIZE record). Ogni record ha un uuid univoco e viene inserito con
+  INSERT OR IGNORE: un gruppo ripetuto dopo un errore non crea duplicati. Dopo
+  MAX_WRITE_ATTEMPTS tentativi falliti il gruppo viene abbandonato e i suoi record
+  stampati; letture e uscita attendono la coda al massimo READ_FLUSH_TIMEOUT /
+  EXIT_FLUSH_TIMEOUT secondi.
+- maintain_history: compattazione (le conversioni ripetute dello stesso input
+  nello stesso output diventano un solo record con count e first_seen) e
+  conservazione per età o numero di record; i record eliminati vengono prima
+  archiviati in segmenti JSONL compressi (history_archive/<utente>/*.jsonl.gz).
+
+Le vecchie cronologie history_<utente>.json / .jsonl vengono importate
+automaticamente al primo accesso dell'utente e rinominate in .migrated.
+
+Variabili d'ambiente:
+- DEVATRON_HISTORY_DB           percorso del database (default: history.db nella cartella corrente)
+- DEVATRON_HISTORY_ARCHIVE      cartella dei segmenti archiviati (default: history_archive accanto al database)
+- DEVATRON_HISTORY_MAX_DAYS     giorni di cronologia da conservare (default: tutti)
+- DEVATRON_HISTORY_MAX_ENTRIES  record da conservare per utente (default: tutti)
+- DEVATRON_HISTORY_COMPACT      1 per compattare la cronologia in maintain_history
+                                senza compact esplicito, ad es. all'avvio della GUI (default: no)
+"""
+import atexit
+import gzip
 import json
 import os
-from datetime import datetime
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+PAGE_SIZE = 200
+# Millisecondi di attesa se un'altra istanza sta scrivendo
+BUSY_TIMEOUT_MS = 5000
+# Lunghezza minima della ricerca per usare l'indice a trigrammi
+_TRIGRAM_MIN = 3
+# Scrittura a gruppi: intervallo massimo (secondi) e dimensione del gruppo
+FLUSH_INTERVAL = 0.5
+FLUSH_SIZE = 200
+# Attesa massima tra due tentativi se il database resta bloccato o non scrivibile
+MAX_RETRY_DELAY = 5.0
+# Tentativi falliti di fila dopo i quali un gruppo viene abbandonato (e segnalato)
+MAX_WRITE_ATTEMPTS = 5
+# Secondi di attesa massima della coda: in lettura e all'uscita del processo
+READ_FLUSH_TIMEOUT = 2.0
+EXIT_FLUSH_TIMEOUT = 10.0
+# Record per segmento di archivio
+ARCHIVE_SEGMENT_SIZE = 10000
+# Coppie input/output unite in una transazione dalla compattazione
+COMPACT_BATCH = 500
+
+# Migrazioni dello schema, applicate in ordine (PRAGMA user_version = quante applicate)
+_SCHEMA = [
+    [
+        """CREATE TABLE conversions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            input TEXT NOT NULL,
+            output TEXT NOT NULL,
+            input_ext TEXT NOT NULL,
+            output_ext TEXT NOT NULL
+        )""",
+        "CREATE INDEX idx_conversions_user_id ON conversions(username, id)",
+        "CREATE INDEX idx_conversions_user_time ON conversions(username, timestamp, id)",
+        "CREATE INDEX idx_conversions_user_input_ext ON conversions(username, input_ext)",
+        "CREATE INDEX idx_conversions_user_output_ext ON conversions(username, output_ext)",
+        "CREATE INDEX idx_conversions_input ON conversions(input)",
+        "CREATE INDEX idx_conversions_output ON conversions(output)",
+        "CREATE TABLE imported_files (path TEXT PRIMARY KEY)",
+    ],
+    [
+        # Identificativo del record assegnato da chi lo registra (NULL per i record importati)
+        "ALTER TABLE conversions ADD COLUMN uuid TEXT",
+        "CREATE UNIQUE INDEX idx_conversions_uuid ON conversions(uuid)",
+    ],
+    [
+        # Compattazione: timestamp è l'ultima volta, first_seen la prima, count quante volte
+        "ALTER TABLE conversions ADD COLUMN count INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE conversions ADD COLUMN first_seen TEXT",
+        "CREATE INDEX idx_conversions_user_pair ON conversions(username, input, output)",
+    ],
+]
+
+# Indice FTS5 a trigrammi sui percorsi, mantenuto dai trigger
+_FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS conversions_fts USING fts5(
+        input, output, content='conversions', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS conversions_fts_insert AFTER INSERT ON conversions BEGIN
+        INSERT INTO conversions_fts(rowid, input, output) VALUES (new.id, new.input, new.output);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS conversions_fts_delete AFTER DELETE ON conversions BEGIN
+        INSERT INTO conversions_fts(conversions_fts, rowid, input, output)
+        VALUES ('delete', old.id, old.input, old.output);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS conversions_fts_update AFTER UPDATE OF input, output ON conversions BEGIN
+        INSERT INTO conversions_fts(conversions_fts, rowid, input, output)
+        VALUES ('delete', old.id, old.input, old.output);
+        INSERT INTO conversions_fts(rowid, input, output) VALUES (new.id, new.input, new.output);
+    END""",
+]
+
+_local = threading.local()
+_init_lock = threading.Lock()
+# Database già inizializzati da questo processo: percorso -> FTS disponibile
+_initialized = {}
+# (database, utente) già controllati per l'importazione dei vecchi file
+_imported = set()
+
+
+def database_path():
+    return os.environ.get("DEVATRON_HISTORY_DB") or "history.db"
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # Solo per i database nuovi: lo spazio liberato dalla manutenzione torna al disco
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    # In WAL synchronous=NORMAL non perde la coerenza, solo le ultime transazioni in un crash
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def _init_schema(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for statements in _SCHEMA[version:]:
+            for statement in statements:
+                conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {len(_SCHEMA)}")
+        try:
+            for statement in _FTS_SCHEMA:
+                conn.execute(statement)
+            fts = True
+        except sqlite3.OperationalError:
+            # SQLite senza FTS5 o senza tokenizer trigram: ricerca con LIKE
+            fts = False
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return fts
+
+
+def _connection():
+    """Connessione del thread corrente (sqlite3 non condivide le connessioni tra thread)."""
+    path = database_path()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path:
+        if conn is not None:
+            conn.close()
+        _local.conn = None
+        conn = _connect(path)
+        try:
+            with _init_lock:
+                if path not in _initialized:
+                    _initialized[path] = _init_schema(conn)
+        except Exception:
+            conn.close()
+            raise
+        _local.conn, _local.path = conn, path
+    return conn
+
+
+def _has_fts():
+    _connection()
+    return _initialized[database_path()]
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def _row(username, record):
+    return (
+        username,
+        record.get("timestamp") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        record.get("input", ""),
+        record.get("output", ""),
+        _extension(record.get("input", "")),
+        _extension(record.get("output", "")),
+    )
+
+
+_INSERT = ("INSERT INTO conversions (username, timestamp, input, output, input_ext, output_ext) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+
+
+# -----------------------------------------------------
+# Importazione delle vecchie cronologie
+# -----------------------------------------------------
+def _legacy_records(path):
+    """Record di un vecchio file di cronologia, dal più vecchio al più recente."""
+    if path.endswith(".jsonl"):
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return [r for r in records if isinstance(r, dict)]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    # La lista JSON ha la conversione più recente in testa
+    return [r for r in reversed(data) if isinstance(r, dict)] if isinstance(data, list) else []
+
+
+def import_legacy(username):
+    """
+    Importa (una sola volta, anche con più istanze aperte) history_<utente>.json e
+    history_<utente>.jsonl nel database. Restituisce il numero di record importati.
+    """
+    key = (database_path(), username)
+    if key in _imported:
+        return 0
+    conn = _connection()
+    imported = 0
+    for path in (f"history_{username}.json", f"history_{username}.jsonl"):
+        if not os.path.exists(path):
+            continue
+        abs_path = os.path.abspath(path)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # imported_files rende l'importazione idempotente se la rinomina non avviene
+            done = conn.execute("SELECT 1 FROM imported_files WHERE path = ?", (abs_path,)).fetchone()
+            if not done:
+                rows = [_row(username, r) for r in _legacy_records(path)]
+                conn.executemany(_INSERT, rows)
+                conn.execute("INSERT INTO imported_files (path) VALUES (?)", (abs_path,))
+                imported += len(rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        try:
+            os.replace(path, path + ".migrated")
+        except OSError:
+            pass
+    _imported.add(key)
+    return imported
+
+
+# -----------------------------------------------------
+# Scrittura e lettura
+# -----------------------------------------------------
+_INSERT_NEW = ("INSERT OR IGNORE INTO conversions "
+               "(uuid, username, timestamp, input, output, input_ext, output_ext) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+class HistoryWriter:
+    """
+    Coda dei record da scrivere, svuotata da un thread dedicato. log() può essere
+    chiamata da qualsiasi thread e costa solo l'aggiunta alla coda.
+
+    Un gruppo che non si riesce a scrivere per max_attempts volte di fila (database
+    non raggiungibile o sempre bloccato) viene tolto dalla coda: i suoi record
+    finiscono in failed e vengono stampati, così flush() e close() non restano
+    in attesa per sempre.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE, max_attempts=MAX_WRITE_ATTEMPTS):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_attempts = max_attempts
+        # Record abbandonati dopo max_attempts tentativi (uuid, username, timestamp, input, output, ...)
+        self.failed = []
+        self._pending = []
+        self._cond = threading.Condition()
+        # Record accodati / gestiti (scritti o abbandonati) dall'avvio: flush() attende che si raggiungano
+        self._queued = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._thread = None
+
+    def log(self, username, input_path, output_path, timestamp=None):
+        """Accoda una conversione e restituisce il suo uuid."""
+        record_id = uuid.uuid4().hex
+        row = (record_id,) + _row(username, {"input": input_path, "output": output_path,
+                                             "timestamp": timestamp})
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("HistoryWriter chiuso.")
+            self._pending.append(row)
+            self._queued += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="HistoryWriter", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+        return record_id
+
+    def flush(self, timeout=None):
+        """
+        Attende che i record accodati finora siano scritti (o abbandonati, vedi
+        failed). False se scade timeout.
+        """
+        with self._cond:
+            target = self._queued
+            if self._written >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout=None):
+        """
+        Scrive i record rimasti e ferma il thread, attendendo al massimo timeout
+        secondi in tutto. Restituisce i record non scritti (abbandonati o ancora in coda).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        with self._cond:
+            unsaved = self.failed + self._pending
+            if self._pending:
+                _report_unsaved(self._pending, "scadenza dell'attesa alla chiusura")
+        return unsaved
+
+    def _give_up(self, batch, error):
+        _report_unsaved(batch, error)
+        with self._cond:
+            self.failed.extend(batch)
+            del self._pending[:len(batch)]
+            self._written += len(batch)
+            self._flush_requested = self._flush_requested and self._written < self._queued
+            self._cond.notify_all()
+
+    def _run(self):
+        delay = 0.1
+        attempts = 0
+        while True:
+            with self._cond:
+                # Attende un gruppo pieno, una richiesta di flush o la scadenza dell'intervallo
+                self._cond.wait_for(lambda: len(self._pending) >= self.flush_size or self._flush_requested
+                                    or self._closed, self.flush_interval)
+                if not self._pending:
+                    if self._closed:
+                        return
+                    continue
+                batch = self._pending[:]
+            try:
+                self._write(batch)
+            except (sqlite3.Error, OSError) as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self._give_up(batch, e)
+                    delay, attempts = 0.1, 0
+                    continue
+                # Il gruppo resta in coda: sarà riscritto (l'uuid evita i duplicati)
+                print("Errore scrittura cronologia:", e)
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay, attempts = 0.1, 0
+            with self._cond:
+                del self._pending[:len(batch)]
+                self._written += len(batch)
+                self._flush_requested = self._flush_requested and self._written < self._queued
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        for username in {row[1] for row in batch}:
+            import_legacy(username)
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(_INSERT_NEW, batch)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _report_unsaved(rows, reason):
+    print(f"Cronologia: {len(rows)} conversioni non salvate ({reason}):")
+    for row in rows:
+        print(f"  {row[2]} [{row[1]}] {row[3]} -> {row[4]}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """HistoryWriter condiviso dal processo corrente (scritto anche all'uscita)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter()
+            atexit.register(_writer.close, EXIT_FLUSH_TIMEOUT)
+        return _writer
+
+
+def flush_history(timeout=None):
+    """Scrive subito le conversioni in coda (se ce ne sono). False se scade timeout."""
+    return _writer.flush(timeout) if _writer is not None else True
+
 
 def log_conversion(username, input_path, output_path):
     """
-    Salva la conversione in un file JSON di cronologia personale per l'utente specificato.
+    Salva la conversione nella cronologia personale dell'utente specificato
+    (in coda al writer del processo, vedi HistoryWriter).
     """
-    record = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "input": input_path,
-        "output": output_path
-    }
+    return get_writer().log(username, input_path, output_path)
 
-    # Costruiamo il nome del file di cronologia in base allo username
-    history_file = f"history_{username}.json"
 
-    # Leggi eventuale cronologia esistente
-    if os.path.exists(history_file):
-        with open(history_file, "r", encoding="utf-8") as f:
+def _date_bound(value, end=False):
+    """
+    date/datetime/stringa -> (operatore, stringa confrontabile con timestamp).
+    Come limite superiore una data senza ora comprende tutto il giorno indicato.
+    """
+    if isinstance(value, datetime):
+        value = value.strftime("%Y-%m-%d %H:%M:%S")
+    elif isinstance(value, date):
+        value = value.strftime("%Y-%m-%d")
+    value = str(value)
+    if not end:
+        return ">=", value
+    if len(value) == 10:
+        return "<", (datetime.strptime(value, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    return "<=", value
+
+
+def _where(username, search=None, date_from=None, date_to=None, input_ext=None, output_ext=None):
+    clauses = ["username = ?"]
+    params = [username]
+    if search:
+        if _has_fts() and len(search) >= _TRIGRAM_MIN:
+            clauses.append("id IN (SELECT rowid FROM conversions_fts WHERE conversions_fts MATCH ?)")
+            # Frase tra virgolette: la ricerca è letterale (niente sintassi FTS)
+            params.append('"' + search.replace('"', '""') + '"')
+        else:
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append("(input LIKE ? ESCAPE '\\' OR output LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+    for value, end in ((date_from, False), (date_to, True)):
+        if value:
+            op, bound = _date_bound(value, end)
+            clauses.append(f"timestamp {op} ?")
+            params.append(bound)
+    if input_ext:
+        clauses.append("input_ext = ?")
+        params.append(input_ext.lower())
+    if output_ext:
+        clauses.append("output_ext = ?")
+        params.append(output_ext.lower())
+    return " AND ".join(clauses), params
+
+
+def query_history(username, search=None, date_from=None, date_to=None, input_ext=None, output_ext=None,
+                  before=None, after_id=None, limit=PAGE_SIZE):
+    """
+    Una pagina di record (dict con id, timestamp, input, output, count, first_seen),
+    dal più recente.
+    Per la pagina successiva passare before = l'ultimo record ricevuto (o la coppia
+    (timestamp, id)): la pagina resta corretta anche se quel record è stato poi
+    eliminato o compattato. after_id restituisce solo i record inseriti dopo quello
+    (id maggiore).
+    """
+    # Le conversioni appena registrate da questo processo devono essere visibili
+    # (senza bloccare la lettura se il database non accetta scritture)
+    flush_history(READ_FLUSH_TIMEOUT)
+    import_legacy(username)
+    return _select_page(username, search, date_from, date_to, input_ext, output_ext, before, after_id, limit)
+
+
+def _select_page(username, search, date_from, date_to, input_ext, output_ext, before, after_id, limit):
+    where, params = _where(username, search, date_from, date_to, input_ext, output_ext)
+    if before is not None:
+        if isinstance(before, dict):
+            before = (before["timestamp"], before["id"])
+        where += " AND (timestamp, id) < (?, ?)"
+        params += list(before)
+    if after_id is not None:
+        where += " AND id > ?"
+        params.append(after_id)
+    sql = (f"SELECT id, timestamp, input, output, count, first_seen FROM conversions WHERE {where} "
+           "ORDER BY timestamp DESC, id DESC")
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [dict(row) for row in _connection().execute(sql, params)]
+
+
+def query_history_snapshot(username, limit=PAGE_SIZE, **filters):
+    """
+    Prima pagina di query_history e id più alto dell'utente, letti nella stessa
+    transazione: un record inserito nel frattempo è o in entrambi o in nessuno dei due.
+    Restituisce (pagina, id più alto).
+    """
+    flush_history(READ_FLUSH_TIMEOUT)
+    import_legacy(username)
+    conn = _connection()
+    conn.execute("BEGIN")
+    try:
+        max_id = conn.execute("SELECT MAX(id) FROM conversions WHERE username = ?", (username,)).fetchone()[0]
+        page = _select_page(username, filters.get("search"), filters.get("date_from"), filters.get("date_to"),
+                            filters.get("input_ext"), filters.get("output_ext"), None, None, limit)
+    finally:
+        conn.execute("COMMIT")
+    return page, max_id
+
+
+def max_history_id(username):
+    """Id dell'ultimo record inserito per l'utente (None se non ce ne sono)."""
+    flush_history(READ_FLUSH_TIMEOUT)
+    return _connection().execute("SELECT MAX(id) FROM conversions WHERE username = ?", (username,)).fetchone()[0]
+
+
+def count_history(username, **filters):
+    """Numero di record che soddisfano i filtri di query_history."""
+    flush_history(READ_FLUSH_TIMEOUT)
+    import_legacy(username)
+    where, params = _where(username, **filters)
+    return _connection().execute(f"SELECT COUNT(*) FROM conversions WHERE {where}", params).fetchone()[0]
+
+
+def iter_history(username, limit=None, page_size=PAGE_SIZE, **filters):
+    """Record dal più recente al più vecchio, letti una pagina alla volta."""
+    before = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        page = query_history(username, before=before, limit=size, **filters)
+        yield from page
+        if len(page) < size:
+            return
+        before = page[-1]
+        if remaining is not None:
+            remaining -= len(page)
+
+
+def read_history(username, limit=None, **filters):
+    """Lista dei record più recenti (tutti se limit è None)."""
+    return list(iter_history(username, limit, **filters))
+
+
+# -----------------------------------------------------
+# Manutenzione: compattazione, conservazione, archivio
+# -----------------------------------------------------
+def archive_path():
+    default = os.path.join(os.path.dirname(os.path.abspath(database_path())), "history_archive")
+    return os.environ.get("DEVATRON_HISTORY_ARCHIVE") or default
+
+
+def _env_int(name):
+    try:
+        return int(os.environ[name]) or None
+    except (KeyError, ValueError):
+        return None
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def maintenance_configured():
+    """True se le variabili d'ambiente chiedono compattazione o limiti di conservazione."""
+    return (_env_flag("DEVATRON_HISTORY_COMPACT") or bool(_env_int("DEVATRON_HISTORY_MAX_DAYS"))
+            or bool(_env_int("DEVATRON_HISTORY_MAX_ENTRIES")))
+
+
+def _users(username):
+    if username is not None:
+        return [username]
+    return [row[0] for row in _connection().execute("SELECT DISTINCT username FROM conversions")]
+
+
+def compact_history(username=None):
+    """
+    Unisce i record con lo stesso input e output: resta il più recente, con count
+    pari al totale e first_seen alla prima conversione. Restituisce i record rimossi.
+
+    Le coppie da unire vengono cercate fuori dalla transazione di scrittura (indice
+    utente + input + output); il database resta bloccato solo per unire
+    COMPACT_BATCH coppie alla volta.
+    """
+    flush_history(READ_FLUSH_TIMEOUT)
+    conn = _connection()
+    removed = 0
+    for user in _users(username):
+        pairs = conn.execute(
+            "SELECT input, output FROM conversions WHERE username = ? "
+            "GROUP BY input, output HAVING COUNT(*) > 1", (user,)
+        ).fetchall()
+        for start in range(0, len(pairs), COMPACT_BATCH):
+            conn.execute("BEGIN IMMEDIATE")
             try:
-                data = json.load(f)
-                if not isinstance(data, list):
-                    data = []
-            except:
-                data = []
-    else:
-        data = []
-    
-    # Aggiungi la nuova entry in testa, così l'ultima conversione è in cima
-    data.insert(0, record)
-    with open(history_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+                for input_path, output_path in pairs[start:start + COMPACT_BATCH]:
+                    removed += _merge_pair(conn, user, input_path, output_path)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    return removed
+
+
+def _merge_pair(conn, user, input_path, output_path):
+    # Riletto nella transazione: un'altra istanza potrebbe averlo già compattato
+    # (senza ORDER BY: SQLite sceglierebbe l'indice per data e leggerebbe tutto l'utente)
+    rows = conn.execute(
+        "SELECT timestamp, id, count, COALESCE(first_seen, timestamp) FROM conversions "
+        "WHERE username = ? AND input = ? AND output = ?",
+        (user, input_path, output_path),
+    ).fetchall()
+    if len(rows) < 2:
+        return 0
+    rows = sorted((tuple(row) for row in rows), reverse=True)
+    conn.execute("UPDATE conversions SET count = ?, first_seen = ? WHERE id = ?",
+                 (sum(row[2] for row in rows), min(row[3] for row in rows), rows[0][1]))
+    conn.executemany("DELETE FROM conversions WHERE id = ?", [(row[1],) for row in rows[1:]])
+    return len(rows) - 1
+
+
+def _write_segment(user, rows):
+    """Scrive rows (dal più vecchio) in un segmento compresso; restituisce il percorso."""
+    folder = os.path.join(archive_path(), user)
+    os.makedirs(folder, exist_ok=True)
+    first = rows[0]["timestamp"][:10].replace("-", "")
+    path = os.path.join(folder, f"{first}_{rows[0]['id']}-{rows[-1]['id']}.jsonl.gz")
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    # Il segmento è completo su disco prima che i record lascino il database
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def apply_retention(username=None, max_age_days=None, max_count=None, archive=True):
+    """
+    Toglie dal database i record più vecchi di max_age_days giorni e quelli oltre i
+    max_count più recenti di ogni utente, archiviandoli (archive=True) in segmenti
+    compressi. Restituisce il numero di record rimossi.
+    """
+    if not max_age_days and not max_count:
+        return 0
+    flush_history(READ_FLUSH_TIMEOUT)
+    conn = _connection()
+    removed = 0
+    for user in _users(username):
+        clauses = []
+        params = [user]
+        if max_age_days:
+            cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+            clauses.append("timestamp < ?")
+            params.append(cutoff)
+        if max_count:
+            boundary = conn.execute(
+                "SELECT timestamp, id FROM conversions WHERE username = ? "
+                "ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?", (user, max_count - 1)
+            ).fetchone()
+            if boundary:
+                clauses.append("(timestamp, id) < (?, ?)")
+                params += [boundary[0], boundary[1]]
+        if not clauses:
+            continue
+        sql = (f"SELECT id, uuid, timestamp, input, output, count, first_seen FROM conversions "
+               f"WHERE username = ? AND ({' OR '.join(clauses)}) ORDER BY timestamp, id LIMIT ?")
+        while True:
+            rows = [dict(r) for r in conn.execute(sql, params + [ARCHIVE_SEGMENT_SIZE])]
+            if not rows:
+                break
+            if archive:
+                _write_segment(user, rows)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM conversions WHERE id = ?", [(r["id"],) for r in rows])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            removed += len(rows)
+    return removed
+
+
+def iter_archive(username):
+    """Record archiviati dell'utente, dal più recente al più vecchio."""
+    folder = os.path.join(archive_path(), username)
+    if not os.path.isdir(folder):
+        return
+
+    def segment_key(name):
+        # <data>_<primo id>-<ultimo id>.jsonl.gz
+        day, _, ids = name.partition("_")
+        return day, int(ids.split("-")[0])
+
+    names = [n for n in os.listdir(folder) if n.endswith(".jsonl.gz")]
+    for name in sorted(names, key=segment_key, reverse=True):
+        with gzip.open(os.path.join(folder, name), "rt", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        yield from reversed(rows)
+
+
+def maintain_history(username=None, max_age_days=None, max_count=None, compact=None, archive=True):
+    """
+    Compattazione e conservazione in un solo passaggio; i limiti non indicati
+    vengono letti da DEVATRON_HISTORY_MAX_DAYS / DEVATRON_HISTORY_MAX_ENTRIES e,
+    con compact=None, la compattazione da DEVATRON_HISTORY_COMPACT.
+    Restituisce {"compacted": n, "archived": n}.
+    """
+    if compact is None:
+        compact = _env_flag("DEVATRON_HISTORY_COMPACT")
+    max_age_days = max_age_days or _env_int("DEVATRON_HISTORY_MAX_DAYS")
+    max_count = max_count or _env_int("DEVATRON_HISTORY_MAX_ENTRIES")
+    result = {
+        "compacted": compact_history(username) if compact else 0,
+        "archived": apply_retention(username, max_age_days, max_count, archive),
+    }
+    if result["compacted"] or result["archived"]:
+        # Pagine liberate restituite al disco (database creati con auto_vacuum incrementale)
+        # (executescript: con execute il PRAGMA libererebbe una sola pagina)
+        _connection().executescript("PRAGMA incremental_vacuum;")
+    return result
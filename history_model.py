@@ -0,0 +1,155 @@
+"""
+Modello Qt della cronologia (vista a scorrimento del tab Cronologia in gui.py).
+Le pagine vengono lette da history.py su un thread dedicato e consegnate al
+thread della GUI con i segnali.
+"""
+import os
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt, pyqtSignal
+
+from history import PAGE_SIZE as HISTORY_PAGE_SIZE, query_history, query_history_snapshot
+
+
+class HistoryListModel(QAbstractListModel):
+    """
+    Cronologia come modello a righe caricate su richiesta: la vista chiede altre
+    righe (fetchMore) solo quando si scorre verso il fondo, e le pagine vengono
+    lette da un thread dedicato e consegnate con un segnale. In memoria ci sono
+    solo le pagine già viste, non l'intera cronologia.
+    """
+
+    pageLoaded = pyqtSignal(int, object)
+    newerLoaded = pyqtSignal(int, object)
+    loadFailed = pyqtSignal(str)
+
+    def __init__(self, username, parent=None):
+        super().__init__(parent)
+        from concurrent.futures import ThreadPoolExecutor
+        self.username = username
+        self.records = []
+        self.filters = {}
+        # Le risposte di caricamenti precedenti a un reload vengono ignorate
+        self.generation = 0
+        self.loading = False
+        self.exhausted = False
+        # Id più alto caricato: refresh chiede solo i record successivi
+        self.max_id = None
+        # Un refresh alla volta: due richieste con lo stesso max_id inserirebbero due volte i record
+        self.refreshing = False
+        # Un solo thread: le letture restano in ordine e riusano la stessa connessione
+        self.loader = ThreadPoolExecutor(max_workers=1)
+        self.pageLoaded.connect(self.on_page_loaded)
+        self.newerLoaded.connect(self.on_newer_loaded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        if role == Qt.DisplayRole:
+            text = f"[{record['timestamp']}] {os.path.basename(record['input'])} -> {os.path.basename(record['output'])}"
+            if record["count"] > 1:
+                # Conversione ripetuta, unita dalla compattazione
+                text += f"  (×{record['count']})"
+            return text
+        if role == Qt.ToolTipRole:
+            return f"{record['input']}\n-> {record['output']}"
+        if role == Qt.UserRole:
+            return record
+        return None
+
+    def _submit(self, signal, generation, first_page=False, **query):
+        filters = dict(self.filters)
+
+        def task():
+            try:
+                if first_page:
+                    # Con la prima pagina anche l'id più alto (stessa transazione): refresh parte da lì
+                    page, max_id = query_history_snapshot(self.username, HISTORY_PAGE_SIZE, **filters)
+                else:
+                    page, max_id = query_history(self.username, limit=HISTORY_PAGE_SIZE, **filters, **query), None
+            except Exception as e:
+                self.loadFailed.emit(str(e))
+                page, max_id = None, None
+            signal.emit(generation, (page, max_id))
+        self.loader.submit(task)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.loading:
+            return
+        self.loading = True
+        before = self.records[-1] if self.records else None
+        if before is not None:
+            before = (before["timestamp"], before["id"])
+        self._submit(self.pageLoaded, self.generation, first_page=before is None, before=before)
+
+    def on_page_loaded(self, generation, result):
+        page, max_id = result
+        if generation != self.generation:
+            return
+        self.loading = False
+        if page is None:
+            return
+        if max_id is not None:
+            self.max_id = max_id
+        self.exhausted = len(page) < HISTORY_PAGE_SIZE
+        if page:
+            first = len(self.records)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self.records.extend(page)
+            self.endInsertRows()
+
+    def reload(self, filters=None):
+        """Ricarica da capo (filtri cambiati o record modificati dalla manutenzione)."""
+        if filters is not None:
+            self.filters = filters
+        self.generation += 1
+        self.beginResetModel()
+        self.records = []
+        self.loading = False
+        self.exhausted = False
+        self.max_id = None
+        self.refreshing = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def refresh(self):
+        """Aggiunge in testa solo i record registrati dopo quelli già mostrati."""
+        if self.loading and not self.records:
+            # Prima pagina ancora in arrivo: conterrà già i record più recenti
+            return
+        if self.refreshing:
+            return
+        if self.max_id is None:
+            self.reload()
+            return
+        self.refreshing = True
+        self._submit(self.newerLoaded, self.generation, after_id=self.max_id)
+
+    def on_newer_loaded(self, generation, result):
+        page = result[0]
+        if generation != self.generation:
+            return
+        self.refreshing = False
+        if not page:
+            return
+        if len(page) == HISTORY_PAGE_SIZE:
+            # Troppi record nuovi per una sola pagina: più semplice ripartire da capo
+            self.reload()
+            return
+        # Solo i record non ancora mostrati
+        page = [record for record in page if record["id"] > self.max_id]
+        if not page:
+            return
+        self.max_id = max(record["id"] for record in page)
+        self.beginInsertRows(QModelIndex(), 0, len(page) - 1)
+        self.records[:0] = page
+        self.endInsertRows()
+
+    def shutdown(self):
+        self.loader.shutdown(wait=False)
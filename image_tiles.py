@@ -0,0 +1,434 @@
+"""
+Conversione a strisce delle immagini molto grandi (scansioni da decine di migliaia
+di pixel per lato), con un budget di memoria configurabile.
+
+L'immagine viene letta e scritta una striscia di righe alla volta: in memoria ci
+sono solo le righe della striscia corrente, quindi il limite MAX_IMAGE_PIXELS di
+Pillow non si applica (il budget lo sostituisce).
+
+Formati leggibili a strisce:
+- TIFF non compresso, BMP, PPM/PGM: le righe vengono lette direttamente dal file;
+- PNG non interlacciato a 8 bit: lo stream zlib viene decompresso in modo
+  incrementale e ogni striscia viene decodificata (filtri PNG) da Pillow.
+
+Formati scrivibili a strisce: PNG e TIFF (non compresso o deflate, BigTIFF oltre 4 GB).
+Con max_size l'immagine viene ridotta striscia per striscia e l'output (piccolo)
+può essere in qualsiasi formato. Negli altri casi viene sollevato StreamingNotSupported
+e images.convert_raster decodifica l'immagine per intero (con il limite di Pillow).
+"""
+import contextlib
+import io
+import os
+import struct
+import threading
+import zlib
+
+DEFAULT_MAX_MEMORY = 256 * 1024 ** 2
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Tipo colore PNG (8 bit) -> modo Pillow
+_PNG_COLOR_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_PNG_WRITE_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+# Modo Pillow -> (Photometric TIFF, campioni per pixel)
+_TIFF_WRITE_MODES = {"L": (1, 1), "RGB": (2, 3), "RGBA": (2, 4), "CMYK": (5, 4)}
+
+_guard_lock = threading.Lock()
+
+
+class StreamingNotSupported(ValueError):
+    """L'immagine supera il budget e il formato non può essere letto o scritto a strisce."""
+
+
+@contextlib.contextmanager
+def unguarded_open():
+    """
+    Disattiva temporaneamente il controllo MAX_IMAGE_PIXELS di Pillow: la memoria
+    è già limitata dal budget di questo modulo.
+    """
+    from PIL import Image
+    with _guard_lock:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            yield
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+
+
+def _bytes_per_pixel(mode):
+    from PIL import Image
+    return len(Image.new(mode, (1, 1)).tobytes()) or 1
+
+
+def image_memory(path):
+    """(larghezza, altezza, byte stimati per l'immagine decodificata) senza decodificarla."""
+    from PIL import Image
+    with unguarded_open(), Image.open(path) as im:
+        return im.width, im.height, im.width * im.height * _bytes_per_pixel(im.mode)
+
+
+def _band_rows(width, mode, max_memory):
+    # Striscia di input, eventuale conversione di modo e dati compressi in uscita
+    row_bytes = width * max(_bytes_per_pixel(mode), 3)
+    return max(1, max_memory // (row_bytes * 4))
+
+
+# -----------------------------------------------------
+# Lettura
+# -----------------------------------------------------
+class _RawBandReader:
+    """Righe lette direttamente dal file per i formati non compressi (tile "raw" di Pillow)."""
+
+    # Copie di una striscia presenti in memoria durante la lettura
+    overhead = 1
+
+    def __init__(self, path, im):
+        self.path = path
+        self.mode = im.mode
+        self.width, self.height = im.size
+        self.tiles = []
+        for tile in im.tile:
+            codec, extents, offset, args = tile[0], tile[1], tile[2], tile[3]
+            x0, y0, x1, y1 = extents
+            if codec != "raw" or x0 != 0 or x1 != self.width:
+                raise StreamingNotSupported(f"{os.path.basename(path)}: formato compresso, non leggibile a strisce.")
+            if isinstance(args, str):
+                args = (args, 0, 1)
+            rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+            if not stride:
+                stride = self.width * _bytes_per_pixel(self.mode)
+            self.tiles.append((y0, y1, offset, rawmode, stride, orientation or 1))
+        self.palette = im.palette.copy() if im.mode == "P" and im.palette else None
+
+    def bands(self, rows):
+        from PIL import Image
+        with open(self.path, "rb") as f:
+            for top in range(0, self.height, rows):
+                bottom = min(top + rows, self.height)
+                band = Image.new(self.mode, (self.width, bottom - top))
+                for y0, y1, offset, rawmode, stride, orientation in self.tiles:
+                    start, end = max(top, y0), min(bottom, y1)
+                    if start >= end:
+                        continue
+                    if orientation > 0:
+                        f.seek(offset + (start - y0) * stride)
+                    else:
+                        # Righe memorizzate dal basso verso l'alto (BMP)
+                        f.seek(offset + (y1 - end) * stride)
+                    data = f.read((end - start) * stride)
+                    part = Image.frombuffer(self.mode, (self.width, end - start), data, "raw",
+                                            rawmode, stride, orientation)
+                    band.paste(part, (0, start - top))
+                if self.palette:
+                    band.putpalette(self.palette)
+                yield band
+
+
+class _PngBandReader:
+    """
+    PNG letto in modo incrementale: i dati IDAT vengono decompressi a pezzi e ogni
+    striscia di righe filtrate viene decodificata da Pillow come piccolo PNG a sé,
+    preceduta dall'ultima riga della striscia precedente (riferimento dei filtri).
+    """
+
+    # Dati filtrati, PNG non compresso della striscia e immagine decodificata
+    overhead = 3
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(8) != _PNG_SIGNATURE:
+                raise StreamingNotSupported(f"{os.path.basename(path)}: PNG non valido.")
+            length, ctype = struct.unpack(">I4s", f.read(8))
+            ihdr = f.read(length)
+        (self.width, self.height, depth, color_type, _, _, interlace) = struct.unpack(">IIBBBBB", ihdr)
+        if depth != 8 or color_type not in _PNG_COLOR_MODES or interlace:
+            raise StreamingNotSupported(
+                f"{os.path.basename(path)}: solo i PNG a 8 bit non interlacciati sono leggibili a strisce."
+            )
+        self.ihdr = ihdr
+        self.mode = _PNG_COLOR_MODES[color_type]
+        self.row_bytes = self.width * {"L": 1, "RGB": 3, "P": 1, "LA": 2, "RGBA": 4}[self.mode]
+
+    def _chunks(self, f):
+        f.seek(8)
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return
+            length, ctype = struct.unpack(">I4s", header)
+            yield ctype, length
+            if ctype == b"IEND":
+                return
+
+    def _chunk(self, ctype, data):
+        return (struct.pack(">I", len(data)) + ctype + data
+                + struct.pack(">I", zlib.crc32(ctype + data) & 0xFFFFFFFF))
+
+    def bands(self, rows):
+        from PIL import Image
+        line = self.row_bytes + 1
+        extra = b""  # PLTE / tRNS da copiare nei PNG delle strisce
+        inflater = zlib.decompressobj()
+        pending = b""
+        previous = None
+        top = 0
+        with open(self.path, "rb") as f:
+            for ctype, length in self._chunks(f):
+                if ctype in (b"PLTE", b"tRNS"):
+                    extra += self._chunk(ctype, f.read(length))
+                    f.seek(4, os.SEEK_CUR)
+                    continue
+                if ctype != b"IDAT":
+                    f.seek(length + 4, os.SEEK_CUR)
+                    continue
+                remaining = length
+                while remaining:
+                    data = f.read(min(remaining, 64 * 1024))
+                    remaining -= len(data)
+                    while data:
+                        # max_length: dati molto comprimibili non superano la striscia
+                        pending += inflater.decompress(data, rows * line)
+                        data = inflater.unconsumed_tail
+                        while top < self.height and (len(pending) >= rows * line or
+                                                     top + len(pending) // line >= self.height):
+                            count = min(rows, self.height - top, len(pending) // line)
+                            band, previous = self._decode(Image, pending[:count * line], count, previous, extra)
+                            pending = pending[count * line:]
+                            top += count
+                            yield band
+                f.seek(4, os.SEEK_CUR)
+        if top < self.height:
+            raise StreamingNotSupported(f"{os.path.basename(self.path)}: PNG troncato.")
+
+    def _decode(self, Image, filtered, count, previous, extra):
+        # La prima riga (non filtrata) è l'ultima della striscia precedente
+        if previous is not None:
+            filtered = b"\x00" + previous + filtered
+            count += 1
+        ihdr = struct.pack(">II", self.width, count) + self.ihdr[8:]
+        idat = zlib.compress(filtered, 0)
+        del filtered
+        png = b"".join((_PNG_SIGNATURE, self._chunk(b"IHDR", ihdr), extra,
+                        self._chunk(b"IDAT", idat), self._chunk(b"IEND", b"")))
+        del idat
+        im = Image.open(io.BytesIO(png))
+        im.load()
+        del png
+        last = im.crop((0, count - 1, self.width, count)).tobytes()
+        if previous is not None:
+            im = im.crop((0, 1, self.width, count))
+        return im, last
+
+
+def open_band_reader(path):
+    from PIL import Image
+    with unguarded_open(), Image.open(path) as im:
+        fmt = im.format
+        if fmt == "PNG":
+            return _PngBandReader(path)
+        if fmt in ("TIFF", "BMP", "PPM"):
+            return _RawBandReader(path, im)
+    raise StreamingNotSupported(
+        f"{os.path.basename(path)}: il formato {fmt} non è leggibile a strisce "
+        "(supportati: TIFF non compresso, BMP, PPM, PNG a 8 bit)."
+    )
+
+
+# -----------------------------------------------------
+# Scrittura
+# -----------------------------------------------------
+class _PngStreamWriter:
+    """PNG scritto una striscia alla volta in un unico stream zlib (filtro None)."""
+
+    def __init__(self, path, width, height, mode, level=6):
+        self.fp = open(path, "wb")
+        self.mode = mode
+        self.width = width
+        self.deflater = zlib.compressobj(level)
+        self.fp.write(_PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, _PNG_WRITE_TYPES[mode], 0, 0, 0))
+
+    def _chunk(self, ctype, data):
+        self.fp.write(struct.pack(">I", len(data)) + ctype + data)
+        self.fp.write(struct.pack(">I", zlib.crc32(ctype + data) & 0xFFFFFFFF))
+
+    def write_band(self, band):
+        raw = band.tobytes()
+        row = len(raw) // band.height
+        lines = []
+        for y in range(band.height):
+            lines.append(b"\x00")
+            lines.append(raw[y * row:(y + 1) * row])
+        data = self.deflater.compress(b"".join(lines))
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self.deflater.flush())
+        self._chunk(b"IEND", b"")
+        self.fp.close()
+
+
+class _TiffStreamWriter:
+    """
+    TIFF a strisce (una striscia per banda, non compressa o deflate). Le tabelle e
+    la IFD sono scritte alla fine; oltre 4 GB si usa il formato BigTIFF.
+    """
+
+    def __init__(self, path, width, height, mode, compress=True):
+        self.fp = open(path, "wb")
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.compress = compress
+        self.photometric, self.samples = _TIFF_WRITE_MODES[mode]
+        self.big = width * height * self.samples > 0xFFFFFFFF - (64 * 1024 ** 2)
+        self.offsets = []
+        self.counts = []
+        self.rows_per_strip = None
+        if self.big:
+            self.fp.write(b"II+\x00" + struct.pack("<HHQ", 8, 0, 0))
+        else:
+            self.fp.write(b"II*\x00" + struct.pack("<I", 0))
+
+    def write_band(self, band):
+        if self.rows_per_strip is None:
+            self.rows_per_strip = band.height
+        data = band.tobytes()
+        if self.compress:
+            data = zlib.compress(data, 6)
+        self.offsets.append(self.fp.tell())
+        self.counts.append(len(data))
+        self.fp.write(data)
+
+    def _array(self, values, type_code):
+        fmt = {3: "H", 4: "I", 16: "Q"}[type_code]
+        if self.fp.tell() % 2:
+            self.fp.write(b"\x00")
+        offset = self.fp.tell()
+        self.fp.write(struct.pack("<%d%s" % (len(values), fmt), *values))
+        return offset
+
+    def close(self):
+        long_type = 16 if self.big else 4
+        inline = 8 if self.big else 4
+        sizes = {3: 2, 4: 4, 16: 8}
+        tags = [
+            (256, 4, [self.width]),
+            (257, 4, [self.height]),
+            (258, 3, [8] * self.samples),
+            (259, 3, [8 if self.compress else 1]),
+            (262, 3, [self.photometric]),
+            (273, long_type, self.offsets),
+            (277, 3, [self.samples]),
+            (278, 4, [self.rows_per_strip or self.height]),
+            (279, long_type, self.counts),
+            (284, 3, [1]),
+        ]
+        if self.mode == "RGBA":
+            tags.append((338, 3, [2]))  # alfa non premoltiplicato
+        entries = []
+        for tag, type_code, values in tags:
+            if len(values) * sizes[type_code] <= inline:
+                fmt = "<%d%s" % (len(values), {3: "H", 4: "I", 16: "Q"}[type_code])
+                value = struct.pack(fmt, *values).ljust(inline, b"\x00")
+            else:
+                offset = self._array(values, type_code)
+                value = struct.pack("<Q" if self.big else "<I", offset)
+            entries.append((tag, type_code, len(values), value))
+        if self.fp.tell() % 2:
+            self.fp.write(b"\x00")
+        ifd = self.fp.tell()
+        if self.big:
+            self.fp.write(struct.pack("<Q", len(entries)))
+            for tag, type_code, count, value in entries:
+                self.fp.write(struct.pack("<HHQ", tag, type_code, count) + value)
+            self.fp.write(struct.pack("<Q", 0))
+            self.fp.seek(8)
+            self.fp.write(struct.pack("<Q", ifd))
+        else:
+            self.fp.write(struct.pack("<H", len(entries)))
+            for tag, type_code, count, value in entries:
+                self.fp.write(struct.pack("<HHI", tag, type_code, count) + value)
+            self.fp.write(struct.pack("<I", 0))
+            self.fp.seek(4)
+            self.fp.write(struct.pack("<I", ifd))
+        self.fp.close()
+
+
+def _open_writer(output_path, width, height, mode):
+    """Writer a strisce per l'estensione di output_path e il modo (eventualmente convertito)."""
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext == ".png":
+        out_mode = mode if mode in _PNG_WRITE_TYPES else ("RGBA" if mode in ("P", "PA") else "RGB")
+        return _PngStreamWriter(output_path, width, height, out_mode), out_mode
+    if ext in (".tif", ".tiff"):
+        out_mode = mode if mode in _TIFF_WRITE_MODES else ("RGBA" if mode in ("LA", "P", "PA") else "RGB")
+        return _TiffStreamWriter(output_path, width, height, out_mode), out_mode
+    raise StreamingNotSupported(
+        f"Il formato {ext} non può essere scritto a strisce: per immagini oltre il budget "
+        "di memoria usa .png o .tiff, oppure indica un lato massimo (max_size)."
+    )
+
+
+# -----------------------------------------------------
+# Conversione
+# -----------------------------------------------------
+def convert_tiled(input_img, output_path, max_memory=DEFAULT_MAX_MEMORY, max_size=None, progress=None,
+                  save_options=None):
+    """
+    Converte input_img in output_path a strisce (vedi docstring del modulo).
+    progress(done_rows, total_rows) viene chiamata dopo ogni striscia;
+    save_options (vedi images.save_image) valgono per l'immagine ridotta con max_size.
+    """
+    from PIL import Image
+
+    reader = open_band_reader(input_img)
+    width, height = reader.width, reader.height
+    factor = 1
+    if max_size and max(width, height) > max_size:
+        # Riduzione per un fattore intero su ogni striscia, poi ricampionamento finale
+        factor = max(1, max(width, height) // max_size)
+    rows = max(1, _band_rows(width, reader.mode, max_memory) // reader.overhead)
+    if factor > 1:
+        rows = max(factor, rows - rows % factor)
+
+    tmp_path = output_path + ".part" + os.path.splitext(output_path)[1]
+    done = 0
+    try:
+        if factor > 1:
+            small = None
+            for band in reader.bands(rows):
+                # Palette e bianco/nero vengono ridotti come colori (media dei pixel);
+                # ogni striscia porta con sé la propria palette e trasparenza
+                if band.mode == "P":
+                    band = band.convert("RGBA" if "transparency" in band.info else "RGB")
+                elif band.mode == "1":
+                    band = band.convert("L")
+                if small is None:
+                    small = Image.new(band.mode, ((width + factor - 1) // factor, (height + factor - 1) // factor))
+                small.paste(band.reduce(factor), (0, done // factor))
+                done += band.height
+                if progress:
+                    progress(done, height)
+            from images import save_image
+            small.thumbnail((max_size, max_size), Image.LANCZOS)
+            save_image(small, tmp_path, **(save_options or {}))
+        else:
+            writer, out_mode = _open_writer(tmp_path, width, height, reader.mode)
+            try:
+                for band in reader.bands(rows):
+                    if band.mode != out_mode:
+                        band = band.convert(out_mode)
+                    writer.write_band(band)
+                    done += band.height
+                    if progress:
+                        progress(done, height)
+            finally:
+                writer.close()
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
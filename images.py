@@ -0,0 +1,304 @@
+"""
+Elaborazione delle immagini raster con Pillow.
+
+Con max_size (lato massimo in pixel) l'immagine non viene mai decodificata a piena
+risoluzione se non serve: per i JPEG Pillow decodifica direttamente a 1/2, 1/4 o
+1/8 della dimensione (draft, scalatura nel dominio DCT); per gli altri formati
+riduce prima di un fattore intero (reduce) e solo alla fine ricampiona con un
+filtro di qualità.
+
+run_image_batch converte molte immagini su un pool di thread: Pillow rilascia il
+GIL durante decodifica, ridimensionamento e codifica, quindi i thread lavorano in
+parallelo senza il costo di avvio dei processi del batch.
+
+Le immagini che decodificate supererebbero max_memory vengono convertite a
+strisce (vedi image_tiles.py).
+
+Con target_size (byte) JPEG e WEBP vengono salvati con la qualità più alta che sta
+nel limite: ricerca binaria sulla qualità, codificando in memoria la stessa
+immagine già decodificata.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+RASTER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp")
+
+_SAVE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".pdf": "PDF"}
+# Formati di output senza canale alfa / palette
+_RGB_ONLY = (".jpg", ".jpeg", ".pdf")
+# Formati con qualità regolabile (target_size)
+QUALITY_EXTENSIONS = (".jpg", ".jpeg", ".webp")
+
+# Intervallo della ricerca della qualità
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def open_image(path, max_size=None, unguarded=False):
+    """
+    Apre un'immagine e, con max_size, la riduce perché il lato maggiore non superi
+    max_size pixel. L'orientamento EXIF viene applicato.
+    unguarded disattiva MAX_IMAGE_PIXELS (dimensione già verificata dal chiamante).
+    """
+    from PIL import Image, ImageOps
+
+    if unguarded:
+        from image_tiles import unguarded_open
+        with unguarded_open():
+            im = Image.open(path)
+    else:
+        im = Image.open(path)
+    if max_size and max(im.size) > max_size:
+        # thumbnail usa draft() per i JPEG e reduce() per gli altri formati prima
+        # del ricampionamento finale (reducing_gap): la decodifica completa è evitata
+        im.thumbnail((max_size, max_size), Image.LANCZOS, reducing_gap=2.0)
+    else:
+        im.load()
+    # Dopo la riduzione: la rotazione lavora sull'immagine già piccola
+    transposed = ImageOps.exif_transpose(im)
+    if transposed is not im:
+        im.close()
+    return transposed
+
+
+def encoder_options(ext_out, quality=None, progressive=False, webp_method=None):
+    """Opzioni di Pillow.save per il formato di output (None = default di Pillow)."""
+    options = {}
+    if ext_out in QUALITY_EXTENSIONS and quality:
+        options["quality"] = int(quality)
+    if ext_out in (".jpg", ".jpeg") and progressive:
+        # optimize: tabelle di Huffman ottimizzate, file più piccolo a parità di qualità
+        options["progressive"] = True
+        options["optimize"] = True
+    if ext_out == ".webp" and webp_method is not None:
+        options["method"] = int(webp_method)
+    return options
+
+
+def encode_to_size(im, ext_out, target_size, progressive=False, webp_method=None,
+                   min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+    """
+    Codifica im (JPEG o WEBP) con la qualità più alta il cui risultato non supera
+    target_size byte. Restituisce (bytes, qualità); ValueError se nemmeno
+    min_quality basta.
+    """
+    if ext_out not in QUALITY_EXTENSIONS:
+        raise ValueError(f"Dimensione massima non supportata per {ext_out} (solo JPEG e WEBP).")
+    if ext_out == ".webp":
+        if im.mode not in ("RGB", "RGBA", "L"):
+            im = im.convert("RGBA" if "A" in im.mode or "transparency" in im.info else "RGB")
+    elif im.mode not in ("RGB", "L"):
+        im = im.convert("RGB")
+
+    def encode(quality):
+        out = io.BytesIO()
+        im.save(out, _SAVE_FORMATS[ext_out], **encoder_options(ext_out, quality, progressive, webp_method))
+        return out.getvalue()
+
+    best = None
+    low, high = min_quality, max_quality
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(quality)
+        if len(data) <= target_size:
+            best = (data, quality)
+            low = quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        raise ValueError(
+            f"Impossibile stare sotto {target_size / 1024:.0f} KB anche con qualità {min_quality}: "
+            "riduci la dimensione dell'immagine (max_size)."
+        )
+    return best
+
+
+def save_image(im, output_path, target_size=None, quality=None, progressive=False, webp_method=None,
+               ext_out=None):
+    """
+    Salva nel formato indicato dall'estensione di output_path. Con target_size
+    la qualità viene scelta per non superare quel numero di byte (come quality,
+    vale solo per JPEG e WEBP). output_path può essere anche un file binario
+    aperto (ad es. BytesIO): il formato è allora dato da ext_out.
+    """
+    from PIL import Image
+
+    ext_out = (ext_out or os.path.splitext(output_path)[1]).lower()
+    if target_size and ext_out in QUALITY_EXTENSIONS:
+        data, _ = encode_to_size(im, ext_out, target_size, progressive, webp_method)
+        if hasattr(output_path, "write"):
+            output_path.write(data)
+        else:
+            with open(output_path, "wb") as f:
+                f.write(data)
+        return output_path
+    if ext_out in _RGB_ONLY and im.mode not in ("RGB", "L"):
+        im = im.convert("RGB")
+    fmt = _SAVE_FORMATS.get(ext_out)
+    if fmt is None and hasattr(output_path, "write"):
+        fmt = Image.registered_extensions().get(ext_out)
+    im.save(output_path, fmt, **encoder_options(ext_out, quality, progressive, webp_method))
+    return output_path
+
+
+def _decoded_bytes(input_img, max_size, ext_in=None):
+    """
+    Memoria stimata per decodificare input_img (tenendo conto del draft JPEG).
+    input_img può essere un file aperto: l'estensione è allora data da ext_in.
+    """
+    from image_tiles import image_memory
+
+    width, height, size = image_memory(input_img)
+    ext_in = (ext_in or os.path.splitext(input_img)[1]).lower()
+    if max_size and ext_in in (".jpg", ".jpeg"):
+        # draft() scala di 1/2, 1/4 o 1/8 restando sopra max_size
+        scale = 1
+        while scale < 8 and max(width, height) // (scale * 2) >= max_size:
+            scale *= 2
+        size //= scale * scale
+    return size
+
+
+def convert_raster(input_img, output_path, max_size=None, max_memory=None, **save_options):
+    """
+    Converte un'immagine raster (save_options: vedi save_image). Se decodificata
+    supererebbe max_memory byte (default image_tiles.DEFAULT_MAX_MEMORY) la
+    conversione avviene a strisce; i formati non leggibili o scrivibili a strisce
+    (ad es. JPEG) vengono decodificati per intero, entro il limite MAX_IMAGE_PIXELS
+    di Pillow.
+    """
+    from image_tiles import DEFAULT_MAX_MEMORY, StreamingNotSupported, convert_tiled
+
+    unguarded = True
+    if _decoded_bytes(input_img, max_size) > (max_memory or DEFAULT_MAX_MEMORY):
+        try:
+            return convert_tiled(input_img, output_path, max_memory or DEFAULT_MAX_MEMORY, max_size,
+                                 save_options=save_options)
+        except StreamingNotSupported:
+            # La dimensione non è più limitata dal budget: vale il controllo di Pillow
+            unguarded = False
+    # Una sola decodifica anche quando target_size richiede più codifiche
+    im = open_image(input_img, max_size, unguarded=unguarded)
+    try:
+        return save_image(im, output_path, **save_options)
+    finally:
+        im.close()
+
+
+def run_image_batch(jobs, max_size=None, max_workers=None, on_result=None, options=None):
+    """
+    Converte le immagini (lista di coppie input/output) su un pool di thread.
+    Stessa interfaccia di batch.run_batch: on_result(result, done, total) viene
+    chiamata nell'ordine di completamento e i risultati tornano nell'ordine dei job.
+    """
+    from batch import _run_job
+
+    jobs = list(jobs)
+    total = len(jobs)
+    results = [None] * total
+    options = dict(options or {})
+    if max_size:
+        options["max_size"] = max_size
+    max_workers = max(1, min(max_workers or default_workers(), total or 1))
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_run_job, in_path, out_path, options): idx
+            for idx, (in_path, out_path) in enumerate(jobs)
+        }
+        for fut in as_completed(futures):
+            idx = futures[fut]
+            results[idx] = fut.result()
+            done += 1
+            if on_result:
+                on_result(results[idx], done, total)
+    return results
+
+
+def is_raster_job(in_path, out_path):
+    """True se input e output sono immagini raster gestite da run_image_batch."""
+    ext_in = os.path.splitext(in_path)[1].lower()
+    ext_out = os.path.splitext(out_path)[1].lower()
+    return ext_in in RASTER_EXTENSIONS and (ext_out in RASTER_EXTENSIONS or ext_out == ".pdf")
+
+
+# -----------------------------------------------------
+# Immagini per PDF (vedi conversions.images_to_pdf)
+# -----------------------------------------------------
+_JPEG_PASSTHROUGH_MODES = {"L": "/DeviceGray", "RGB": "/DeviceRGB", "CMYK": "/DeviceCMYK"}
+# Orientamenti EXIF ottenibili ruotando la pagina invece di decodificare l'immagine
+_PASSTHROUGH_ORIENTATIONS = (1, 3, 6, 8)
+
+
+class PdfImage:
+    """Dati di un'immagine pronti da scrivere come XObject in un PDF."""
+
+    def __init__(self, width, height, colorspace, data, filter_name, dpi, orientation=1,
+                 decode=None, smask=None):
+        self.width = width
+        self.height = height
+        self.colorspace = colorspace
+        self.data = data
+        self.filter_name = filter_name
+        self.dpi = dpi
+        self.orientation = orientation
+        self.decode = decode
+        # Canale alfa (DeviceGray, FlateDecode) oppure None
+        self.smask = smask
+
+
+def _image_dpi(im, dpi):
+    if dpi:
+        return dpi
+    info_dpi = im.info.get("dpi")
+    try:
+        return float(info_dpi[0]) if info_dpi and float(info_dpi[0]) > 1 else 72.0
+    except (TypeError, ValueError):
+        return 72.0
+
+
+def _flate_image(frame, dpi):
+    """Frame decodificato -> PdfImage compresso con Flate (con SMask per l'alfa)."""
+    import zlib
+    from PIL import ImageOps
+
+    frame = ImageOps.exif_transpose(frame)
+    smask = None
+    if frame.mode == "P":
+        frame = frame.convert("RGBA" if "transparency" in frame.info else "RGB")
+    if frame.mode in ("RGBA", "LA", "PA"):
+        smask = zlib.compress(frame.getchannel("A").tobytes())
+        frame = frame.convert("RGB" if frame.mode != "LA" else "L")
+    if frame.mode not in _JPEG_PASSTHROUGH_MODES:
+        frame = frame.convert("L" if frame.mode in ("1", "I", "I;16", "F") else "RGB")
+    return PdfImage(frame.width, frame.height, _JPEG_PASSTHROUGH_MODES[frame.mode],
+                    zlib.compress(frame.tobytes()), "/FlateDecode", dpi, smask=smask)
+
+
+def iter_pdf_images(path, dpi=None):
+    """
+    PdfImage per ogni immagine (o frame, per TIFF/GIF multipagina) di path, uno alla
+    volta. I JPEG vengono incorporati così come sono (DCTDecode), senza decodifica;
+    la rotazione EXIF in quel caso viene applicata alla pagina.
+    """
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as im:
+        resolution = _image_dpi(im, dpi)
+        if im.format == "JPEG" and im.mode in _JPEG_PASSTHROUGH_MODES:
+            orientation = im.getexif().get(0x0112, 1)
+            if orientation in _PASSTHROUGH_ORIENTATIONS:
+                with open(path, "rb") as f:
+                    data = f.read()
+                # Photoshop salva i JPEG CMYK con i valori invertiti (come fa Pillow)
+                decode = [1, 0, 1, 0, 1, 0, 1, 0] if im.mode == "CMYK" else None
+                yield PdfImage(im.width, im.height, _JPEG_PASSTHROUGH_MODES[im.mode], data,
+                               "/DCTDecode", resolution, orientation, decode)
+                return
+        for frame in ImageSequence.Iterator(im):
+            yield _flate_image(frame.copy(), resolution)
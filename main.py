@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication, QDialog
 from gui import MainWindow, LoginDialog
 
@@ -14,4 +15,6 @@ def main():
         sys.exit(0)
 
 if __name__ == "__main__":
+    # Necessario per il pool di processi del motore batch nell'app impacchettata con PyInstaller
+    multiprocessing.freeze_support()
     main()
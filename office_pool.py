@@ -0,0 +1,420 @@
+"""
+Pool di processi LibreOffice headless per convertire DOCX -> PDF su Linux,
+dove docx2pdf (che richiede Microsoft Word) non funziona.
+
+Ogni istanza del pool ha un proprio profilo utente e un processo LibreOffice sempre
+avviato, così il costo di avvio si paga una sola volta per istanza:
+
+- con il modulo `uno` (pacchetto python3-uno, di solito assente negli ambienti creati
+  con pip o pyenv) il processo `soffice` riceve i documenti direttamente tramite UNO;
+- altrimenti, se sono installati i comandi di unoserver (`unoserver` e `unoconvert`),
+  ogni istanza avvia un server unoserver e i documenti gli vengono passati con
+  `unoconvert`.
+
+Senza nessuno dei due non c'è un processo caldo: ogni job lancia
+`soffice --convert-to` sul profilo già inizializzato dell'istanza, che evita solo la
+creazione del profilo (la parte più lenta del primo avvio). warm_backend indica quale
+modalità è disponibile; latency_summary lo segnala nel riepilogo mostrato da CLI e GUI.
+
+Nel batch ogni processo worker ha il proprio pool di una sola istanza, avviata al
+primo documento e riusata per tutti i documenti successivi dello stesso processo.
+
+Un job che supera il timeout fa terminare e riavviare l'istanza. Il pool tiene
+traccia della latenza di ogni job (vedi OfficePool.stats); quella dell'ultimo job
+di un thread è disponibile con take_latency, che batch.py usa per riportarla nel
+risultato di ogni file (anche dai processi worker) e la CLI e la GUI per mostrarla.
+"""
+import atexit
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+DEFAULT_TIMEOUT = 120
+_MAC_SOFFICE = "/Applications/LibreOffice.app/Contents/MacOS/soffice"
+
+# Latenza dell'ultimo job riuscito di ogni thread (vedi take_latency)
+_latency = threading.local()
+
+
+def find_soffice():
+    """Percorso dell'eseguibile di LibreOffice, oppure None."""
+    for name in ("soffice", "libreoffice"):
+        path = shutil.which(name)
+        if path:
+            return path
+    if os.path.exists(_MAC_SOFFICE):
+        return _MAC_SOFFICE
+    return None
+
+
+def has_uno():
+    try:
+        import uno  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def has_unoserver():
+    return shutil.which("unoserver") is not None and shutil.which("unoconvert") is not None
+
+
+def warm_backend():
+    """Modalità con un processo LibreOffice sempre avviato: "uno", "unoserver" oppure None."""
+    if has_uno():
+        return "uno"
+    if has_unoserver():
+        return "unoserver"
+    return None
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OfficeTimeout(RuntimeError):
+    pass
+
+
+class OfficeInstance:
+    """
+    Un processo soffice (o un server unoserver, o solo un profilo) usato da un job
+    alla volta. backend: "uno", "unoserver" oppure "cli" (nessun processo caldo).
+    """
+
+    def __init__(self, index, soffice, backend):
+        self.index = index
+        self.soffice = soffice
+        self.backend = backend
+        self.profile_dir = tempfile.mkdtemp(prefix=f"devatron_office_{index}_")
+        self.pipe_name = f"devatron_{os.getpid()}_{index}"
+        self.port = None
+        self.process = None
+        self.desktop = None
+
+    @property
+    def warm(self):
+        return self.backend != "cli"
+
+    @property
+    def profile_url(self):
+        from pathlib import Path
+        return Path(self.profile_dir).as_uri()
+
+    def start(self, timeout=60):
+        if self.backend == "unoserver":
+            self._start_unoserver(timeout)
+            return
+        if self.backend != "uno":
+            return
+        self.process = subprocess.Popen(
+            [
+                self.soffice, "--headless", "--invisible", "--nologo", "--norestore",
+                "--nodefault", "--nolockcheck",
+                f"-env:UserInstallation={self.profile_url}",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.desktop = self._connect(timeout)
+
+    def _connect(self, timeout):
+        import uno
+        from com.sun.star.connection import NoConnectException
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+                return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+            except NoConnectException:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Impossibile avviare LibreOffice in modalità headless.")
+                time.sleep(0.2)
+
+    def _start_unoserver(self, timeout):
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                "unoserver", "--executable", self.soffice, "--interface", "127.0.0.1",
+                "--port", str(self.port), "--uno-port", str(_free_port()),
+                "--user-installation", self.profile_url,
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        # Il server è pronto quando accetta connessioni sulla sua porta
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                    return
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Impossibile avviare unoserver per LibreOffice.")
+                time.sleep(0.2)
+
+    def stop(self):
+        if self.backend == "unoserver":
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+            return
+        if self.process is not None and self.process.poll() is None:
+            try:
+                if self.desktop is not None:
+                    self.desktop.terminate()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self.desktop = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def close(self):
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    # -----------------------------------------------------
+    # Conversione
+    # -----------------------------------------------------
+    def convert(self, input_path, output_path, timeout):
+        input_path = os.path.abspath(input_path)
+        output_path = os.path.abspath(output_path)
+        if self.backend == "uno":
+            self._convert_uno(input_path, output_path, timeout)
+        elif self.backend == "unoserver":
+            self._convert_unoserver(input_path, output_path, timeout)
+        else:
+            self._convert_cli(input_path, output_path, timeout)
+
+    def _convert_uno(self, input_path, output_path, timeout):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def prop(name, value):
+            p = PropertyValue()
+            p.Name = name
+            p.Value = value
+            return p
+
+        error = []
+
+        def run():
+            try:
+                doc = self.desktop.loadComponentFromURL(
+                    uno.systemPathToFileUrl(input_path), "_blank", 0, (prop("Hidden", True),)
+                )
+                if doc is None:
+                    raise RuntimeError(f"LibreOffice non riesce ad aprire {input_path}")
+                try:
+                    doc.storeToURL(uno.systemPathToFileUrl(output_path), (prop("FilterName", "writer_pdf_Export"),))
+                finally:
+                    doc.close(True)
+            except Exception as e:
+                error.append(e)
+
+        # La chiamata UNO è bloccante: la eseguiamo in un thread per poter applicare il timeout
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        t.join(timeout)
+        if t.is_alive():
+            raise OfficeTimeout(f"LibreOffice non ha risposto entro {timeout} s")
+        if error:
+            raise error[0]
+
+    def _convert_unoserver(self, input_path, output_path, timeout):
+        cmd = ["unoconvert", "--host", "127.0.0.1", "--port", str(self.port),
+               "--convert-to", "pdf", input_path, output_path]
+        try:
+            process = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise OfficeTimeout(f"LibreOffice non ha risposto entro {timeout} s")
+        if process.returncode != 0 or not os.path.exists(output_path):
+            raise RuntimeError(f"Errore conversione docx->pdf (unoserver): {process.stderr.strip()}")
+
+    def _convert_cli(self, input_path, output_path, timeout):
+        out_dir = tempfile.mkdtemp(prefix="devatron_office_out_")
+        try:
+            cmd = [
+                self.soffice, "--headless", "--norestore", "--nolockcheck",
+                f"-env:UserInstallation={self.profile_url}",
+                "--convert-to", "pdf", "--outdir", out_dir, input_path,
+            ]
+            try:
+                process = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                raise OfficeTimeout(f"LibreOffice non ha risposto entro {timeout} s")
+            produced = os.path.join(out_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+            if process.returncode != 0 or not os.path.exists(produced):
+                raise RuntimeError(f"Errore conversione docx->pdf (LibreOffice): {process.stderr.strip()}")
+            shutil.move(produced, output_path)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+class OfficePool:
+    """
+    Pool di istanze LibreOffice. convert() è thread-safe: ogni chiamata prende
+    un'istanza libera (attendendo se necessario) e la restituisce al termine.
+    """
+
+    def __init__(self, size=2, timeout=DEFAULT_TIMEOUT, soffice=None, backend=None):
+        """backend: "uno", "unoserver" o "cli"; default: warm_backend(), altrimenti "cli"."""
+        self.soffice = soffice or find_soffice()
+        if not self.soffice:
+            raise RuntimeError("LibreOffice (soffice) non trovato: necessario per la conversione docx->pdf.")
+        self.backend = backend or warm_backend() or "cli"
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._instances = []
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.failures = 0
+        self.restarts = 0
+        # Ultimi job eseguiti: (input, secondi, esito)
+        self.job_log = deque(maxlen=1000)
+        for i in range(self.size):
+            self._idle.put(None)  # le istanze vengono avviate al primo utilizzo
+
+    def _acquire(self):
+        inst = self._idle.get()
+        if inst is None:
+            with self._lock:
+                inst = OfficeInstance(len(self._instances), self.soffice, self.backend)
+                self._instances.append(inst)
+            try:
+                inst.start()
+            except Exception:
+                self._idle.put(None)
+                raise
+        elif inst.warm and (inst.process is None or inst.process.poll() is not None):
+            # Processo terminato (o riavvio fallito) dopo l'ultimo job
+            try:
+                inst.restart()
+            except Exception:
+                self._idle.put(inst)
+                raise
+        return inst
+
+    def convert(self, input_path, output_path):
+        """Converte un documento in PDF e restituisce la latenza del job in secondi."""
+        inst = self._acquire()
+        start = time.perf_counter()
+        ok = False
+        try:
+            inst.convert(input_path, output_path, self.timeout)
+            ok = True
+        except OfficeTimeout:
+            # Istanza bloccata: la terminiamo e ne riavviamo una pulita
+            with self._lock:
+                self.restarts += 1
+            inst.restart()
+            raise
+        except Exception:
+            if inst.process is not None and inst.process.poll() is not None:
+                # Il processo è terminato durante il job
+                with self._lock:
+                    self.restarts += 1
+                inst.restart()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if ok:
+                _latency.value = elapsed
+            with self._lock:
+                self.jobs += 1
+                if not ok:
+                    self.failures += 1
+                self.job_log.append((input_path, elapsed, ok))
+            self._idle.put(inst)
+        return elapsed
+
+    def stats(self):
+        with self._lock:
+            avg, p95 = _avg_p95([e for _, e, ok in self.job_log if ok])
+            return {
+                "backend": self.backend,
+                "instances": len(self._instances),
+                "jobs": self.jobs,
+                "failures": self.failures,
+                "restarts": self.restarts,
+                "avg_latency": avg,
+                "p95_latency": p95,
+                "last_latency": self.job_log[-1][1] if self.job_log else None,
+            }
+
+    def close(self):
+        with self._lock:
+            for inst in self._instances:
+                inst.close()
+            self._instances = []
+
+
+def _avg_p95(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None, None
+    return sum(latencies) / len(latencies), latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+
+def take_latency():
+    """Latenza (secondi) dell'ultimo job riuscito del thread corrente, poi azzerata; None se non ce n'è."""
+    value = getattr(_latency, "value", None)
+    _latency.value = None
+    return value
+
+
+def latency_summary(results):
+    """Riepilogo delle latenze LibreOffice dei risultati del batch (None se nessun file è passato dal pool)."""
+    latencies = [r["office_latency"] for r in results if r.get("office_latency") is not None]
+    if not latencies:
+        return None
+    avg, p95 = _avg_p95(latencies)
+    summary = f"LibreOffice: {len(latencies)} documenti, latenza media {avg:.2f} s, p95 {p95:.2f} s"
+    if warm_backend() is None:
+        summary += " (avvio a freddo per ogni documento: installare python3-uno o unoserver)"
+    return summary
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Pool condiviso dal processo corrente. Nei processi del batch (che già
+    parallelizzano sui file) il pool ha una sola istanza.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if multiprocessing.parent_process() is not None:
+                size = 1
+            else:
+                size = int(os.environ.get("DEVATRON_OFFICE_POOL_SIZE", min(4, os.cpu_count() or 1)))
+            _pool = OfficePool(size=size)
+            atexit.register(_pool.close)
+        return _pool
+
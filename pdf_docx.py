@@ -0,0 +1,186 @@
+"""
+Conversione PDF -> DOCX in parallelo per documenti lunghi.
+
+Due strategie:
+- "native": il multiprocessing di pdf2docx (Converter.convert(multi_processing=True)).
+  Analizza le pagine in parallelo ma crea un unico DOCX, quindi è la più fedele.
+  Scrive però dei file pages-N.json nella cartella corrente, non riporta
+  l'avanzamento e due conversioni contemporanee nella stessa cartella si
+  sovrascriverebbero: la usiamo solo quando la cartella corrente è scrivibile,
+  non serve il progresso e una alla volta per processo.
+- "chunks": il documento viene diviso in blocchi di pagine convertiti da un pool
+  di processi in DOCX temporanei, poi uniti in ordine (stitch_docx). L'avanzamento
+  è riportato per blocco.
+"""
+import copy
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULT_CHUNK_PAGES = 20
+
+_native_lock = threading.Lock()
+
+
+def pdf_page_count(input_pdf):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(input_pdf)
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return len(reader.pages)
+
+
+def _default_workers():
+    # Nei processi del batch si converte già un file per core
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+
+def _convert_range(input_pdf, output_docx, start, end):
+    """Converte le pagine [start, end) (0-based) in output_docx."""
+    from pdf2docx import Converter
+    cv = Converter(input_pdf)
+    try:
+        cv.convert(output_docx, start=start, end=end)
+    finally:
+        cv.close()
+    return output_docx
+
+
+def _native_available():
+    return os.access(os.getcwd(), os.W_OK) and not _native_lock.locked()
+
+
+def _convert_native(input_pdf, output_docx, max_workers):
+    from pdf2docx import Converter
+    with _native_lock:
+        cv = Converter(input_pdf)
+        try:
+            cv.convert(output_docx, multi_processing=True, cpu_count=max_workers)
+        finally:
+            cv.close()
+    return output_docx
+
+
+def _convert_chunks(input_pdf, output_docx, page_count, chunk_pages, max_workers, progress):
+    chunks = [(s, min(s + chunk_pages, page_count)) for s in range(0, page_count, chunk_pages)]
+    tmp_dir = tempfile.mkdtemp(prefix="devatron_pdf2docx_")
+    try:
+        parts = [os.path.join(tmp_dir, f"part_{i:05d}.docx") for i in range(len(chunks))]
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+            futures = [
+                pool.submit(_convert_range, input_pdf, part, start, end)
+                for part, (start, end) in zip(parts, chunks)
+            ]
+            done = 0
+            for fut in as_completed(futures):
+                fut.result()
+                done += 1
+                if progress:
+                    progress(done, len(chunks))
+        stitch_docx(parts, output_docx)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return output_docx
+
+
+def convert_pdf_to_docx_parallel(input_pdf, output_docx, chunk_pages=None, max_workers=None,
+                                 progress=None, mode="auto"):
+    """
+    Converte input_pdf in output_docx su più processi.
+
+    - chunk_pages: pagine per blocco nella strategia "chunks" (default 20).
+    - max_workers: processi da usare (default: numero di core).
+    - progress(done, total): blocchi completati (solo strategia "chunks").
+    - mode: "auto", "native" o "chunks" (vedi docstring del modulo). In "auto" si
+      prova prima pdf2docx nativo e, se non è utilizzabile o fallisce, i blocchi.
+    """
+    chunk_pages = chunk_pages or DEFAULT_CHUNK_PAGES
+    max_workers = max_workers or _default_workers()
+    page_count = pdf_page_count(input_pdf)
+
+    if max_workers <= 1 or page_count <= chunk_pages:
+        _convert_range(input_pdf, output_docx, 0, None)
+        if progress:
+            progress(1, 1)
+        return output_docx
+
+    if mode == "native" or (mode == "auto" and progress is None and _native_available()):
+        try:
+            return _convert_native(input_pdf, output_docx, max_workers)
+        except Exception:
+            if mode == "native":
+                raise
+    return _convert_chunks(input_pdf, output_docx, page_count, chunk_pages, max_workers, progress)
+
+
+def _copy_relationships(element, src_part, dst_part):
+    """
+    Ricrea nel documento di destinazione le relazioni (immagini, link esterni)
+    referenziate da element, aggiornando gli rId.
+    """
+    import io
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+    from docx.oxml.ns import qn
+
+    r_attrs = (qn("r:embed"), qn("r:link"), qn("r:id"))
+    for node in element.iter():
+        for attr in r_attrs:
+            r_id = node.get(attr)
+            if not r_id or r_id not in src_part.rels:
+                continue
+            rel = src_part.rels[r_id]
+            if rel.is_external:
+                new_id = dst_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+            elif rel.reltype == RT.IMAGE:
+                new_id, _ = dst_part.get_or_add_image(io.BytesIO(rel.target_part.blob))
+            else:
+                continue
+            node.set(attr, new_id)
+
+
+def stitch_docx(parts, output_docx):
+    """
+    Unisce più DOCX (nell'ordine) in output_docx. Ogni parte conserva le proprie
+    impostazioni di pagina: la fine di una parte diventa un'interruzione di sezione.
+    """
+    import docx
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    base = docx.Document(parts[0])
+    body = base.element.body
+    for path in parts[1:]:
+        src = docx.Document(path)
+        src_body = src.element.body
+        # Chiude la sezione corrente con le impostazioni di pagina della parte precedente
+        sect_pr = body.find(qn("w:sectPr"))
+        if sect_pr is not None:
+            p = OxmlElement("w:p")
+            p_pr = OxmlElement("w:pPr")
+            p_pr.append(copy.deepcopy(sect_pr))
+            p.append(p_pr)
+            sect_pr.addprevious(p)
+        for child in list(src_body):
+            if child.tag == qn("w:sectPr"):
+                continue
+            new_child = copy.deepcopy(child)
+            _copy_relationships(new_child, src.part, base.part)
+            if sect_pr is not None:
+                sect_pr.addprevious(new_child)
+            else:
+                body.append(new_child)
+        # L'ultima sezione prende le impostazioni della parte appena aggiunta
+        src_sect = src_body.find(qn("w:sectPr"))
+        if src_sect is not None:
+            if sect_pr is not None:
+                body.replace(sect_pr, copy.deepcopy(src_sect))
+            else:
+                body.append(copy.deepcopy(src_sect))
+    base.save(output_docx)
+    return output_docx
@@ -0,0 +1,186 @@
+"""
+Estrazione del testo dai PDF nel processo corrente (PyPDF2), con `pdftotext`
+come ripiego quando la libreria non è disponibile.
+
+Le pagine vengono suddivise in blocchi estratti in parallelo da un pool di processi;
+ogni worker apre il PDF una sola volta. I blocchi sono scritti nel file di output
+nell'ordine delle pagine e solo pochi blocchi alla volta restano in memoria, quindi
+l'occupazione non cresce con la lunghezza del documento.
+
+Formati di output:
+- "text":  testo delle pagine separato da `separator` (default form feed, come pdftotext)
+- "jsonl": una riga JSON per pagina: {"page": n, "text": "..."}
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CHUNK_SIZE = 16
+
+# Documento aperto dal worker (uno per processo)
+_worker_reader = None
+
+
+def _init_worker(input_pdf):
+    global _worker_reader
+    from PyPDF2 import PdfReader
+    _worker_reader = PdfReader(input_pdf)
+    if _worker_reader.is_encrypted:
+        _worker_reader.decrypt("")
+
+
+def _extract_range(start, end):
+    """Testo delle pagine [start, end) del documento aperto dal worker."""
+    return [_worker_reader.pages[idx].extract_text() or "" for idx in range(start, end)]
+
+
+def has_pdf_library():
+    try:
+        import PyPDF2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _default_workers():
+    # Dentro un processo del batch (che già lavora in parallelo sui file) evitiamo
+    # di creare un secondo livello di processi
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+
+class _PageWriter:
+    """Scrive le pagine nel formato richiesto, una alla volta."""
+
+    def __init__(self, fp, fmt, separator):
+        if fmt not in ("text", "jsonl"):
+            raise ValueError(f"Formato di output non gestito: {fmt}")
+        self.fp = fp
+        self.fmt = fmt
+        self.separator = separator
+        self.count = 0
+
+    def write(self, text):
+        self.count += 1
+        if self.fmt == "jsonl":
+            self.fp.write(json.dumps({"page": self.count, "text": text}, ensure_ascii=False))
+            self.fp.write("\n")
+        else:
+            if self.count > 1:
+                self.fp.write(self.separator)
+            self.fp.write(text)
+
+
+def _iter_pages_pypdf2(input_pdf, max_workers, chunk_size, progress):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(input_pdf)
+    if reader.is_encrypted:
+        reader.decrypt("")
+    page_count = len(reader.pages)
+    if max_workers is None:
+        max_workers = _default_workers()
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    chunks = [(s, min(s + chunk_size, page_count)) for s in range(0, page_count, chunk_size)]
+    done = 0
+
+    if max_workers <= 1 or len(chunks) <= 1:
+        for idx in range(page_count):
+            yield reader.pages[idx].extract_text() or ""
+            done += 1
+            if progress:
+                progress(done, page_count)
+        return
+
+    del reader
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(input_pdf,)) as pool:
+        pending = deque()
+        next_chunk = 0
+        # Al massimo 2 blocchi per worker in volo: la memoria resta costante
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_workers * 2:
+                pending.append(pool.submit(_extract_range, *chunks[next_chunk]))
+                next_chunk += 1
+            for text in pending.popleft().result():
+                yield text
+                done += 1
+                if progress:
+                    progress(done, page_count)
+
+
+def _iter_pages_pdftotext(input_pdf, progress):
+    if shutil.which("pdftotext") is None:
+        raise RuntimeError("Errore conversione pdf->txt: né PyPDF2 né pdftotext sono disponibili.")
+    # stderr su file: una pipe letta solo alla fine si riempirebbe con molti avvisi
+    # e bloccherebbe pdftotext mentre aspettiamo stdout
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(["pdftotext", input_pdf, "-"], stdout=subprocess.PIPE,
+                               stderr=stderr, text=True, encoding="utf-8", errors="replace")
+    try:
+        buffer = ""
+        done = 0
+        pages = []
+        for block in iter(lambda: process.stdout.read(64 * 1024), ""):
+            buffer += block
+            *pages, buffer = buffer.split("\f")
+            for text in pages:
+                done += 1
+                if progress:
+                    progress(done, None)
+                yield text
+        if process.wait() != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"Errore conversione pdf->txt: {message}")
+        # pdftotext termina ogni pagina con \f: l'ultimo pezzo è vuoto
+        if buffer:
+            yield buffer
+    finally:
+        # Anche se chi legge si ferma prima della fine
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr.close()
+
+
+def iter_pdf_pages(input_pdf, engine="auto", max_workers=None, chunk_size=None, progress=None):
+    """
+    Generatore del testo delle pagine, in ordine.
+    engine: "auto" (PyPDF2 se disponibile, altrimenti pdftotext), "pypdf2" o "pdftotext".
+    progress(done, total): total è None con pdftotext (numero di pagine non noto).
+    """
+    if engine == "auto":
+        engine = "pypdf2" if has_pdf_library() else "pdftotext"
+    if engine == "pypdf2":
+        return _iter_pages_pypdf2(input_pdf, max_workers, chunk_size, progress)
+    if engine == "pdftotext":
+        return _iter_pages_pdftotext(input_pdf, progress)
+    raise ValueError(f"Motore di estrazione sconosciuto: {engine}")
+
+
+def extract_pdf_text(input_pdf, output_path, fmt="text", separator="\f", engine="auto",
+                     max_workers=None, chunk_size=None, progress=None):
+    """
+    Estrae il testo di input_pdf in output_path (vedi formati nel docstring del modulo).
+    Restituisce il numero di pagine scritte.
+    """
+    tmp_path = output_path + ".part"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            writer = _PageWriter(f, fmt, separator)
+            for text in iter_pdf_pages(input_pdf, engine, max_workers, chunk_size, progress):
+                writer.write(text)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return writer.count
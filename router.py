@@ -0,0 +1,257 @@
+"""
+Grafo delle conversioni: i formati sono i nodi, le funzioni di conversions.py gli
+archi. Per una coppia input/output si sceglie il percorso più economico
+(Dijkstra); i file intermedi vengono creati in una cartella temporanea che viene
+rimossa al termine.
+
+Il costo di un arco è una stima in secondi per MB di input, aggiornata con una media
+mobile esponenziale (EWMA) dopo ogni esecuzione reale e salvata su disco, così le
+stime migliorano tra un avvio e l'altro. Finché un arco non è stato misurato vale
+il costo iniziale indicato nel registro.
+
+Variabili d'ambiente:
+- DEVATRON_ROUTE_COSTS  file JSON con i costi misurati
+"""
+import atexit
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+IMAGE_INPUTS = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp", ".svg"]
+# Come nella versione senza grafo: ogni formato che Pillow sa scrivere dall'estensione
+IMAGE_OUTPUTS = [".jpg", ".jpeg", ".png", ".pdf", ".webp", ".gif", ".bmp", ".tif", ".tiff"]
+IMAGE_OPTIONS = ("width", "height", "dpi", "max_size", "max_memory",
+                 "quality", "target_size", "progressive", "webp_method")
+
+# Peso dell'ultima misura nella media mobile
+EWMA_ALPHA = 0.3
+# Dimensione minima considerata (MB): evita costi enormi per file minuscoli
+MIN_SIZE_MB = 0.1
+# Intervallo minimo tra due salvataggi dei costi (batch di molti file piccoli)
+SAVE_INTERVAL = 5.0
+
+
+def default_costs_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.environ.get("DEVATRON_ROUTE_COSTS") or os.path.join(base, "devatron_converter_routes.json")
+
+
+class Edge:
+    """
+    Conversione diretta src -> dst eseguita da conversions.<func_name>(input, output, **opzioni).
+    options sono i nomi delle opzioni accettate dalla funzione; un arco terminal
+    non viene proseguito da altri archi (ad es. il PDF ottenuto da un'immagine non
+    contiene testo da convertire in DOCX o TXT).
+    """
+
+    def __init__(self, src, dst, func_name, cost, options=(), terminal=False):
+        self.src = src
+        self.dst = dst
+        self.func_name = func_name
+        self.default_cost = cost
+        self.options = options
+        self.terminal = terminal
+
+    @property
+    def key(self):
+        return f"{self.src}->{self.dst}:{self.func_name}"
+
+    def run(self, in_path, out_path, options):
+        import conversions
+        func = getattr(conversions, self.func_name)
+        kwargs = {k: v for k, v in options.items() if k in self.options and v is not None}
+        return func(in_path, out_path, **kwargs)
+
+
+class ConversionGraph:
+    def __init__(self, costs_path=None):
+        self.costs_path = costs_path or default_costs_path()
+        self._edges = {}
+        self._lock = threading.Lock()
+        self._costs = self._load_costs()
+        self._updated = set()
+        self._last_save = 0.0
+
+    def add_edge(self, src, dst, func_name, cost, options=(), terminal=False):
+        self._edges.setdefault(src, []).append(Edge(src, dst, func_name, cost, options, terminal))
+
+    # -----------------------------------------------------
+    # Costi
+    # -----------------------------------------------------
+    def _load_costs(self):
+        try:
+            with open(self.costs_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def edge_cost(self, edge):
+        entry = self._costs.get(edge.key)
+        return entry["cost"] if entry else edge.default_cost
+
+    def record(self, edge, seconds, input_bytes):
+        """Aggiorna la stima dell'arco con la durata di un'esecuzione reale."""
+        sample = seconds / max(input_bytes / 1024 ** 2, MIN_SIZE_MB)
+        with self._lock:
+            entry = self._costs.get(edge.key)
+            if entry:
+                entry = {"cost": entry["cost"] + EWMA_ALPHA * (sample - entry["cost"]),
+                         "runs": entry["runs"] + 1}
+            else:
+                entry = {"cost": sample, "runs": 1}
+            self._costs[edge.key] = entry
+            self._updated.add(edge.key)
+            if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+                self._save_costs()
+
+    def flush(self):
+        """Salva le stime non ancora scritte su disco."""
+        with self._lock:
+            if self._updated:
+                self._save_costs()
+
+    def _save_costs(self):
+        # Rilegge il file: i processi del batch aggiornano gli stessi costi, le nostre
+        # stime più recenti prevalgono solo per gli archi misurati da questo processo
+        on_disk = self._load_costs()
+        on_disk.update({key: self._costs[key] for key in self._updated})
+        self._costs = on_disk
+        self._updated = set()
+        self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.costs_path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.costs_path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._costs, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.costs_path)
+        except OSError:
+            # Le stime sono un'ottimizzazione: un file non scrivibile non blocca la conversione
+            pass
+
+    # -----------------------------------------------------
+    # Percorsi
+    # -----------------------------------------------------
+    def _shortest_paths(self, src):
+        """Dijkstra da src: restituisce {formato: (costo, [archi])}."""
+        best = {src: (0.0, [])}
+        heap = [(0.0, 0, src)]
+        counter = 1
+        while heap:
+            cost, _, node = heapq.heappop(heap)
+            if cost > best[node][0]:
+                continue
+            path = best[node][1]
+            if path and path[-1].terminal:
+                continue
+            for edge in self._edges.get(node, []):
+                new_cost = cost + self.edge_cost(edge)
+                if edge.dst not in best or new_cost < best[edge.dst][0]:
+                    best[edge.dst] = (new_cost, path + [edge])
+                    heapq.heappush(heap, (new_cost, counter, edge.dst))
+                    counter += 1
+        return best
+
+    def plan(self, src, dst):
+        """Lista degli archi del percorso più economico da src a dst."""
+        src, dst = src.lower(), dst.lower()
+        if src == dst:
+            # Stesso formato: solo un arco diretto (ad es. ricodifica di un'immagine)
+            for edge in self._edges.get(src, []):
+                if edge.dst == dst:
+                    return [edge]
+        else:
+            found = self._shortest_paths(src).get(dst)
+            if found:
+                return found[1]
+        raise ValueError(f"Conversione da {src} a {dst} non supportata.")
+
+    def sources(self):
+        """Formati che hanno almeno una conversione in uscita."""
+        return list(self._edges)
+
+    def targets(self, src):
+        """
+        Formati di output raggiungibili da src: prima le conversioni dirette
+        (nell'ordine del registro), poi quelle in più passaggi dalla più economica.
+        """
+        src = src.lower()
+        ordered = []
+        for edge in self._edges.get(src, []):
+            if edge.dst not in ordered:
+                ordered.append(edge.dst)
+        reachable = self._shortest_paths(src)
+        for fmt, _ in sorted(reachable.items(), key=lambda item: item[1][0]):
+            if fmt != src and fmt not in ordered:
+                ordered.append(fmt)
+        return ordered
+
+    # -----------------------------------------------------
+    # Esecuzione
+    # -----------------------------------------------------
+    def run_edge(self, edge, in_path, out_path, options):
+        """Esegue un singolo arco aggiornandone il costo stimato."""
+        from cache import take_hit
+
+        size = os.path.getsize(in_path)
+        take_hit()
+        start = time.perf_counter()
+        edge.run(in_path, out_path, options)
+        # Una hit della cache non misura il costo reale della conversione
+        if not take_hit():
+            self.record(edge, time.perf_counter() - start, size)
+        return out_path
+
+    def convert(self, in_path, out_path, **options):
+        """
+        Converte in_path in out_path seguendo il percorso più economico. Gli
+        intermedi stanno in una cartella temporanea rimossa anche in caso di errore.
+        """
+        steps = self.plan(os.path.splitext(in_path)[1], os.path.splitext(out_path)[1])
+        tmp_dir = tempfile.mkdtemp(prefix="devatron_route_") if len(steps) > 1 else None
+        stem = os.path.splitext(os.path.basename(in_path))[0]
+        try:
+            current = in_path
+            for idx, edge in enumerate(steps):
+                last = idx == len(steps) - 1
+                target = out_path if last else os.path.join(tmp_dir, f"{idx}_{stem}{edge.dst}")
+                self.run_edge(edge, current, target, options)
+                current = target
+        finally:
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return out_path
+
+
+def build_default_graph(costs_path=None):
+    """Registro delle conversioni disponibili con i costi iniziali (s/MB)."""
+    graph = ConversionGraph(costs_path)
+    graph.add_edge(".docx", ".pdf", "convert_docx_to_pdf", 3.0)
+    graph.add_edge(".docx", ".pages", "docx_to_pages", 4.0)
+    graph.add_edge(".docx", ".txt", "convert_docx_to_txt", 0.2)
+    graph.add_edge(".pdf", ".docx", "convert_pdf_to_docx", 8.0)
+    graph.add_edge(".pdf", ".txt", "convert_pdf_to_txt", 0.5)
+    for src in IMAGE_INPUTS:
+        cost = 1.0 if src == ".svg" else 0.5
+        for dst in IMAGE_OUTPUTS:
+            # Ogni formato immagine ha un arco diretto: un passaggio intermedio (ad es.
+            # da GIF o JPEG) perderebbe colori o qualità, quindi gli archi sono terminali
+            graph.add_edge(src, dst, "convert_image", cost, options=IMAGE_OPTIONS, terminal=True)
+    return graph
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """Grafo condiviso dal processo corrente."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_default_graph()
+            atexit.register(_graph.flush)
+        return _graph
@@ -0,0 +1,80 @@
+import os
+import sys
+
+import pytest
+
+# I moduli del progetto sono nella cartella principale (niente pacchetto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    """Cache, costi del router e cronologia in una cartella temporanea per ogni test."""
+    monkeypatch.setenv("DEVATRON_CACHE", "0")
+    monkeypatch.setenv("DEVATRON_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("DEVATRON_ROUTE_COSTS", str(tmp_path / "routes.json"))
+    monkeypatch.setenv("DEVATRON_HISTORY_DB", str(tmp_path / "history.db"))
+    monkeypatch.chdir(tmp_path)
+    yield
+
+
+def write_inline_resources_pdf(path, pages=2):
+    """
+    PDF le cui pagine non hanno /Resources proprie: le ereditano dal nodo Pages,
+    dove sono un dizionario inline con un riferimento al font.
+    """
+    content = b"BT /F1 12 Tf 10 10 Td (Hi) Tj ET"
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + " ".join("%d 0 R" % (5 + i) for i in range(pages)).encode()
+        + b"] /Count %d /Resources << /Font << /F1 3 0 R >> >> >>" % pages,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+    ]
+    objs += [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 100 100] /Contents 4 0 R >>"] * pages
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f\r\n" % (len(objs) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n\r\n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return str(path)
+
+
+def write_numbered_pdf(path, pages):
+    """PDF di prova con pages pagine: la pagina n contiene il testo "Pn"."""
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for n in range(1, pages + 1):
+        content = b"BT /F1 12 Tf 10 10 Td (P%d) Tj ET" % n
+        objs.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objs.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 100 100] /Contents %d 0 R "
+                    b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objs))
+        kids.append(b"%d 0 R" % len(objs))
+    objs[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f\r\n" % (len(objs) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n\r\n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return str(path)
+
+
+def page_labels(path):
+    """Testo di ogni pagina di un PDF creato con write_numbered_pdf."""
+    from PyPDF2 import PdfReader
+    return [page.extract_text().strip() for page in PdfReader(path).pages]
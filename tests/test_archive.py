@@ -0,0 +1,159 @@
+import json
+import os
+import random
+import warnings
+import zipfile
+
+import pytest
+
+from archive import (compress_folder, compress_folder_incremental, extract_zip, manifest_path_for,
+                     walk_folder)
+
+
+def _tree(root):
+    rnd = random.Random(1)
+    files = {
+        "a.txt": b"testo ripetuto " * 50000,
+        "sub/b.bin": bytes(rnd.getrandbits(8) for _ in range(300000)),
+        "sub/deep/c.jpg": b"\xff\xd8" + b"j" * 1000,
+        "vuoto.txt": b"",
+    }
+    for name, data in files.items():
+        path = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    os.makedirs(os.path.join(root, "cartella_vuota"))
+    return files
+
+
+def test_parallel_zip_matches_the_folder(tmp_path):
+    files = _tree(str(tmp_path / "src"))
+    out = str(tmp_path / "out.zip")
+    calls = []
+
+    compress_folder(str(tmp_path / "src"), out, max_workers=4, progress=lambda d, t: calls.append((d, t)))
+
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in files} == files
+        assert "cartella_vuota/" in zf.namelist()
+        assert zf.getinfo("sub/deep/c.jpg").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo("a.txt").compress_size < 10000
+    total = sum(len(data) for data in files.values())
+    assert calls[-1] == (total, total)
+    assert [d for d, _ in calls] == sorted(d for d, _ in calls)
+    assert not os.path.exists(out + ".part")
+
+
+def test_small_chunks_form_one_valid_stream(tmp_path):
+    from archive import create_zip
+
+    files = _tree(str(tmp_path / "src"))
+    out = str(tmp_path / "out.zip")
+
+    create_zip(walk_folder(str(tmp_path / "src")), out, level=9, max_workers=3, chunk_size=40000)
+
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert zf.read("a.txt") == files["a.txt"]
+        assert zf.read("sub/b.bin") == files["sub/b.bin"]
+
+
+def test_incremental_reuses_unchanged_entries(tmp_path):
+    src = tmp_path / "src"
+    files = _tree(str(src))
+    out = str(tmp_path / "out.zip")
+
+    _, reused = compress_folder_incremental(str(src), out, max_workers=2)
+    assert reused == 0
+    with open(manifest_path_for(out), encoding="utf-8") as f:
+        assert set(json.load(f)["entries"]) == set(files)
+
+    (src / "a.txt").write_bytes(b"nuovo contenuto")
+    (src / "nuovo.txt").write_text("aggiunto")
+    # Solo l'mtime cambia: lo SHA-256 conferma che la voce è invariata
+    os.utime(src / "sub" / "b.bin", ns=(1, 1))
+    _, reused = compress_folder_incremental(str(src), out, max_workers=2)
+
+    assert reused == 3
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert zf.read("a.txt") == b"nuovo contenuto"
+        assert zf.read("nuovo.txt") == b"aggiunto"
+        assert zf.read("sub/b.bin") == files["sub/b.bin"]
+
+
+def test_incremental_ignores_a_foreign_archive(tmp_path):
+    src = tmp_path / "src"
+    files = _tree(str(src))
+    out = str(tmp_path / "out.zip")
+    compress_folder_incremental(str(src), out)
+    # L'archivio viene sostituito da un altro programma: il manifest non vale più
+    with zipfile.ZipFile(out, "w") as zf:
+        zf.writestr("a.txt", b"diverso")
+
+    _, reused = compress_folder_incremental(str(src), out)
+
+    assert reused == 0
+    with zipfile.ZipFile(out) as zf:
+        assert zf.read("a.txt") == files["a.txt"]
+
+
+def _zip(path, items):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # nomi duplicati
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in items:
+                zf.writestr(name, data)
+    return str(path)
+
+
+def test_extract_filters_and_skips_existing(tmp_path):
+    src = _zip(tmp_path / "in.zip", [("a.txt", b"a" * 5000), ("doc/b.md", b"bb"),
+                                     ("doc/c.log", b"ccc"), ("img/d.png", b"dddd")])
+    out = tmp_path / "out"
+    calls = []
+
+    stats = extract_zip(src, str(out), include=["*.txt", "doc/*"], exclude=["*.log"], max_workers=2,
+                        progress=lambda d, t: calls.append((d, t)))
+
+    assert stats == {"extracted": 2, "skipped": 0, "bytes": 5002}
+    assert sorted(str(p.relative_to(out)) for p in out.rglob("*") if p.is_file()) == \
+        ["a.txt", os.path.join("doc", "b.md")]
+    assert calls[-1] == (5002, 5002)
+    assert [d for d, _ in calls] == sorted(d for d, _ in calls)
+
+    (out / "doc" / "b.md").write_bytes(b"xy")
+    stats = extract_zip(src, str(out), include=["*.txt", "doc/*"], exclude=["*.log"])
+    assert (stats["extracted"], stats["skipped"]) == (1, 1)
+    assert (out / "doc" / "b.md").read_bytes() == b"bb"
+
+
+def test_extract_keeps_the_last_duplicate(tmp_path):
+    src = _zip(tmp_path / "in.zip", [("x.txt", b"primo"), ("x.txt", b"secondo"), ("y.txt", b"y")])
+    out = tmp_path / "out"
+
+    stats = extract_zip(src, str(out), max_workers=4)
+
+    assert stats["extracted"] == 2
+    assert (out / "x.txt").read_bytes() == b"secondo"
+
+
+def test_extract_stays_inside_the_output_folder(tmp_path):
+    src = _zip(tmp_path / "in.zip", [("../fuori.txt", b"f"), ("/assoluto.txt", b"a")])
+    out = tmp_path / "out"
+
+    extract_zip(src, str(out))
+
+    assert sorted(os.listdir(out)) == ["assoluto.txt", "fuori.txt"]
+    assert not (tmp_path / "fuori.txt").exists()
+
+
+def test_extract_rejects_a_corrupt_archive(tmp_path):
+    bad = tmp_path / "bad.zip"
+    bad.write_bytes(b"non uno zip")
+
+    with pytest.raises(zipfile.BadZipFile):
+        extract_zip(str(bad), str(tmp_path / "out"))
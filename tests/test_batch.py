@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from batch import build_jobs, run_batch
+
+
+def _inputs(tmp_path):
+    paths = []
+    for i, colour in enumerate(["red", "green", "blue"]):
+        path = str(tmp_path / f"img{i}.png")
+        Image.new("RGB", (40, 30), colour).save(path)
+        paths.append(path)
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"not an image")
+    paths.insert(1, str(bad))
+    return paths
+
+
+def test_build_jobs_replaces_extension():
+    assert build_jobs(["/a/x.png", "/b/y.tar.gz"], ".jpg") == [("/a/x.png", "/a/x.jpg"), ("/b/y.tar.gz", "/b/y.tar.jpg")]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_in_job_order_with_per_file_errors(tmp_path, workers):
+    jobs = build_jobs(_inputs(tmp_path), ".jpg")
+
+    results = run_batch(jobs, max_workers=workers)
+
+    assert [(r["input"], r["output"]) for r in results] == jobs
+    assert [r["ok"] for r in results] == [True, False, True, True]
+    assert results[1]["error"]
+    assert all(r["error"] is None for r in results if r["ok"])
+    for in_path, out_path in jobs[:1] + jobs[2:]:
+        with Image.open(out_path) as im:
+            assert im.format == "JPEG" and im.size == (40, 30)
+    assert not os.path.exists(jobs[1][1])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_on_result_called_once_per_file(tmp_path, workers):
+    jobs = build_jobs(_inputs(tmp_path), ".jpg")
+    calls = []
+
+    results = run_batch(jobs, max_workers=workers, on_result=lambda r, done, total: calls.append((r, done, total)))
+
+    assert [done for _, done, _ in calls] == [1, 2, 3, 4]
+    assert {total for _, _, total in calls} == {4}
+    assert sorted(r["input"] for r, _, _ in calls) == sorted(r["input"] for r in results)
+
+
+def test_options_reach_the_conversion(tmp_path):
+    src = str(tmp_path / "big.png")
+    Image.new("RGB", (400, 200), "red").save(src)
+
+    [result] = run_batch([(src, str(tmp_path / "big.jpg"))], max_workers=1, options={"max_size": 100})
+
+    assert result["ok"]
+    with Image.open(result["output"]) as im:
+        assert im.size == (100, 50)
+
+
+def test_empty_batch():
+    assert run_batch([]) == []
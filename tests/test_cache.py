@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+import cache
+from cache import ConversionCache, cached
+
+
+@pytest.fixture
+def enabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("DEVATRON_CACHE", "1")
+    monkeypatch.setattr(cache, "_default_cache", None)
+    return cache.get_cache()
+
+
+def _write(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_cached_function_runs_once_per_content(tmp_path, enabled):
+    calls = []
+
+    @cached(default_ext=".out", ignore=("workers",))
+    def convert_upper(input_path, output_path=None, suffix="", workers=1):
+        calls.append(input_path)
+        with open(input_path) as src, open(output_path, "w") as dst:
+            dst.write(src.read().upper() + suffix)
+        return output_path
+
+    a = _write(tmp_path / "a.txt", "ciao")
+    b = _write(tmp_path / "b.txt", "ciao")
+
+    assert convert_upper(a) == str(tmp_path / "a.out")
+    # Stesso contenuto e opzioni che non cambiano l'output: hit
+    convert_upper(b, str(tmp_path / "b.out"), workers=8)
+    assert len(calls) == 1
+    assert open(tmp_path / "b.out").read() == "CIAO"
+
+    convert_upper(b, str(tmp_path / "c.out"), suffix="!")
+    convert_upper(b, str(tmp_path / "d.out"), use_cache=False)
+    assert len(calls) == 3
+    stats = enabled.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_disabled_cache_is_bypassed(tmp_path):
+    calls = []
+
+    @cached(default_ext=".out")
+    def convert_copy(input_path, output_path=None):
+        calls.append(input_path)
+        _write(output_path, "x")
+        return output_path
+
+    src = _write(tmp_path / "a.txt", "a")
+    convert_copy(src, str(tmp_path / "a.out"))
+    convert_copy(src, str(tmp_path / "a.out"))
+    assert len(calls) == 2
+
+
+def test_evicts_least_recently_used(tmp_path):
+    store = ConversionCache(cache_dir=str(tmp_path / "c"), max_bytes=250)
+    keys = []
+    for i in range(3):
+        out = _write(tmp_path / f"out{i}.txt", str(i) * 100)
+        key = store.make_key("op", [out], ".txt")
+        store.store(key, out)
+        entry = store._entry_path(key, ".txt")
+        os.utime(entry, (1000 + i, 1000 + i))
+        keys.append(key)
+        if i == 1:
+            # La prima voce viene riusata: è la seconda a uscire
+            assert store.fetch(keys[0], str(tmp_path / "again.txt"))
+
+    assert store.fetch(keys[0], str(tmp_path / "x.txt"))
+    assert not store.fetch(keys[1], str(tmp_path / "y.txt"))
+    assert store.fetch(keys[2], str(tmp_path / "z.txt"))
+    assert store.stats()["bytes"] <= 250
+
+
+def test_link_mode_keeps_output_mtime(tmp_path):
+    store = ConversionCache(cache_dir=str(tmp_path / "c"), link=True)
+    out = _write(tmp_path / "out.txt", "data")
+    key = store.make_key("op", [out], ".txt")
+    store.store(key, out)
+    assert store.fetch(key, str(tmp_path / "first.txt"))
+    os.utime(tmp_path / "first.txt", (1000, 1000))
+
+    assert store.fetch(key, str(tmp_path / "second.txt"))
+
+    assert os.stat(tmp_path / "first.txt").st_mtime == 1000
+    assert store.stats()["entries"] == 1
+
+
+def test_stats_log_is_rotated(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "STATS_LOG_MAX", 10)
+    monkeypatch.setattr(cache, "_STATS_SETTLE", 0)
+    store = ConversionCache(cache_dir=str(tmp_path / "c"))
+
+    for i in range(95):
+        store._record(b"h" if i % 5 else b"m")
+
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (76, 19, 0)
+    assert sum(os.path.getsize(os.path.join(store.cache_dir, name))
+               for name in os.listdir(store.cache_dir) if name.startswith("stats.log")) <= 20
+    store.clear()
+    assert store.stats()["hits"] == 0
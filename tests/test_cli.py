@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from cli import expand_inputs, main, output_path_for
+
+
+def _touch(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_expand_inputs_globs_and_folders(tmp_path):
+    root = str(tmp_path)
+    a = _touch(os.path.join(root, "docs", "a.pdf"))
+    b = _touch(os.path.join(root, "docs", "sub", "b.pdf"))
+    c = _touch(os.path.join(root, "c.pdf"))
+
+    assert expand_inputs([os.path.join(root, "docs")]) == [(a, os.path.join(root, "docs"))]
+    assert expand_inputs([os.path.join(root, "docs")], recursive=True) == [
+        (a, os.path.join(root, "docs")), (b, os.path.join(root, "docs"))]
+    assert expand_inputs([os.path.join(root, "*.pdf"), c]) == [(c, root)]
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([os.path.join(root, "missing.pdf")])
+
+
+def test_output_path_keeps_relative_layout():
+    assert output_path_for("/in/a/b.pdf", "/in", ".txt") == "/in/a/b.txt"
+    assert output_path_for("/in/a/b.pdf", "/in", ".txt", "/out") == os.path.join("/out", "a", "b.txt")
+
+
+def test_convert_reports_errors_in_exit_code(tmp_path, capsys):
+    Image = pytest.importorskip("PIL.Image")
+    good = str(tmp_path / "good.png")
+    Image.new("RGB", (20, 20), "red").save(good)
+    _touch(str(tmp_path / "bad.png"), b"not an image")
+
+    assert main(["convert", good, "--to", "jpg", "-o", str(tmp_path / "out"), "-q"]) == 0
+    assert os.path.exists(tmp_path / "out" / "good.jpg")
+
+    assert main(["convert", str(tmp_path / "*.png"), "--to", ".jpg", "-j", "1", "-q"]) == 1
+    assert "ERRORE" in capsys.readouterr().err
+    assert os.path.exists(tmp_path / "good.jpg")
+
+
+def test_missing_input_is_an_error(tmp_path, capsys):
+    assert main(["convert", str(tmp_path / "nope.pdf"), "--to", ".txt"]) == 1
+    assert "Errore" in capsys.readouterr().err
@@ -0,0 +1,98 @@
+import io
+import random
+import zipfile
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from images import encode_to_size, save_image
+
+
+@pytest.fixture(scope="module")
+def noisy():
+    # Rumore: la dimensione del file dipende molto dalla qualità
+    rnd = random.Random(0)
+    return Image.frombytes("RGB", (256, 256), bytes(rnd.getrandbits(8) for _ in range(256 * 256 * 3)))
+
+
+@pytest.mark.parametrize("ext", [".jpg", ".webp"])
+def test_highest_quality_within_budget(noisy, ext):
+    data, quality = encode_to_size(noisy, ext, 60 * 1024)
+
+    assert len(data) <= 60 * 1024
+    assert quality < 95
+    # La qualità successiva non starebbe nel limite
+    above = io.BytesIO()
+    noisy.save(above, "JPEG" if ext == ".jpg" else "WEBP", quality=quality + 1)
+    assert len(above.getvalue()) > 60 * 1024
+    with Image.open(io.BytesIO(data)) as im:
+        assert im.size == (256, 256)
+
+
+def test_impossible_budget_and_unsupported_format(noisy):
+    with pytest.raises(ValueError, match="max_size"):
+        encode_to_size(noisy, ".jpg", 500)
+    with pytest.raises(ValueError):
+        encode_to_size(noisy, ".png", 60 * 1024)
+
+
+def test_progressive_jpeg(noisy, tmp_path):
+    out = str(tmp_path / "p.jpg")
+
+    save_image(noisy, out, target_size=80 * 1024, progressive=True)
+
+    with Image.open(out) as im:
+        assert im.info.get("progressive")
+    assert (tmp_path / "p.jpg").stat().st_size <= 80 * 1024
+
+
+def test_target_size_ignored_for_lossless_outputs(noisy, tmp_path):
+    out = str(tmp_path / "n.png")
+
+    save_image(noisy, out, target_size=1024)
+
+    with Image.open(out) as im:
+        assert im.format == "PNG"
+
+
+@pytest.mark.parametrize("ext", [".png", ".pdf", ".webp"])
+def test_zip_members_with_target_size(noisy, tmp_path, ext):
+    from zip_pipeline import convert_zip
+
+    buf = io.BytesIO()
+    noisy.save(buf, "BMP")
+    src = tmp_path / "in.zip"
+    with zipfile.ZipFile(src, "w") as zf:
+        zf.writestr("n.bmp", buf.getvalue())
+    out = str(tmp_path / "out.zip")
+
+    results = convert_zip(str(src), out, {".bmp": ext}, max_workers=1, options={"target_size": 60 * 1024})
+
+    assert results[0]["ok"], results[0]["error"]
+    with zipfile.ZipFile(out) as zf:
+        data = zf.read("n" + ext)
+    if ext == ".webp":
+        assert len(data) <= 60 * 1024
+
+
+def test_cli_zip_convert_passes_image_options(noisy, tmp_path):
+    from cli import main
+
+    buf = io.BytesIO()
+    noisy.save(buf, "PNG")
+    src = tmp_path / "in.zip"
+    with zipfile.ZipFile(src, "w") as zf:
+        zf.writestr("n.png", buf.getvalue())
+    out = str(tmp_path / "out.zip")
+
+    assert main(["zip-convert", str(src), "--to", ".jpg", "-o", out, "-j", "1", "-q",
+                 "--max-size", "100", "--target-size", "8"]) == 0
+
+    with zipfile.ZipFile(out) as zf:
+        data = zf.read("n.jpg")
+    assert len(data) <= 8 * 1024
+    with Image.open(io.BytesIO(data)) as im:
+        assert im.size == (100, 100)
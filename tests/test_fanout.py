@@ -0,0 +1,77 @@
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from cli import main
+from fanout import convert_to_many, run_fan_out
+
+
+def _png(path, size=(60, 40)):
+    Image.new("RGB", size, (10, 200, 30)).save(path)
+    return str(path)
+
+
+def test_one_decode_for_all_outputs(tmp_path, monkeypatch):
+    import images
+
+    src = _png(tmp_path / "a.png")
+    opened = []
+    original = images.open_image
+    monkeypatch.setattr(images, "open_image", lambda *a, **k: opened.append(a[0]) or original(*a, **k))
+    outputs = [str(tmp_path / f"a{ext}") for ext in (".jpg", ".webp", ".pdf", ".tiff")]
+    calls = []
+
+    results = convert_to_many(src, outputs, max_workers=3, options={"max_size": 30},
+                              on_result=lambda r, done, total: calls.append((done, total)))
+
+    assert opened == [src]
+    assert [r["output"] for r in results] == outputs and all(r["ok"] for r in results)
+    assert sorted(calls) == [(n, 4) for n in range(1, 5)]
+    with Image.open(outputs[1]) as im:
+        assert im.format == "WEBP" and im.size == (30, 20)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_corrupt_input_gives_an_error_per_output(tmp_path, workers):
+    good = _png(tmp_path / "good.png")
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"not an image")
+    items = [(str(bad), [str(tmp_path / "bad.jpg"), str(tmp_path / "bad.webp")]),
+             (good, [str(tmp_path / "good.jpg"), str(tmp_path / "good.webp")])]
+    calls = []
+
+    results = run_fan_out(items, max_workers=workers, on_result=lambda r, d, t: calls.append((d, t)))
+
+    assert [(r["output"], r["ok"]) for r in results] == [
+        (str(tmp_path / "bad.jpg"), False), (str(tmp_path / "bad.webp"), False),
+        (str(tmp_path / "good.jpg"), True), (str(tmp_path / "good.webp"), True)]
+    assert "UnidentifiedImageError" in results[0]["error"]
+    assert sorted(calls) == [(n, 4) for n in range(1, 5)]
+
+
+def test_cli_fan_out_continues_after_a_corrupt_input(tmp_path, capsys):
+    good = _png(tmp_path / "good.png")
+    (tmp_path / "bad.png").write_bytes(b"not an image")
+
+    assert main(["convert", good, str(tmp_path / "bad.png"), "--to", ".jpg,.webp", "-j", "1", "-q"]) == 1
+
+    assert os.path.exists(tmp_path / "good.jpg") and os.path.exists(tmp_path / "good.webp")
+    err = capsys.readouterr().err
+    assert err.count("ERRORE") == 2 and "Errore:" not in err
+
+
+def test_zip_convert_rejects_lists_and_unknown_targets(tmp_path, capsys):
+    src = tmp_path / "in.zip"
+    with zipfile.ZipFile(src, "w") as zf:
+        zf.writestr("a.txt", "x")
+
+    assert main(["zip-convert", str(src), "--to", ".png,.webp"]) == 1
+    assert "un solo formato" in capsys.readouterr().err
+    assert main(["zip-convert", str(src), "--to", ".xyz"]) == 1
+    assert "non supportato" in capsys.readouterr().err
+    assert not os.path.exists(tmp_path / "in_xyz.zip")
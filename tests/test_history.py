@@ -0,0 +1,103 @@
+import time
+
+import history
+from history import (HistoryWriter, compact_history, iter_history, log_conversion, maintain_history,
+                     maintenance_configured, query_history)
+
+
+def _log_many(username, count, start=0):
+    writer = HistoryWriter(flush_interval=0.01)
+    for i in range(start, start + count):
+        writer.log(username, f"/in/{i}.png", f"/out/{i}.jpg", timestamp=f"2024-01-01 10:00:{i % 60:02d}")
+    assert writer.close(timeout=10) == []
+
+
+def test_next_page_after_deleted_anchor():
+    _log_many("anna", 10)
+    first = query_history("anna", limit=4)
+    history._connection().execute("DELETE FROM conversions WHERE id = ?", (first[-1]["id"],))
+
+    second = query_history("anna", before=first[-1], limit=4)
+
+    assert [r["input"] for r in second] == ["/in/5.png", "/in/4.png", "/in/3.png", "/in/2.png"]
+
+
+def test_iter_history_reads_every_record_once():
+    _log_many("anna", 25)
+    records = list(iter_history("anna", page_size=7))
+    assert len(records) == 25
+    assert len({r["id"] for r in records}) == 25
+
+
+def test_writer_flush_makes_records_visible():
+    writer = HistoryWriter(flush_interval=60)
+    writer.log("anna", "/a.png", "/a.jpg")
+    writer.log("anna", "/b.png", "/b.jpg")
+    assert writer.flush(timeout=5)
+
+    assert [r["input"] for r in query_history("anna")] == ["/b.png", "/a.png"]
+    assert writer.close(timeout=5) == []
+
+
+def test_writer_close_writes_pending_records():
+    writer = HistoryWriter(flush_interval=60, flush_size=1000)
+    for i in range(50):
+        writer.log("anna", f"/{i}.png", f"/{i}.jpg")
+    assert writer.close(timeout=5) == []
+
+    assert len(query_history("anna", limit=None)) == 50
+
+
+def test_writer_gives_up_on_unreachable_database(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("DEVATRON_HISTORY_DB", str(tmp_path / "missing" / "history.db"))
+    writer = HistoryWriter(flush_interval=0.01, max_attempts=2)
+    writer.log("anna", "/a.png", "/a.jpg")
+
+    start = time.monotonic()
+    unsaved = writer.close(timeout=10)
+
+    assert time.monotonic() - start < 5
+    assert [row[3] for row in unsaved] == ["/a.png"]
+    assert "non salvate" in capsys.readouterr().out
+    assert writer.flush(timeout=1)
+
+
+def test_log_conversion_visible_to_readers():
+    log_conversion("anna", "/x.docx", "/x.pdf")
+    assert query_history("anna")[0]["output"] == "/x.pdf"
+
+
+def test_compact_merges_repeated_conversions():
+    writer = HistoryWriter(flush_interval=0.01)
+    for second in range(3):
+        writer.log("anna", "/a.png", "/a.jpg", timestamp=f"2024-01-01 10:00:0{second}")
+    writer.log("anna", "/b.png", "/b.jpg", timestamp="2024-01-01 11:00:00")
+    writer.log("bruno", "/a.png", "/a.jpg", timestamp="2024-01-01 12:00:00")
+    assert writer.close(timeout=5) == []
+
+    assert compact_history() == 2
+
+    records = {r["input"]: r for r in query_history("anna")}
+    assert records["/a.png"]["count"] == 3
+    assert records["/a.png"]["timestamp"] == "2024-01-01 10:00:02"
+    assert records["/a.png"]["first_seen"] == "2024-01-01 10:00:00"
+    assert records["/b.png"]["count"] == 1
+    assert query_history("bruno")[0]["count"] == 1
+
+
+def test_maintenance_compacts_only_when_enabled(monkeypatch):
+    writer = HistoryWriter(flush_interval=0.01)
+    for second in range(3):
+        writer.log("anna", "/a.png", "/a.jpg", timestamp=f"2024-01-01 10:00:0{second}")
+    assert writer.close(timeout=5) == []
+    for name in ("DEVATRON_HISTORY_COMPACT", "DEVATRON_HISTORY_MAX_DAYS", "DEVATRON_HISTORY_MAX_ENTRIES"):
+        monkeypatch.delenv(name, raising=False)
+
+    assert not maintenance_configured()
+    assert maintain_history("anna") == {"compacted": 0, "archived": 0}
+    assert len(query_history("anna")) == 3
+
+    monkeypatch.setenv("DEVATRON_HISTORY_COMPACT", "1")
+    assert maintenance_configured()
+    assert maintain_history("anna")["compacted"] == 2
+    assert query_history("anna")[0]["count"] == 3
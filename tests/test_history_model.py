@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("PyQt5")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QCoreApplication
+
+import history_model
+from history import HistoryWriter
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def model(app, monkeypatch):
+    monkeypatch.setattr(history_model, "HISTORY_PAGE_SIZE", 5)
+    model = history_model.HistoryListModel("anna")
+    yield model
+    model.shutdown()
+
+
+def _log(first, last):
+    writer = HistoryWriter(flush_interval=0.01)
+    for i in range(first, last):
+        writer.log("anna", f"/in/{i}.png", f"/out/{i}.jpg", timestamp=f"2024-01-01 10:{i:02d}:00")
+    assert writer.close(timeout=5) == []
+
+
+def _wait(app, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timeout in attesa del modello"
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def _inputs(model):
+    return [r["input"] for r in model.records]
+
+
+def test_pages_are_loaded_on_demand(app, model):
+    _log(0, 12)
+    model.reload()
+    _wait(app, lambda: not model.loading)
+    assert _inputs(model) == [f"/in/{i}.png" for i in range(11, 6, -1)]
+
+    while model.canFetchMore():
+        model.fetchMore()
+        _wait(app, lambda: not model.loading)
+
+    assert model.rowCount() == 12
+    assert len({r["id"] for r in model.records}) == 12
+    assert model.exhausted
+
+
+def test_double_refresh_does_not_duplicate_rows(app, model):
+    _log(0, 3)
+    model.reload()
+    _wait(app, lambda: not model.loading)
+
+    _log(3, 5)
+    model.refresh()
+    model.refresh()
+    _wait(app, lambda: not model.refreshing)
+    model.refresh()
+    _wait(app, lambda: not model.refreshing)
+
+    assert _inputs(model) == [f"/in/{i}.png" for i in range(4, -1, -1)]
+
+
+def test_load_failure_is_reported(app, model, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(history_model, "query_history_snapshot", broken)
+    errors = []
+    model.loadFailed.connect(errors.append)
+
+    model.reload()
+    _wait(app, lambda: not model.loading)
+    _wait(app, lambda: errors)
+
+    assert errors == ["database is locked"]
+    assert model.rowCount() == 0
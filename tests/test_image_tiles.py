@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image, ImageStat
+
+from image_tiles import convert_tiled
+
+BUDGET = 2 * 1024 ** 2
+
+
+def _palette_png(path, transparency=None):
+    im = Image.new("P", (3000, 2000), 1)
+    im.putpalette([0, 0, 0, 200, 50, 30] + [0] * 762)
+    if transparency is None:
+        im.save(path)
+    else:
+        im.save(path, transparency=transparency)
+    return str(path)
+
+
+def test_palette_png_reduced_in_strips_keeps_colours(tmp_path):
+    src = _palette_png(tmp_path / "pal.png")
+    out = str(tmp_path / "small.jpg")
+
+    convert_tiled(src, out, max_memory=BUDGET, max_size=500)
+
+    with Image.open(out) as im:
+        assert im.size == (500, 334)
+        mean = ImageStat.Stat(im).mean
+    assert abs(mean[0] - 200) < 3 and abs(mean[1] - 50) < 3 and abs(mean[2] - 30) < 3
+
+
+def test_palette_png_with_transparency_becomes_rgba(tmp_path):
+    src = _palette_png(tmp_path / "pal.png", transparency=0)
+    out = str(tmp_path / "small.png")
+
+    convert_tiled(src, out, max_memory=BUDGET, max_size=500)
+
+    with Image.open(out) as im:
+        assert im.mode == "RGBA"
+        assert im.getpixel((10, 10)) == (200, 50, 30, 255)
+
+
+def test_palette_png_streamed_to_tiff(tmp_path):
+    from conversions import convert_file
+
+    src = _palette_png(tmp_path / "pal.png")
+    out = str(tmp_path / "big.tiff")
+
+    convert_file(src, out, max_memory=BUDGET)
+
+    with Image.open(out) as im:
+        assert im.size == (3000, 2000)
+        assert im.getpixel((10, 10))[:3] == (200, 50, 30)
+
+
+def test_jpeg_over_budget_is_decoded_normally(tmp_path):
+    from images import convert_raster
+
+    src = tmp_path / "big.jpg"
+    Image.new("RGB", (1200, 900), (0, 0, 255)).save(src)
+    out = str(tmp_path / "big.png")
+
+    convert_raster(str(src), out, max_memory=64 * 1024)
+
+    with Image.open(out) as im:
+        assert im.size == (1200, 900)
+        assert im.getpixel((600, 450))[2] > 240
+
+
+def test_full_decode_fallback_keeps_pillow_limit(tmp_path, monkeypatch):
+    from images import convert_raster
+
+    src = tmp_path / "big.jpg"
+    Image.new("RGB", (1200, 900)).save(src)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100_000)
+
+    with pytest.raises(Image.DecompressionBombError):
+        convert_raster(str(src), str(tmp_path / "big.png"), max_memory=64 * 1024)
+    assert not (tmp_path / "big.png").exists()
@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image, JpegImagePlugin
+
+from images import is_raster_job, open_image, run_image_batch
+
+
+def _jpeg(path, size, orientation=None):
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, "blue").save(path, "JPEG", exif=exif.tobytes())
+    return str(path)
+
+
+def test_open_image_reduces_without_full_decode(tmp_path, monkeypatch):
+    src = _jpeg(tmp_path / "big.jpg", (2000, 1000))
+    drafts = []
+    original = JpegImagePlugin.JpegImageFile.draft
+
+    def draft(self, mode, size):
+        drafts.append(size)
+        return original(self, mode, size)
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", draft)
+    im = open_image(src, max_size=300)
+
+    assert im.size == (300, 150)
+    assert drafts  # il JPEG viene scalato già in decodifica
+    im.close()
+    with open_image(src) as full:
+        assert full.size == (2000, 1000)
+
+
+def test_open_image_applies_exif_orientation(tmp_path):
+    src = _jpeg(tmp_path / "r.jpg", (200, 100), orientation=6)
+
+    with open_image(src, max_size=50) as im:
+        assert im.size == (25, 50)
+
+
+def test_run_image_batch_keeps_job_order_and_reports_errors(tmp_path):
+    jobs = []
+    for i in range(5):
+        src = _jpeg(tmp_path / f"{i}.jpg", (40 + i, 30))
+        jobs.append((src, str(tmp_path / f"{i}.png")))
+    bad = tmp_path / "bad.jpg"
+    bad.write_bytes(b"not an image")
+    jobs.insert(2, (str(bad), str(tmp_path / "bad.png")))
+    calls = []
+
+    results = run_image_batch(jobs, max_size=20, max_workers=3,
+                              on_result=lambda r, done, total: calls.append((done, total)))
+
+    assert [r["input"] for r in results] == [src for src, _ in jobs]
+    assert [r["ok"] for r in results] == [True, True, False, True, True, True]
+    assert results[2]["error"]
+    assert sorted(calls) == [(n, 6) for n in range(1, 7)]
+    with Image.open(jobs[0][1]) as im:
+        assert im.format == "PNG" and im.size == (20, 15)
+
+
+def test_is_raster_job():
+    assert is_raster_job("a.JPG", "b.webp")
+    assert is_raster_job("a.png", "b.pdf")
+    assert not is_raster_job("a.svg", "b.png")
+    assert not is_raster_job("a.png", "b.docx")
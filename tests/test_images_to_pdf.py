@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("PIL")
+PyPDF2 = pytest.importorskip("PyPDF2")
+
+from PIL import Image
+
+from conversions import images_to_pdf
+
+
+def _jpeg(path, size, orientation=None):
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, "green").save(path, "JPEG", exif=exif.tobytes())
+    return str(path)
+
+
+def test_one_page_per_image_and_frame(tmp_path):
+    jpg = _jpeg(tmp_path / "a.jpg", (144, 72))
+    png = tmp_path / "b.png"
+    Image.new("RGBA", (72, 72), (255, 0, 0, 128)).save(png)
+    tiff = tmp_path / "c.tiff"
+    frames = [Image.new("L", (72, 144), n * 60) for n in range(3)]
+    frames[0].save(tiff, save_all=True, append_images=frames[1:])
+    out = str(tmp_path / "out.pdf")
+    calls = []
+
+    images_to_pdf([jpg, str(png), str(tiff)], out, dpi=72, progress=lambda d, t, p: calls.append((d, t)))
+
+    reader = PyPDF2.PdfReader(out)
+    sizes = [(float(p.mediabox.width), float(p.mediabox.height)) for p in reader.pages]
+    assert sizes == [(144, 72), (72, 72)] + [(72, 144)] * 3
+    assert calls == [(1, 3), (2, 3), (3, 3)]
+    assert not (tmp_path / "out.pdf.part").exists()
+
+
+def test_jpeg_is_embedded_without_reencoding(tmp_path):
+    jpg = _jpeg(tmp_path / "a.jpg", (100, 50), orientation=6)
+    out = str(tmp_path / "out.pdf")
+
+    images_to_pdf([jpg], out)
+
+    with open(jpg, "rb") as f:
+        assert f.read() in open(out, "rb").read()
+    page = PyPDF2.PdfReader(out).pages[0]
+    # L'orientamento EXIF viene applicato alla pagina, non ai pixel
+    assert (float(page.mediabox.width), float(page.mediabox.height)) == (50, 100)
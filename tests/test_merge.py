@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from PyPDF2 import PdfReader
+
+from conftest import write_inline_resources_pdf
+from conversions import merge_pdfs
+
+
+def test_streaming_merge_with_inherited_inline_resources(tmp_path):
+    first = write_inline_resources_pdf(tmp_path / "a.pdf", pages=2)
+    second = write_inline_resources_pdf(tmp_path / "b.pdf", pages=3)
+    out = str(tmp_path / "out.pdf")
+
+    merge_pdfs([first, second], out, streaming=True)
+
+    reader = PdfReader(out)
+    assert len(reader.pages) == 5
+    for page in reader.pages:
+        assert page["/Resources"]["/Font"]["/F1"]["/BaseFont"] == "/Helvetica"
+        assert page.extract_text() == "Hi"
+
+
+def test_streaming_merge_leaves_source_objects_untouched(tmp_path):
+    from conversions import _PdfStreamWriter
+
+    reader = PdfReader(write_inline_resources_pdf(tmp_path / "a.pdf", pages=2))
+    before = [page["/Resources"]["/Font"].raw_get("/F1").idnum for page in reader.pages]
+    with open(tmp_path / "out.pdf", "wb") as f:
+        writer = _PdfStreamWriter(f)
+        writer.add_document(reader)
+        writer.finish()
+    after = [page["/Resources"]["/Font"].raw_get("/F1").idnum for page in reader.pages]
+    assert after == before
@@ -0,0 +1,127 @@
+import os
+import stat
+import sys
+
+import pytest
+
+import office_pool
+from office_pool import OfficePool, OfficeTimeout, latency_summary, take_latency
+
+pytestmark = pytest.mark.skipif(sys.platform.startswith("win"), reason="script eseguibili POSIX")
+
+# soffice --convert-to pdf --outdir DIR input: scrive DIR/<nome>.pdf (o si blocca con "sleep" nel nome)
+FAKE_SOFFICE = """
+import os, sys, time
+args = sys.argv[1:]
+out_dir = args[args.index("--outdir") + 1]
+src = args[-1]
+if "sleep" in src:
+    time.sleep(30)
+if "broken" in src:
+    sys.stderr.write("source file could not be loaded")
+    sys.exit(1)
+name = os.path.splitext(os.path.basename(src))[0] + ".pdf"
+with open(os.path.join(out_dir, name), "w") as f:
+    f.write("%PDF " + open(src).read())
+"""
+
+# unoserver --port N ...: resta in ascolto finché non viene terminato
+FAKE_UNOSERVER = """
+import socket, sys
+args = sys.argv[1:]
+server = socket.socket()
+server.bind(("127.0.0.1", int(args[args.index("--port") + 1])))
+server.listen()
+with open(sys.argv[0] + ".starts", "a") as f:
+    f.write("x")
+while True:
+    server.accept()[0].close()
+"""
+
+# unoconvert --port N --convert-to pdf input output
+FAKE_UNOCONVERT = """
+import socket, sys
+args = sys.argv[1:]
+socket.create_connection(("127.0.0.1", int(args[args.index("--port") + 1]))).close()
+with open(args[-1], "w") as f:
+    f.write("%PDF " + open(args[-2]).read())
+"""
+
+
+def _script(bin_dir, name, body):
+    path = bin_dir / name
+    path.write_text(f"#!{sys.executable}\n{body}")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def bin_dir(tmp_path, monkeypatch):
+    path = tmp_path / "bin"
+    path.mkdir()
+    monkeypatch.setenv("PATH", str(path) + os.pathsep + os.environ["PATH"])
+    monkeypatch.setattr(office_pool, "has_uno", lambda: False)
+    return path
+
+
+def _doc(tmp_path, name, text="doc"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_cli_backend_converts_and_records_latency(tmp_path, bin_dir):
+    soffice = _script(bin_dir, "soffice", FAKE_SOFFICE)
+    pool = OfficePool(size=1, soffice=soffice)
+    try:
+        assert pool.backend == "cli"
+        out = str(tmp_path / "a.pdf")
+        elapsed = pool.convert(_doc(tmp_path, "a.docx", "ciao"), out)
+
+        assert open(out).read() == "%PDF ciao"
+        assert take_latency() == elapsed
+        assert take_latency() is None
+        with pytest.raises(RuntimeError, match="could not be loaded"):
+            pool.convert(_doc(tmp_path, "broken.docx"), str(tmp_path / "b.pdf"))
+        assert take_latency() is None
+        stats = pool.stats()
+        assert (stats["jobs"], stats["failures"], stats["instances"]) == (2, 1, 1)
+    finally:
+        pool.close()
+
+
+def test_timeout_restarts_instance(tmp_path, bin_dir):
+    pool = OfficePool(size=1, timeout=0.5, soffice=_script(bin_dir, "soffice", FAKE_SOFFICE))
+    try:
+        with pytest.raises(OfficeTimeout):
+            pool.convert(_doc(tmp_path, "sleep.docx"), str(tmp_path / "s.pdf"))
+        pool.convert(_doc(tmp_path, "a.docx"), str(tmp_path / "a.pdf"))
+        assert pool.stats()["restarts"] == 1
+    finally:
+        pool.close()
+
+
+def test_unoserver_backend_keeps_one_warm_server(tmp_path, bin_dir):
+    starts = _script(bin_dir, "unoserver", FAKE_UNOSERVER) + ".starts"
+    _script(bin_dir, "unoconvert", FAKE_UNOCONVERT)
+    pool = OfficePool(size=1, soffice=_script(bin_dir, "soffice", FAKE_SOFFICE))
+    try:
+        assert pool.backend == "unoserver"
+        for i in range(3):
+            out = str(tmp_path / f"{i}.pdf")
+            pool.convert(_doc(tmp_path, f"{i}.docx", str(i)), out)
+            assert open(out).read() == f"%PDF {i}"
+        assert open(starts).read() == "x"
+    finally:
+        pool.close()
+    assert pool.stats()["instances"] == 0
+
+
+def test_latency_summary_mentions_cold_starts(bin_dir):
+    results = [{"office_latency": 1.0}, {"office_latency": 3.0}, {"office_latency": None}, {}]
+
+    summary = latency_summary(results)
+
+    assert summary.startswith("LibreOffice: 2 documenti, latenza media 2.00 s")
+    assert "python3-uno" in summary
+    assert latency_summary([{"office_latency": None}]) is None
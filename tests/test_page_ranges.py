@@ -0,0 +1,47 @@
+import pytest
+
+from conversions import PageRanges, parse_page_ranges
+
+
+def pages(spec, page_count):
+    return [idx + 1 for idx in PageRanges(spec).iter_pages(page_count)]
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("5", [5]),
+    ("1-3,7", [1, 2, 3, 7]),
+    ("4-2", [4, 3, 2]),
+    ("8-", [8, 9, 10]),
+    ("-2", [1, 2]),
+    ("end", [10]),
+    ("end-8", [10, 9, 8]),
+    ("odd", [1, 3, 5, 7, 9]),
+    ("pari", [2, 4, 6, 8, 10]),
+    ("2-7:odd", [3, 5, 7]),
+    ("9-2:even", [8, 6, 4, 2]),
+    (" 1 , 3 : dispari ", [1, 3]),
+])
+def test_selection_pages(spec, expected):
+    assert pages(spec, 10) == expected
+
+
+def test_count_without_listing_pages():
+    assert PageRanges("1-,odd").count(1_000_000) == 1_500_000
+
+
+@pytest.mark.parametrize("spec", ["", " , ", "0", "a-3", "1-x", "1-3:tutte", "odd:even", "pari:odd"])
+def test_invalid_syntax(spec):
+    with pytest.raises(ValueError):
+        PageRanges(spec)
+
+
+@pytest.mark.parametrize("spec", ["11", "3-12", "2-2:odd", "1:even"])
+def test_invalid_for_document(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec, 10)
+
+
+def test_even_on_single_page_document():
+    with pytest.raises(ValueError):
+        PageRanges("even").count(1)
+    assert pages("odd", 1) == [1]
@@ -0,0 +1,41 @@
+import pytest
+
+docx = pytest.importorskip("docx")
+
+from pdf_docx import convert_pdf_to_docx_parallel, stitch_docx
+
+
+def _texts(path):
+    return [p.text.strip() for p in docx.Document(path).paragraphs if p.text.strip()]
+
+
+def test_stitch_keeps_order_and_sections(tmp_path):
+    parts = []
+    for i in range(3):
+        document = docx.Document()
+        document.add_paragraph(f"parte {i} a")
+        document.add_paragraph(f"parte {i} b")
+        path = str(tmp_path / f"part{i}.docx")
+        document.save(path)
+        parts.append(path)
+    out = str(tmp_path / "out.docx")
+
+    stitch_docx(parts, out)
+
+    assert _texts(out) == [f"parte {i} {x}" for i in range(3) for x in "ab"]
+    assert len(docx.Document(out).sections) == 3
+
+
+def test_chunks_are_converted_in_page_order(tmp_path):
+    pytest.importorskip("pdf2docx")
+    from conftest import write_numbered_pdf
+
+    src = write_numbered_pdf(tmp_path / "doc.pdf", 5)
+    out = str(tmp_path / "doc.docx")
+    calls = []
+
+    convert_pdf_to_docx_parallel(src, out, chunk_pages=2, max_workers=2, mode="chunks",
+                                 progress=lambda done, total: calls.append((done, total)))
+
+    assert _texts(out) == [f"P{n}" for n in range(1, 6)]
+    assert calls == [(1, 3), (2, 3), (3, 3)]
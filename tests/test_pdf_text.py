@@ -0,0 +1,77 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+from pdf_text import extract_pdf_text, iter_pdf_pages
+
+
+@pytest.fixture
+def numbered_pdf(tmp_path):
+    pytest.importorskip("PyPDF2")
+    from conftest import write_numbered_pdf
+    return write_numbered_pdf(tmp_path / "doc.pdf", 7)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_text_in_page_order(numbered_pdf, tmp_path, workers):
+    out = str(tmp_path / "doc.txt")
+    calls = []
+
+    count = extract_pdf_text(numbered_pdf, out, max_workers=workers, chunk_size=2,
+                             progress=lambda done, total: calls.append((done, total)))
+
+    assert count == 7
+    with open(out, encoding="utf-8") as f:
+        assert [page.strip() for page in f.read().split("\f")] == [f"P{n}" for n in range(1, 8)]
+    assert calls == [(n, 7) for n in range(1, 8)]
+
+
+def test_jsonl_output(numbered_pdf, tmp_path):
+    out = str(tmp_path / "doc.jsonl")
+
+    extract_pdf_text(numbered_pdf, out, fmt="jsonl", max_workers=1)
+
+    with open(out, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [(row["page"], row["text"].strip()) for row in rows] == [(n, f"P{n}") for n in range(1, 8)]
+
+
+def test_failed_extraction_leaves_no_output(tmp_path):
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"not a pdf")
+    out = str(tmp_path / "bad.txt")
+
+    with pytest.raises(Exception):
+        extract_pdf_text(str(bad), out, max_workers=1)
+
+    assert os.listdir(tmp_path) == ["bad.pdf"]
+
+
+def _fake_pdftotext(tmp_path, monkeypatch, body):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "pdftotext"
+    script.write_text(f"#!{sys.executable}\nimport sys\n{body}\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ["PATH"])
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="script eseguibile POSIX")
+def test_pdftotext_with_many_warnings(tmp_path, monkeypatch):
+    # Più avvisi di quanti ne stiano nel buffer di una pipe, scritti prima del testo
+    _fake_pdftotext(tmp_path, monkeypatch,
+                    "sys.stderr.write('Syntax Warning: x\\n' * 20000)\n"
+                    "sys.stdout.write('uno\\fdue\\f')")
+
+    assert list(iter_pdf_pages("doc.pdf", engine="pdftotext")) == ["uno", "due"]
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="script eseguibile POSIX")
+def test_pdftotext_error_message(tmp_path, monkeypatch):
+    _fake_pdftotext(tmp_path, monkeypatch, "sys.stderr.write('Error: cannot open\\n')\nsys.exit(1)")
+
+    with pytest.raises(RuntimeError, match="cannot open"):
+        list(iter_pdf_pages("doc.pdf", engine="pdftotext"))
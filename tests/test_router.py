@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+
+import pytest
+
+import cache
+import conversions
+import router
+from cache import cached
+from router import ConversionGraph, build_default_graph
+
+
+@pytest.fixture
+def graph(tmp_path):
+    return build_default_graph(str(tmp_path / "costs.json"))
+
+
+def _route(graph, src, dst):
+    return [(edge.src, edge.dst) for edge in graph.plan(src, dst)]
+
+
+def test_plan_direct_and_multi_step(graph):
+    assert _route(graph, ".docx", ".pdf") == [(".docx", ".pdf")]
+    assert _route(graph, ".PDF", ".pages") == [(".pdf", ".docx"), (".docx", ".pages")]
+    assert _route(graph, ".png", ".png") == [(".png", ".png")]
+    with pytest.raises(ValueError):
+        graph.plan(".txt", ".pdf")
+
+
+def test_image_edges_are_never_chained(graph):
+    # Anche se la conversione diretta risultasse lentissima, niente passaggi intermedi
+    direct = next(e for e in graph._edges[".png"] if e.dst == ".jpg")
+    graph._costs[direct.key] = {"cost": 1000.0, "runs": 5}
+    assert _route(graph, ".png", ".jpg") == [(".png", ".jpg")]
+    # Il PDF ottenuto da un'immagine non prosegue verso DOCX/TXT
+    with pytest.raises(ValueError):
+        graph.plan(".jpg", ".docx")
+
+
+def test_targets_direct_first_then_by_cost(graph):
+    assert graph.targets(".pdf") == [".docx", ".txt", ".pages"]
+    assert ".docx" not in graph.targets(".png")
+    assert set(graph.targets(".svg")) >= {".png", ".jpg", ".pdf", ".tiff"}
+
+
+def test_learned_cost_changes_route(tmp_path):
+    graph = ConversionGraph(str(tmp_path / "costs.json"))
+    graph.add_edge(".a", ".c", "f", 10.0)
+    graph.add_edge(".a", ".b", "g", 1.0)
+    graph.add_edge(".b", ".c", "h", 1.0)
+    assert _route(graph, ".a", ".c") == [(".a", ".b"), (".b", ".c")]
+
+    slow = graph._edges[".a"][1]
+    for _ in range(20):
+        graph.record(slow, seconds=50.0, input_bytes=1024 ** 2)
+    assert _route(graph, ".a", ".c") == [(".a", ".c")]
+
+
+def test_costs_saved_in_batches_and_flushed(tmp_path):
+    path = tmp_path / "costs.json"
+    graph = ConversionGraph(str(path))
+    graph.add_edge(".a", ".b", "f", 1.0)
+    edge = graph._edges[".a"][0]
+
+    graph.record(edge, 2.0, 1024 ** 2)
+    assert json.loads(path.read_text())[edge.key] == {"cost": 2.0, "runs": 1}
+    graph.record(edge, 4.0, 1024 ** 2)
+    # Entro SAVE_INTERVAL la seconda misura resta in memoria
+    assert json.loads(path.read_text())[edge.key]["runs"] == 1
+
+    graph.flush()
+    saved = json.loads(path.read_text())[edge.key]
+    assert saved["runs"] == 2 and saved["cost"] == pytest.approx(2.0 + router.EWMA_ALPHA * 2.0)
+    # Una nuova istanza riparte dalle stime salvate
+    assert ConversionGraph(str(path)).edge_cost(edge) == saved["cost"]
+
+
+def test_run_edge_skips_cache_hits_of_this_thread_only(tmp_path, monkeypatch):
+    monkeypatch.setenv("DEVATRON_CACHE", "1")
+    monkeypatch.setattr(cache, "_default_cache", None)
+
+    @cached()
+    def convert_upper(input_path, output_path):
+        with open(input_path) as src, open(output_path, "w") as dst:
+            dst.write(src.read().upper())
+        if "main" in input_path:
+            # Mentre questa conversione è in corso un altro thread ottiene una hit
+            other = threading.Thread(target=convert_upper, args=(other_in, str(tmp_path / "o2.b")))
+            other.start()
+            other.join()
+        return output_path
+
+    monkeypatch.setattr(conversions, "convert_upper", convert_upper, raising=False)
+    other_in = str(tmp_path / "other.a")
+    with open(other_in, "w") as f:
+        f.write("altro")
+    convert_upper(other_in, str(tmp_path / "o1.b"))
+    main_in = str(tmp_path / "main.a")
+    with open(main_in, "w") as f:
+        f.write("principale")
+
+    graph = ConversionGraph(str(tmp_path / "costs.json"))
+    graph.add_edge(".a", ".b", "convert_upper", 1.0)
+    edge = graph._edges[".a"][0]
+
+    graph.run_edge(edge, main_in, str(tmp_path / "m1.b"), {})
+    assert graph._costs[edge.key]["runs"] == 1
+    # Stesso input: servito dalla cache, il costo non cambia
+    graph.run_edge(edge, main_in, str(tmp_path / "m2.b"), {})
+    assert graph._costs[edge.key]["runs"] == 1
+    assert open(tmp_path / "m2.b").read() == "PRINCIPALE"
+
+
+def test_convert_removes_intermediates(tmp_path, monkeypatch):
+    created = []
+
+    def step(input_path, output_path):
+        created.append(output_path)
+        with open(input_path) as src, open(output_path, "w") as dst:
+            dst.write(src.read() + "+")
+        return output_path
+
+    monkeypatch.setattr(conversions, "convert_step", step, raising=False)
+    graph = ConversionGraph(str(tmp_path / "costs.json"))
+    graph.add_edge(".a", ".b", "convert_step", 1.0)
+    graph.add_edge(".b", ".c", "convert_step", 1.0)
+    src = tmp_path / "x.a"
+    src.write_text("x")
+
+    graph.convert(str(src), str(tmp_path / "x.c"))
+
+    assert (tmp_path / "x.c").read_text() == "x++"
+    assert not any(os.path.exists(path) for path in created if path.endswith(".b"))
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from conftest import page_labels, write_numbered_pdf
+from conversions import split_pdf, split_pdf_multi
+
+
+def test_split_every_n_pages(tmp_path):
+    src = write_numbered_pdf(tmp_path / "doc.pdf", 12)
+    calls = []
+
+    outputs = split_pdf_multi(src, every=5, output_dir=str(tmp_path / "out"), max_workers=2,
+                              progress=lambda done, total, path: calls.append((done, total, path)))
+
+    assert [os.path.basename(p) for p in outputs] == ["doc_01-05.pdf", "doc_06-10.pdf", "doc_11-12.pdf"]
+    assert [page_labels(p) for p in outputs] == [
+        ["P1", "P2", "P3", "P4", "P5"], ["P6", "P7", "P8", "P9", "P10"], ["P11", "P12"]]
+    assert calls == [(1, 3, outputs[0]), (2, 3, outputs[1]), (3, 3, outputs[2])]
+
+
+def test_split_by_ranges(tmp_path):
+    src = write_numbered_pdf(tmp_path / "doc.pdf", 6)
+
+    outputs = split_pdf_multi(src, ranges=["1-2,5", "end-4", "odd"])
+
+    assert [os.path.basename(p) for p in outputs] == ["doc_1-2_5.pdf", "doc_end-4.pdf", "doc_odd.pdf"]
+    assert [page_labels(p) for p in outputs] == [["P1", "P2", "P5"], ["P6", "P5", "P4"], ["P1", "P3", "P5"]]
+
+
+def test_invalid_range_writes_nothing(tmp_path):
+    src = write_numbered_pdf(tmp_path / "doc.pdf", 3)
+
+    with pytest.raises(ValueError):
+        split_pdf_multi(src, ranges=["1-2", "2-9"], output_dir=str(tmp_path / "out"))
+    with pytest.raises(ValueError):
+        split_pdf_multi(src)
+
+    assert not os.listdir(tmp_path / "out")
+
+
+def test_split_single_selection(tmp_path):
+    src = write_numbered_pdf(tmp_path / "doc.pdf", 4)
+    out = str(tmp_path / "sel.pdf")
+
+    split_pdf(src, out, "4,1-2")
+
+    assert page_labels(out) == ["P4", "P1", "P2"]
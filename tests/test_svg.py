@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="40" height="20">
+<rect width="40" height="20" fill="#ff0000"/></svg>"""
+
+
+@pytest.fixture
+def svg(tmp_path):
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError):
+        pytest.skip("cairosvg (o la libreria cairo) non disponibile")
+    path = tmp_path / "rect.svg"
+    path.write_text(SVG)
+    return str(path)
+
+
+def test_render_in_memory_at_requested_size(svg):
+    from conversions import _render_svg
+
+    im = _render_svg(svg, width=80)
+
+    assert im.mode == "RGBA" and im.size == (80, 40)
+    assert im.getpixel((10, 10)) == (255, 0, 0, 255)
+
+
+@pytest.mark.parametrize("ext", [".jpg", ".webp", ".png"])
+def test_convert_svg_to_raster(svg, tmp_path, ext):
+    from conversions import convert_image
+
+    out = str(tmp_path / ("rect" + ext))
+    convert_image(svg, out, height=60)
+
+    with Image.open(out) as im:
+        assert im.size == (120, 60)
+        r, g, b = im.convert("RGB").getpixel((5, 5))
+        assert r > 240 and g < 20 and b < 20
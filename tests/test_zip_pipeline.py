@@ -0,0 +1,108 @@
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from conftest import write_inline_resources_pdf
+from zip_pipeline import convert_zip
+
+
+def _make_zip(tmp_path):
+    good = write_inline_resources_pdf(tmp_path / "good.pdf", pages=1)
+    path = tmp_path / "in.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("bad.pdf", b"not a pdf")
+        zf.writestr("bad.txt", b"old text")
+        zf.write(good, "good.pdf")
+        zf.writestr("notes.bin", b"123")
+    return str(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_failed_member_is_copied(tmp_path, workers):
+    out = str(tmp_path / "out.zip")
+    results = convert_zip(_make_zip(tmp_path), out, {".pdf": ".txt"}, max_workers=workers)
+
+    by_input = {r["input"]: r for r in results}
+    assert by_input["bad.pdf"]["ok"] is False
+    assert by_input["bad.pdf"]["copied"] is True
+    assert by_input["good.pdf"]["ok"] is True
+    with zipfile.ZipFile(out) as zf:
+        assert sorted(zf.namelist()) == ["bad.pdf", "bad.txt", "good.txt", "notes.bin"]
+        assert zf.read("bad.pdf") == b"not a pdf"
+        # Il file che la conversione fallita avrebbe sostituito resta com'era
+        assert zf.read("bad.txt") == b"old text"
+        assert zf.testzip() is None
+
+
+def test_failed_member_dropped_without_copy_others(tmp_path):
+    out = str(tmp_path / "out.zip")
+    results = convert_zip(_make_zip(tmp_path), out, {".pdf": ".txt"}, copy_others=False, max_workers=1)
+
+    assert [r["copied"] for r in results if not r["ok"]] == [False]
+    with zipfile.ZipFile(out) as zf:
+        assert zf.namelist() == ["good.txt"]
+
+
+def _image_bytes(size, fmt, exif=None, color="red"):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, fmt, **({"exif": exif} if exif else {}))
+    return buf.getvalue()
+
+
+def test_images_go_through_the_image_pipeline(tmp_path):
+    from PIL import Image
+    exif = Image.Exif()
+    exif[0x0112] = 6  # ruotata di 90 gradi
+    src = tmp_path / "in.zip"
+    with zipfile.ZipFile(src, "w") as zf:
+        zf.writestr("foto.jpg", _image_bytes((80, 40), "JPEG", exif.tobytes()))
+        zf.writestr("grande.png", _image_bytes((400, 100), "PNG"))
+    out = str(tmp_path / "out.zip")
+
+    results = convert_zip(str(src), out, {".jpg": ".png", ".png": ".webp"}, max_workers=1,
+                          options={"max_size": 200})
+
+    assert all(r["ok"] for r in results)
+    with zipfile.ZipFile(out) as zf:
+        with Image.open(io.BytesIO(zf.read("foto.png"))) as im:
+            assert im.size == (40, 80)
+        with Image.open(io.BytesIO(zf.read("grande.webp"))) as im:
+            assert im.format == "WEBP" and im.size == (200, 50)
+
+
+def test_image_over_the_memory_budget_is_converted_in_bands(tmp_path):
+    from PIL import Image
+    src = tmp_path / "in.zip"
+    with zipfile.ZipFile(src, "w") as zf:
+        zf.writestr("a.png", _image_bytes((300, 200), "PNG"))
+    out = str(tmp_path / "out.zip")
+
+    results = convert_zip(str(src), out, {".png": ".tiff"}, max_workers=1, options={"max_memory": 20000})
+
+    assert results[0]["ok"], results[0]["error"]
+    with zipfile.ZipFile(out) as zf, Image.open(io.BytesIO(zf.read("a.tiff"))) as im:
+        assert im.size == (300, 200) and im.getpixel((150, 199)) == (255, 0, 0)
+
+
+def test_outputs_with_the_same_name_are_renamed(tmp_path):
+    good = write_inline_resources_pdf(tmp_path / "good.pdf", pages=1)
+    docx = pytest.importorskip("docx")
+    document = docx.Document()
+    document.add_paragraph("dal docx")
+    document.save(str(tmp_path / "a.docx"))
+    src = tmp_path / "in.zip"
+    with zipfile.ZipFile(src, "w") as zf:
+        zf.write(str(tmp_path / "a.docx"), "a.docx")
+        zf.write(good, "a.pdf")
+    out = str(tmp_path / "out.zip")
+
+    results = convert_zip(str(src), out, {".docx": ".txt", ".pdf": ".txt"}, max_workers=1)
+
+    assert [(r["input"], r["output"]) for r in results] == [("a.docx", "a.txt"), ("a.pdf", "a.pdf.txt")]
+    with zipfile.ZipFile(out) as zf:
+        assert sorted(zf.namelist()) == ["a.pdf.txt", "a.txt"]
+        assert zf.read("a.txt").decode() == "dal docx"
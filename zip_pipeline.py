@@ -0,0 +1,265 @@
+"""
+Conversione dei file contenuti in uno ZIP senza estrarlo su disco.
+
+Ogni voce da convertire viene letta direttamente dall'archivio di input da un
+processo worker (con un proprio handle dell'archivio), convertita e aggiunta al
+nuovo ZIP. Le conversioni che le librerie sanno fare in memoria (immagini con
+Pillow, DOCX -> TXT, PDF -> TXT) non toccano il disco; per i backend che
+richiedono un percorso reale (pdf2docx, LibreOffice, Pages, cairosvg) la voce viene
+scritta in un file temporaneo, convertita con il grafo delle conversioni e il
+risultato rimosso appena copiato nell'archivio.
+
+Le voci non convertite possono essere copiate così come sono (byte già compressi),
+comprese quelle la cui conversione non è riuscita.
+"""
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_MEMORY_IMAGE_INPUTS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp")
+_MEMORY_IMAGE_OUTPUTS = _MEMORY_IMAGE_INPUTS + (".pdf",)
+_SAVE_OPTIONS = ("target_size", "quality", "progressive", "webp_method")
+
+# Archivi aperti dal worker: (percorso, dimensione, mtime) -> ZipFile
+_worker_zips = {}
+
+
+def _member_bytes(input_zip, name):
+    st = os.stat(input_zip)
+    key = (os.path.abspath(input_zip), st.st_size, st.st_mtime_ns)
+    zf = _worker_zips.get(key)
+    if zf is None:
+        # Un archivio sostituito nel frattempo non deve essere letto con il vecchio handle
+        for old in _worker_zips.values():
+            old.close()
+        _worker_zips.clear()
+        zf = _worker_zips[key] = zipfile.ZipFile(input_zip)
+    return zf.read(name)
+
+
+def _convert_in_memory(data, ext_in, ext_out, options):
+    """Bytes convertiti, oppure None se la conversione richiede un file su disco."""
+    if ext_in in _MEMORY_IMAGE_INPUTS and ext_out in _MEMORY_IMAGE_OUTPUTS:
+        from image_tiles import DEFAULT_MAX_MEMORY
+        from images import _decoded_bytes, open_image, save_image
+        max_size = options.get("max_size")
+        if _decoded_bytes(io.BytesIO(data), max_size, ext_in) > (options.get("max_memory") or DEFAULT_MAX_MEMORY):
+            # Oltre il budget: conversione a strisce, che legge da un file
+            return None
+        # Stessa pipeline di images.convert_raster: orientamento EXIF, max_size, target_size
+        im = open_image(io.BytesIO(data), max_size, unguarded=True)
+        out = io.BytesIO()
+        try:
+            save_image(im, out, ext_out=ext_out, **{k: options.get(k) for k in _SAVE_OPTIONS})
+        finally:
+            im.close()
+        return out.getvalue()
+    if ext_in == ".docx" and ext_out == ".txt":
+        import docx
+        d = docx.Document(io.BytesIO(data))
+        return "\n".join(para.text for para in d.paragraphs).encode("utf-8")
+    if ext_in == ".pdf" and ext_out == ".txt":
+        from PyPDF2 import PdfReader
+        from pdf_text import _PageWriter
+        reader = PdfReader(io.BytesIO(data))
+        if reader.is_encrypted:
+            reader.decrypt("")
+        out = io.StringIO()
+        writer = _PageWriter(out, "text", "\f")
+        for page in reader.pages:
+            writer.write(page.extract_text() or "")
+        return out.getvalue().encode("utf-8")
+    return None
+
+
+def _convert_member(input_zip, name, out_name, options):
+    """
+    Converte una voce nel processo worker. Restituisce un risultato come quello di
+    batch._run_job, con "data" (bytes in memoria) oppure "path" (file temporaneo
+    che il chiamante deve rimuovere).
+    """
+    from router import get_graph
+
+    start = time.perf_counter()
+    result = {"input": name, "output": out_name, "ok": True, "error": None, "data": None, "path": None}
+    ext_in = os.path.splitext(name)[1].lower()
+    ext_out = os.path.splitext(out_name)[1].lower()
+    try:
+        data = _member_bytes(input_zip, name)
+        converted = _convert_in_memory(data, ext_in, ext_out, options)
+        if converted is not None:
+            result["data"] = converted
+        else:
+            # Il backend vuole un percorso: la voce passa da un file temporaneo
+            tmp_dir = tempfile.mkdtemp(prefix="devatron_zipconv_")
+            try:
+                stem = os.path.splitext(os.path.basename(name))[0] or "file"
+                src = os.path.join(tmp_dir, stem + ext_in)
+                with open(src, "wb") as f:
+                    f.write(data)
+                del data
+                dst = os.path.join(tmp_dir, "out", stem + ext_out)
+                os.makedirs(os.path.dirname(dst))
+                get_graph().convert(src, dst, **options)
+                os.remove(src)
+                result["path"] = dst
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def _plan_members(infos, targets, include, exclude):
+    """
+    Divide le voci in (da convertire: [(info, nome di output)], altre: [info],
+    sostituite: {nome di output: info della voce esistente con quel nome}).
+    Se due voci darebbero lo stesso output (a.docx e a.pdf -> a.txt) la seconda
+    tiene anche l'estensione di origine (a.pdf.txt).
+    """
+    from archive import _matches
+    from router import get_graph
+
+    graph = get_graph()
+    to_convert, others = [], []
+    for info in infos:
+        if info.is_dir():
+            others.append(info)
+            continue
+        stem, ext = os.path.splitext(info.filename)
+        ext_out = targets.get(ext.lower())
+        if ext_out and _matches(info.filename, include, exclude):
+            try:
+                graph.plan(ext.lower(), ext_out)
+            except ValueError:
+                others.append(info)
+                continue
+            to_convert.append((info, stem, ext, ext_out))
+        else:
+            others.append(info)
+    names = {info.filename for info in infos}
+    taken = set()
+    for i, (info, stem, ext, ext_out) in enumerate(to_convert):
+        out_name = stem + ext_out
+        if out_name in taken:
+            out_name = stem + ext + ext_out
+            n = 1
+            while out_name in taken or out_name in names:
+                n += 1
+                out_name = f"{stem}{ext} ({n}){ext_out}"
+        taken.add(out_name)
+        to_convert[i] = (info, out_name)
+    # Un file già presente con il nome di un output viene sostituito dalla conversione
+    out_names = {out_name for _, out_name in to_convert}
+    replaced = {info.filename: info for info in others if info.filename in out_names}
+    others = [info for info in others if info.filename not in out_names]
+    return to_convert, others, replaced
+
+
+def targets_for(ext_out):
+    """
+    Mappa per convert_zip: ogni formato che il grafo sa convertire in ext_out.
+    ValueError se nessun formato può essere convertito in ext_out.
+    """
+    from router import get_graph
+
+    graph = get_graph()
+    ext_out = ext_out.lower()
+    targets = {src: ext_out for src in graph.sources() if src != ext_out and ext_out in graph.targets(src)}
+    if not targets:
+        raise ValueError(f"Formato di destinazione non supportato: {ext_out}")
+    return targets
+
+
+def convert_zip(input_zip, output_zip, targets, include=None, exclude=None, copy_others=True,
+                max_workers=None, options=None, on_result=None):
+    """
+    Converte le voci di input_zip e scrive i risultati in output_zip.
+
+    - targets: estensione di input -> estensione di output, ad es. {".docx": ".pdf"}.
+    - include / exclude: pattern glob sui nomi delle voci da convertire.
+    - copy_others: copia nel nuovo archivio (senza ricomprimerle) le voci non convertite;
+      se una conversione non riesce viene copiata la voce originale (risultato con
+      ok=False e copied=True).
+    - max_workers: processi di conversione (default: numero di core, 1 = nel processo corrente).
+    - options: opzioni passate alle conversioni (come in batch.run_batch).
+    - on_result(result, done, total): come in batch.run_batch, nell'ordine dell'archivio.
+
+    Restituisce la lista dei risultati (input, output, ok, error, elapsed, copied).
+    """
+    from archive import copy_raw_entry
+    from batch import default_workers
+
+    targets = {k.lower(): v.lower() for k, v in targets.items()}
+    options = options or {}
+    with zipfile.ZipFile(input_zip) as zin:
+        infos = sorted(zin.infolist(), key=lambda i: i.header_offset)
+    to_convert, others, replaced = _plan_members(infos, targets, include, exclude)
+    total = len(to_convert)
+    max_workers = max(1, min(max_workers or default_workers(), total or 1))
+    results = []
+
+    def write_result(zout, raw, info, result):
+        result["copied"] = False
+        try:
+            if not result["ok"]:
+                if copy_others:
+                    # Nessun dato perso: restano la voce originale e l'eventuale file
+                    # che la conversione avrebbe sostituito
+                    copy_raw_entry(zout, raw, info)
+                    if result["output"] in replaced:
+                        copy_raw_entry(zout, raw, replaced[result["output"]])
+                    result["copied"] = True
+            elif result["data"] is not None:
+                zout.writestr(result["output"], result["data"], compress_type=zipfile.ZIP_DEFLATED)
+            elif result["path"]:
+                zout.write(result["path"], result["output"], compress_type=zipfile.ZIP_DEFLATED)
+        finally:
+            if result["path"]:
+                shutil.rmtree(os.path.dirname(os.path.dirname(result["path"])), ignore_errors=True)
+        result.pop("data")
+        result.pop("path")
+        results.append(result)
+        if on_result:
+            on_result(result, len(results), total)
+
+    tmp_zip = output_zip + ".part"
+    try:
+        with zipfile.ZipFile(tmp_zip, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zout, \
+                open(input_zip, "rb") as raw:
+            if copy_others:
+                for info in others:
+                    copy_raw_entry(zout, raw, info)
+
+            if max_workers == 1:
+                for info, out_name in to_convert:
+                    write_result(zout, raw, info, _convert_member(input_zip, info.filename, out_name, options))
+            else:
+                # "spawn" come nel batch: niente fork dello stato della GUI
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+                    pending = deque()
+                    for info, out_name in to_convert:
+                        fut = pool.submit(_convert_member, input_zip, info.filename, out_name, options)
+                        pending.append((info, fut))
+                        # Risultati scritti in ordine; pochi in memoria alla volta
+                        while len(pending) > max_workers * 2:
+                            done_info, done_fut = pending.popleft()
+                            write_result(zout, raw, done_info, done_fut.result())
+                    while pending:
+                        done_info, done_fut = pending.popleft()
+                        write_result(zout, raw, done_info, done_fut.result())
+        os.replace(tmp_zip, output_zip)
+    finally:
+        if os.path.exists(tmp_zip):
+            os.remove(tmp_zip)
+    return results